@@ -81,7 +81,8 @@ with gr.Blocks(title="Chatterbox TTS Enhanced", theme=gr.themes.Soft()) as demo:
             tts_components['cfg_weight'],
             tts_components['min_p'],
             tts_components['top_p'],
-            tts_components['repetition_penalty']
+            tts_components['repetition_penalty'],
+            tts_components['output_format']
         ],
         outputs=[
             tts_components['progress_bar'],
@@ -113,7 +114,8 @@ with gr.Blocks(title="Chatterbox TTS Enhanced", theme=gr.themes.Soft()) as demo:
             mtl_components['exaggeration'],
             mtl_components['temp'],
             mtl_components['seed_num'],
-            mtl_components['cfg_weight']
+            mtl_components['cfg_weight'],
+            mtl_components['output_format']
         ],
         outputs=[
             mtl_components['progress_bar'],
@@ -148,7 +150,7 @@ with gr.Blocks(title="Chatterbox TTS Enhanced", theme=gr.themes.Soft()) as demo:
     # ---------------------------
     vc_components['convert_btn'].click(
         fn=convert_voice,
-        inputs=[vc_components['input_audio'], vc_components['target_voice_select']],
+        inputs=[vc_components['input_audio'], vc_components['target_voice_select'], vc_components['output_format']],
         outputs=[vc_components['progress_bar'], vc_components['audio_output'], vc_components['status_box']]
     )
     
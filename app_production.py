@@ -24,6 +24,11 @@ from modules.generation_functions import (
     generate_multilingual_speech,
     convert_voice
 )
+from modules.model_manager import model_manager, MODEL_TYPES
+from modules.worker_pool import dispatch, worker_pool
+from modules.single_flight import coalesce, single_flight
+from modules.batch_scheduler import batch_scheduler
+from chatterbox.synthesis_cache import SYNTHESIS_CACHE
 
 # Import UI components
 from modules.ui_components import (
@@ -66,7 +71,7 @@ with gr.Blocks(title="Chatterbox TTS Enhanced", theme=gr.themes.Soft()) as demo:
     # Event Handlers - TTS Tab
     # ---------------------------
     tts_components['generate_btn'].click(
-        fn=generate_speech,
+        fn=coalesce(dispatch(generate_speech)),
         inputs=[
             tts_components['text'],
             tts_components['voice_select'],
@@ -76,7 +81,8 @@ with gr.Blocks(title="Chatterbox TTS Enhanced", theme=gr.themes.Soft()) as demo:
             tts_components['cfg_weight'],
             tts_components['min_p'],
             tts_components['top_p'],
-            tts_components['repetition_penalty']
+            tts_components['repetition_penalty'],
+            tts_components['output_format']
         ],
         outputs=[
             tts_components['progress_bar'],
@@ -100,7 +106,7 @@ with gr.Blocks(title="Chatterbox TTS Enhanced", theme=gr.themes.Soft()) as demo:
     # Event Handlers - Multilingual Tab
     # ---------------------------
     mtl_components['generate_btn'].click(
-        fn=generate_multilingual_speech,
+        fn=coalesce(dispatch(generate_multilingual_speech)),
         inputs=[
             mtl_components['text'],
             mtl_components['voice_select'],
@@ -108,7 +114,8 @@ with gr.Blocks(title="Chatterbox TTS Enhanced", theme=gr.themes.Soft()) as demo:
             mtl_components['exaggeration'],
             mtl_components['temp'],
             mtl_components['seed_num'],
-            mtl_components['cfg_weight']
+            mtl_components['cfg_weight'],
+            mtl_components['output_format']
         ],
         outputs=[
             mtl_components['progress_bar'],
@@ -142,8 +149,8 @@ with gr.Blocks(title="Chatterbox TTS Enhanced", theme=gr.themes.Soft()) as demo:
     # Event Handlers - Voice Conversion Tab
     # ---------------------------
     vc_components['convert_btn'].click(
-        fn=convert_voice,
-        inputs=[vc_components['input_audio'], vc_components['target_voice_select']],
+        fn=dispatch(convert_voice),
+        inputs=[vc_components['input_audio'], vc_components['target_voice_select'], vc_components['output_format']],
         outputs=[vc_components['progress_bar'], vc_components['audio_output'], vc_components['status_box']]
     )
     
@@ -249,6 +256,12 @@ if __name__ == "__main__":
     import psutil
     import json
     from datetime import datetime
+    import uvicorn
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse
+    from modules.config import PRELOAD_MODELS, INFERENCE_WORKERS, HTTP_KEEP_ALIVE_SECONDS
+    from modules.http_api import router as synthesis_api
+    from modules.warmup import readiness, start_preload
     
     # Track application start time
     APP_START_TIME = time.time()
@@ -276,6 +289,7 @@ if __name__ == "__main__":
             
             health_data = {
                 "status": "healthy",
+                "ready": readiness.ready,
                 "timestamp": datetime.now().isoformat(),
                 "uptime_seconds": round(uptime_seconds, 2),
                 "uptime": uptime_str,
@@ -287,6 +301,11 @@ if __name__ == "__main__":
                     "disk_free_gb": round(disk.free / (1024 * 1024 * 1024), 2)
                 },
                 "voices_loaded": len(available_voices),
+                "models": model_manager.stats(),
+                "inference_workers": worker_pool.stats(),
+                "synthesis_cache": SYNTHESIS_CACHE.stats(),
+                "coalescing": single_flight.stats(),
+                "batching": batch_scheduler.stats(),
                 "service": "chatterbox-tts",
                 "version": "1.0.0"
             }
@@ -322,27 +341,58 @@ if __name__ == "__main__":
             )
     
     # Queue configuration for Gradio
+    # With micro-batching, admit enough concurrent requests to fill a batch
     demo.queue(
         max_size=50,
-        default_concurrency_limit=3,
+        default_concurrency_limit=max(3, batch_scheduler.max_batch_size) if batch_scheduler.enabled else 3,
     )
     
+    # HTTP probes beside the Gradio UI: /ready returns 503 until warmup completes,
+    # /live answers as soon as the server is up, whatever the models are doing
+    app = FastAPI(title="Chatterbox TTS")
+
+    @app.get("/live")
+    def liveness_probe():
+        return JSONResponse({"status": "alive"})
+
+    @app.get("/ready")
+    def ready_probe():
+        status = readiness.status()
+        return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+    @app.get("/health")
+    def health_probe():
+        return JSONResponse(json.loads(health_check_api()))
+
+    # Streaming JSON synthesis API for backend services (/v1/...)
+    app.include_router(synthesis_api)
+
+    app = gr.mount_gradio_app(app, demo, path="/", show_error=True)
+    
+    # Models load in the background so probes answer from the start. With several
+    # inference workers, a fork server started here, before the server runs any
+    # threads, loads every model and forks the workers so they share its weights;
+    # /ready waits for the workers
+    if INFERENCE_WORKERS > 1:
+        worker_pool.start(
+            PRELOAD_MODELS or list(MODEL_TYPES), fallback=lambda: start_preload(PRELOAD_MODELS)
+        )
+    else:
+        start_preload(PRELOAD_MODELS)
+    
     print("=" * 60)
     print("🎙️  Chatterbox TTS Server Starting...")
     print("=" * 60)
     print(f"📍 Server: http://{HOST}:{PORT}")
-    print(f"🏥 Health Check: http://{HOST}:{PORT}/ (Health Check tab)")
+    print(f"🏥 Health Check: http://{HOST}:{PORT}/health")
+    print(f"💓 Liveness: http://{HOST}:{PORT}/live")
+    print(f"🚦 Readiness: http://{HOST}:{PORT}/ready (preloading: {', '.join(PRELOAD_MODELS) or 'none'})")
     print(f"📚 Gradio API Docs: http://{HOST}:{PORT}/api/docs")
     print(f"🎤 TTS API: http://{HOST}:{PORT}/api/predict")
     print(f"🌍 Multilingual API: http://{HOST}:{PORT}/api/multilingual")
     print(f"🔄 Voice Conversion: http://{HOST}:{PORT}/api/convert_voice")
+    print(f"⚡ Streaming API: POST http://{HOST}:{PORT}/v1/tts, /v1/tts/multilingual, /v1/vc (docs: /docs)")
     print("=" * 60)
     
-    # Launch Gradio
-    demo.launch(
-        server_name=HOST,
-        server_port=PORT,
-        share=False,
-        show_error=True,
-        show_api=True,
-    )
+    # Launch Gradio mounted on the probe app
+    uvicorn.run(app, host=HOST, port=PORT, timeout_keep_alive=HTTP_KEEP_ALIVE_SECONDS)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark eager against torch.compile'd CPU inference
+
+Measures T3 speech tokens/sec and S3Gen real-time factor with the eager
+model, then compiles it (see chatterbox.compilation), times the warmup that
+builds the graphs, and measures again. Run it twice: the second run's
+warmup shows how much the persistent inductor cache saves on a restart.
+
+Usage:
+    python deploy_scripts/benchmark_compile.py [--rounds 3] [--threads N] [--output report.md]
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+from chatterbox.tts import ChatterboxTTS
+from chatterbox.compilation import COMPILE_CACHE_DIR, WARMUP_TEXTS, compile_model
+
+TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Compiled inference should produce the same speech with less overhead per token.",
+    "On a cold winter morning, the old lighthouse keeper climbed the stairs one last time.",
+]
+SEED = 1234
+
+
+def measure(model, rounds):
+    """Return (T3 tokens/sec, S3Gen real-time factor) over `rounds` passes of TEXTS."""
+    tokens = t3_seconds = vocode_seconds = audio_seconds = 0.0
+    for _ in range(rounds):
+        for text in TEXTS:
+            torch.manual_seed(SEED)
+            start = time.perf_counter()
+            speech_tokens = model.generate_tokens(text)
+            t3_seconds += time.perf_counter() - start
+            tokens += speech_tokens.numel()
+
+            start = time.perf_counter()
+            wav = model.tokens_to_wav(speech_tokens)
+            vocode_seconds += time.perf_counter() - start
+            audio_seconds += wav.shape[-1] / model.sr
+    return tokens / t3_seconds, vocode_seconds / audio_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the benchmark texts per mode")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads (default: torch's choice)")
+    parser.add_argument("--output", help="also write the markdown report to this file")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    model = ChatterboxTTS.from_pretrained("cpu")
+
+    # One untimed pass so one-off allocations do not count against eager mode
+    model.generate(WARMUP_TEXTS[0])
+    eager_tps, eager_rtf = measure(model, args.rounds)
+
+    compile_model(model)
+    start = time.perf_counter()
+    for text in WARMUP_TEXTS:
+        model.generate(text)
+    warmup_seconds = time.perf_counter() - start
+    compiled_tps, compiled_rtf = measure(model, args.rounds)
+
+    lines = [
+        f"# eager vs compiled (CPU, {torch.get_num_threads()} threads, torch {torch.__version__})",
+        "",
+        "| metric | eager | compiled | speedup |",
+        "|---|---|---|---|",
+        f"| T3 tokens/sec | {eager_tps:.1f} | {compiled_tps:.1f} | {compiled_tps / eager_tps:.2f}x |",
+        f"| S3Gen RTF | {eager_rtf:.3f} | {compiled_rtf:.3f} | {eager_rtf / compiled_rtf:.2f}x |",
+        "",
+        f"Compile + warmup: {warmup_seconds:.1f}s (inductor cache: {COMPILE_CACHE_DIR})",
+    ]
+    report = "\n".join(lines)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Benchmark int8 against fp32 CPU inference on the bundled voices
+
+Reports, per precision:
+  - model load time (the first int8 run also pays the one-time quantization)
+  - T3 speed in speech tokens/sec and S3Gen real-time factor
+  - speaker similarity of the output to the reference voice (VoiceEncoder cosine)
+and, for int8, the log-mel distance between the fp32 and int8 S3Gen outputs
+on identical speech tokens, which isolates the vocoder's quantization error.
+
+Usage:
+    python deploy_scripts/benchmark_precision.py [--max-voices 5] [--output report.md]
+"""
+import argparse
+import os
+import sys
+import time
+
+import librosa
+import numpy as np
+import torch
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+from chatterbox.tts import ChatterboxTTS
+from chatterbox.models.s3tokenizer import S3_SR
+
+VOICE_DIR = os.path.join(project_root, "modules", "voice_samples")
+TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Quantized inference should sound just like the original model, only faster.",
+    "On a cold winter morning, the old lighthouse keeper climbed the stairs one last time.",
+]
+SEED = 1234
+
+
+def bundled_voices(max_voices):
+    names = sorted(name for name in os.listdir(VOICE_DIR) if name.endswith(".wav"))
+    return [os.path.join(VOICE_DIR, name) for name in names[:max_voices]]
+
+
+def speaker_embedding(model, wav, sr):
+    wav_16k = librosa.resample(wav, orig_sr=sr, target_sr=S3_SR)
+    embed = model.ve.embeds_from_wavs([wav_16k], sample_rate=S3_SR)
+    embed = embed.mean(axis=0)
+    return embed / np.linalg.norm(embed)
+
+
+def log_mel(wav, sr):
+    mel = librosa.feature.melspectrogram(y=wav, sr=sr, n_fft=1024, hop_length=256, n_mels=80)
+    return librosa.power_to_db(mel, ref=1.0, top_db=None)
+
+
+def run(model, voices):
+    """Synthesize every text with every voice; returns timings, similarities and tokens per item."""
+    t3_tokens = t3_seconds = audio_seconds = vocode_seconds = 0.0
+    similarities, items = [], []
+    for voice in voices:
+        model.prepare_conditionals(voice)
+        ref_wav, ref_sr = librosa.load(voice, sr=None)
+        ref_embed = speaker_embedding(model, ref_wav, ref_sr)
+        for text in TEXTS:
+            torch.manual_seed(SEED)
+            start = time.perf_counter()
+            tokens = model.generate_tokens(text)
+            t3_seconds += time.perf_counter() - start
+            t3_tokens += tokens.numel()
+
+            torch.manual_seed(SEED)
+            start = time.perf_counter()
+            wav = model.tokens_to_wav(tokens).squeeze(0).numpy()
+            vocode_seconds += time.perf_counter() - start
+            audio_seconds += len(wav) / model.sr
+
+            similarities.append(float(speaker_embedding(model, wav, model.sr) @ ref_embed))
+            items.append((voice, tokens, wav))
+    return {
+        "tokens_per_second": t3_tokens / t3_seconds,
+        "s3gen_rtf": vocode_seconds / audio_seconds,
+        "total_rtf": (t3_seconds + vocode_seconds) / audio_seconds,
+        "speaker_similarity": float(np.mean(similarities)),
+        "items": items,
+    }
+
+
+def vocoder_mel_distance(fp32_model, int8_model, items):
+    """Mean absolute log-mel difference (dB) between fp32 and int8 S3Gen on the same tokens."""
+    distances = []
+    for voice, tokens, fp32_wav in items:
+        int8_model.prepare_conditionals(voice)
+        torch.manual_seed(SEED)
+        int8_wav = int8_model.tokens_to_wav(tokens).squeeze(0).numpy()
+        n = min(len(fp32_wav), len(int8_wav))
+        distances.append(float(np.abs(log_mel(fp32_wav[:n], fp32_model.sr) - log_mel(int8_wav[:n], int8_model.sr)).mean()))
+    return float(np.mean(distances))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-voices", type=int, default=5, help="number of bundled voices to use")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads (default: torch's choice)")
+    parser.add_argument("--output", help="also write the markdown report to this file")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    voices = bundled_voices(args.max_voices)
+    print(f"Benchmarking {len(voices)} voices x {len(TEXTS)} texts on CPU ({torch.get_num_threads()} threads)")
+
+    models, results = {}, {}
+    for precision in ("fp32", "int8"):
+        start = time.perf_counter()
+        models[precision] = ChatterboxTTS.from_pretrained("cpu", precision=precision)
+        load_seconds = time.perf_counter() - start
+        results[precision] = run(models[precision], voices)
+        results[precision]["load_seconds"] = load_seconds
+        print(f"  {precision}: done")
+
+    mel_distance = vocoder_mel_distance(models["fp32"], models["int8"], results["fp32"]["items"])
+
+    fp32, int8 = results["fp32"], results["int8"]
+    lines = [
+        f"# int8 vs fp32 ({len(voices)} voices x {len(TEXTS)} texts, {torch.get_num_threads()} threads, torch {torch.__version__})",
+        "",
+        "| metric | fp32 | int8 | int8 / fp32 |",
+        "|---|---|---|---|",
+        f"| load time (s) | {fp32['load_seconds']:.1f} | {int8['load_seconds']:.1f} | {int8['load_seconds'] / fp32['load_seconds']:.2f} |",
+        f"| T3 tokens/sec | {fp32['tokens_per_second']:.1f} | {int8['tokens_per_second']:.1f} | {int8['tokens_per_second'] / fp32['tokens_per_second']:.2f} |",
+        f"| S3Gen RTF | {fp32['s3gen_rtf']:.3f} | {int8['s3gen_rtf']:.3f} | {int8['s3gen_rtf'] / fp32['s3gen_rtf']:.2f} |",
+        f"| total RTF | {fp32['total_rtf']:.3f} | {int8['total_rtf']:.3f} | {int8['total_rtf'] / fp32['total_rtf']:.2f} |",
+        f"| speaker similarity | {fp32['speaker_similarity']:.3f} | {int8['speaker_similarity']:.3f} | |",
+        "",
+        f"S3Gen log-mel distance, fp32 vs int8 on identical tokens: {mel_distance:.2f} dB",
+    ]
+    report = "\n".join(lines)
+    print()
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
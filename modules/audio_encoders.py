@@ -0,0 +1,317 @@
+"""
+Output audio encoders for Chatterbox TTS Enhanced
+
+Generated audio is float32, about 96 KB per second at 24 kHz. These encoders
+turn it into 16-bit PCM or WAV (half that), FLAC (lossless, via soundfile) or
+Opus/MP3 (through an ffmpeg subprocess), one chunk at a time as chunks are
+generated. A streaming encoder returns the bytes ready after each chunk, for
+the HTTP API. A buffered one returns the whole file from `finish`, with
+exact sizes in its header, for the Gradio UI. Chunks are taken as the
+float32 arrays the models produce (`wav.squeeze(0).numpy()` shares the
+tensor's memory) and converted to int16 once, without a round trip through
+torch.
+"""
+import io
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from .config import OPUS_BITRATE, MP3_BITRATE
+
+# Encoded Gradio outputs are written here and removed after OUTPUT_RETENTION seconds
+OUTPUT_DIR = os.path.join(tempfile.gettempdir(), "chatterbox_outputs")
+OUTPUT_RETENTION = 3600
+
+
+def to_int16(wav):
+    """Float audio in [-1, 1] (any shape, numpy or CPU tensor) as a flat int16 array."""
+    scaled = np.clip(np.asarray(wav, dtype=np.float32).reshape(-1), -1.0, 1.0)
+    scaled *= 32767
+    return scaled.astype("<i2")
+
+
+def pcm16(wav):
+    """Float audio as 16-bit little-endian PCM bytes."""
+    return to_int16(wav).tobytes()
+
+
+class AudioEncoder:
+    """
+    Encode mono audio chunk by chunk. `encode` returns the bytes ready so far
+    (always b"" when not streaming) and `finish` the rest; `close` abandons
+    the stream.
+    """
+    extension = None
+    media_type = "application/octet-stream"
+
+    @classmethod
+    def content_type(cls, sample_rate):
+        return cls.media_type
+
+    def __init__(self, sample_rate, streaming=True):
+        self.sample_rate = sample_rate
+        self.streaming = streaming
+        self.samples = 0
+        self._held = []
+
+    def _emit(self, data):
+        if self.streaming:
+            return data
+        self._held.append(data)
+        return b""
+
+    def _held_bytes(self):
+        data = b"".join(self._held)
+        self._held = []
+        return data
+
+    def encode(self, wav):
+        raise NotImplementedError
+
+    def finish(self):
+        return self._held_bytes()
+
+    def close(self):
+        pass
+
+
+class PCMEncoder(AudioEncoder):
+    """Raw 16-bit little-endian PCM."""
+    extension = "pcm"
+
+    @classmethod
+    def content_type(cls, sample_rate):
+        return f"audio/L16; rate={sample_rate}; channels=1"
+
+    def encode(self, wav):
+        samples = to_int16(wav)
+        self.samples += len(samples)
+        return self._emit(samples.tobytes())
+
+
+class WAVEncoder(PCMEncoder):
+    """
+    16-bit PCM WAV. Streamed, the header goes out with the first chunk and
+    its sizes left at the maximum, since the length is not known yet.
+    """
+    extension = "wav"
+    media_type = "audio/wav"
+
+    def _header(self, data_bytes):
+        riff_bytes = min(data_bytes + 36, 0xFFFFFFFF)
+        return (
+            b"RIFF" + struct.pack("<I", riff_bytes) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, self.sample_rate, self.sample_rate * 2, 2, 16)
+            + b"data" + struct.pack("<I", min(data_bytes, 0xFFFFFFFF))
+        )
+
+    def encode(self, wav):
+        header = self._header(0xFFFFFFFF) if self.streaming and self.samples == 0 else b""
+        return header + super().encode(wav)
+
+    def finish(self):
+        if self.streaming:
+            return b"" if self.samples else self._header(0xFFFFFFFF)
+        return self._header(2 * self.samples) + self._held_bytes()
+
+
+class _ByteSink:
+    """
+    Write-only file object that hands out bytes as they are written. Writes
+    over bytes already handed out are dropped, such as libFLAC rewriting the
+    stream header on close; the header sent first marks the length unknown.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.taken = 0
+        self.position = 0
+        self.length = 0
+
+    def write(self, data):
+        end = self.position + len(data)
+        start = max(self.position, self.taken)
+        if end > start:
+            offset = start - self.taken
+            if offset > len(self.buffer):
+                self.buffer.extend(bytes(offset - len(self.buffer)))
+            self.buffer[offset:offset + end - start] = data[start - self.position:]
+        self.position = end
+        self.length = max(self.length, end)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.length}[whence]
+        self.position = base + offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def read(self, size=-1):
+        return b""
+
+    def take(self):
+        data = bytes(self.buffer)
+        self.taken += len(data)
+        self.buffer.clear()
+        return data
+
+
+class FLACEncoder(AudioEncoder):
+    """Lossless 16-bit FLAC through soundfile (libsndfile)."""
+    extension = "flac"
+    media_type = "audio/flac"
+
+    def __init__(self, sample_rate, streaming=True):
+        import soundfile as sf
+        super().__init__(sample_rate, streaming)
+        self._sink = _ByteSink() if streaming else io.BytesIO()
+        self._file = sf.SoundFile(
+            self._sink, "w", samplerate=sample_rate, channels=1, format="FLAC", subtype="PCM_16"
+        )
+
+    def _output(self):
+        return self._sink.take() if self.streaming else b""
+
+    def encode(self, wav):
+        samples = to_int16(wav)
+        self.samples += len(samples)
+        self._file.write(samples)
+        return self._output()
+
+    def finish(self):
+        self._file.close()
+        return self._sink.take() if self.streaming else self._sink.getvalue()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class FFmpegEncoder(AudioEncoder):
+    """
+    Lossy encoding by an ffmpeg subprocess fed 16-bit PCM on stdin. A reader
+    thread drains its stdout, so writing never blocks on a full pipe.
+    """
+    codec_args = ()
+
+    def __init__(self, sample_rate, streaming=True):
+        super().__init__(sample_rate, streaming)
+        self._process = subprocess.Popen(
+            [
+                "ffmpeg", "-hide_banner", "-loglevel", "error",
+                "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+                *self.codec_args, "pipe:1",
+            ],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+        self._output = []
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_output, daemon=True)
+        self._reader.start()
+
+    def _read_output(self):
+        while data := self._process.stdout.read1(65536):
+            with self._lock:
+                self._output.append(data)
+
+    def _drain(self):
+        with self._lock:
+            data = b"".join(self._output)
+            self._output = []
+        return data
+
+    def encode(self, wav):
+        samples = to_int16(wav)
+        self.samples += len(samples)
+        try:
+            self._process.stdin.write(samples.tobytes())
+            self._process.stdin.flush()
+        except BrokenPipeError:
+            self._fail()
+        return self._drain() if self.streaming else b""
+
+    def finish(self):
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._reader.join()
+        if self._process.wait() != 0:
+            self._fail()
+        return self._drain()
+
+    def _fail(self):
+        self._process.kill()
+        self._process.wait()
+        error = self._process.stderr.read().decode("utf-8", "replace").strip()
+        raise RuntimeError(f"ffmpeg {self.extension} encoding failed: {error or 'unknown error'}")
+
+    def close(self):
+        if self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+
+
+class OpusEncoder(FFmpegEncoder):
+    """Opus in Ogg, with pages flushed as soon as they are complete."""
+    extension = "opus"
+    media_type = "audio/ogg"
+    codec_args = ("-c:a", "libopus", "-b:a", OPUS_BITRATE, "-flush_packets", "1", "-f", "ogg")
+
+
+class MP3Encoder(FFmpegEncoder):
+    extension = "mp3"
+    media_type = "audio/mpeg"
+    codec_args = ("-c:a", "libmp3lame", "-b:a", MP3_BITRATE, "-f", "mp3")
+
+
+ENCODERS = {
+    "wav": WAVEncoder,
+    "pcm": PCMEncoder,
+    "flac": FLACEncoder,
+    "opus": OpusEncoder,
+    "mp3": MP3Encoder,
+}
+
+# Formats a Gradio audio player can play back
+PLAYABLE_FORMATS = ["wav", "flac", "opus", "mp3"]
+
+
+def check_format(output_format):
+    """Return the encoder class for `output_format`. Raises ValueError for unknown or unavailable formats."""
+    encoder_class = ENCODERS.get(output_format)
+    if encoder_class is None:
+        raise ValueError(f"Unknown output format '{output_format}' (choose from {', '.join(ENCODERS)})")
+    if issubclass(encoder_class, FFmpegEncoder) and shutil.which("ffmpeg") is None:
+        raise ValueError(f"Output format '{output_format}' needs ffmpeg, which is not installed")
+    return encoder_class
+
+
+def get_encoder(output_format, sample_rate, streaming=True):
+    """Create an encoder for `output_format`. Raises ValueError for unknown or unavailable formats."""
+    return check_format(output_format)(sample_rate, streaming=streaming)
+
+
+def write_output_file(data, output_format):
+    """Write encoded audio for Gradio to serve, pruning outputs older than OUTPUT_RETENTION."""
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    cutoff = time.time() - OUTPUT_RETENTION
+    for name in os.listdir(OUTPUT_DIR):
+        fpath = os.path.join(OUTPUT_DIR, name)
+        try:
+            if os.path.getmtime(fpath) < cutoff:
+                os.remove(fpath)
+        except OSError:
+            pass
+    fd, fpath = tempfile.mkstemp(suffix=f".{ENCODERS[output_format].extension}", dir=OUTPUT_DIR)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return fpath
@@ -0,0 +1,153 @@
+"""
+Micro-batching of T3 decoding across concurrent requests for Chatterbox TTS Enhanced
+
+Concurrent requests otherwise take turns on the one loaded model. With
+CHATTERBOX_BATCHING enabled, each request's chunk decodes are submitted here
+instead; a scheduler thread waits up to CHATTERBOX_BATCH_WAIT_MS for
+compatible work (same model, language and sampling parameters, the latter
+rounded to two decimals and decoded at those values), decodes up to
+CHATTERBOX_BATCH_SIZE chunks in one batched T3 pass, and hands each caller
+its own speech tokens. Voices may differ within a batch. Vocoding stays in
+each request's own pipeline. Fixed-seed requests are not batched, so their
+output does not depend on what they share a batch with.
+"""
+import os
+import threading
+import time
+
+from .config import BATCHING, BATCH_MAX_WAIT_MS, BATCH_MAX_SIZE
+
+
+class _Job:
+    def __init__(self, model, text, context):
+        self.model = model
+        self.text = text
+        self.context = context
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BatchScheduler:
+    """Collect chunk decodes for up to `max_wait_ms` and run compatible ones as one T3 batch."""
+
+    def __init__(self, enabled=BATCHING, max_wait_ms=BATCH_MAX_WAIT_MS, max_batch_size=BATCH_MAX_SIZE):
+        self.enabled = enabled
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self._pending = []  # (group key, job), oldest first
+        self._cond = threading.Condition()
+        self._pid = None
+        # Per batch size: batches, requests, queue wait, decode time and tokens
+        self._stats = {}
+
+    def _ensure_thread(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        with self._cond:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._pending = []
+                threading.Thread(target=self._loop, daemon=True).start()
+
+    @staticmethod
+    def group_key(model, params):
+        rounded = tuple(sorted(
+            (name, round(value, 2) if isinstance(value, float) else value)
+            for name, value in params.items()
+        ))
+        return (id(model), rounded)
+
+    def decode(self, model, text, context, **params):
+        """
+        Return the speech tokens of `text` in the voice of a request's
+        GenerationContext, sampled from its generator, decoded in a batch with
+        whatever compatible chunks arrive meanwhile. `params` are passed to
+        `model.generate_pair_tokens` (e.g. language_id, temperature).
+        """
+        self._ensure_thread()
+        job = _Job(model, text, context)
+        with self._cond:
+            self._pending.append((self.group_key(model, params), job))
+            self._cond.notify()
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def _next_batch(self):
+        """Block until the oldest job's group is full or has waited max_wait, then take it."""
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            key, oldest = self._pending[0]
+            deadline = oldest.submitted + self.max_wait
+            while True:
+                group = [job for k, job in self._pending if k == key]
+                remaining = deadline - time.perf_counter()
+                if len(group) >= self.max_batch_size or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = group[:self.max_batch_size]
+            taken = set(map(id, batch))
+            self._pending = [(k, job) for k, job in self._pending if id(job) not in taken]
+        return key, batch
+
+    def _loop(self):
+        while True:
+            key, batch = self._next_batch()
+            params = dict(key[1])
+            start = time.perf_counter()
+            try:
+                results = batch[0].model.generate_pair_tokens(
+                    [(job.text, job.context.conds) for job in batch],
+                    max_batch_size=len(batch),
+                    generator=[job.context.generator for job in batch],
+                    **params,
+                )
+            except Exception as e:
+                for job in batch:
+                    job.error = e
+                    job.done.set()
+                continue
+            run_seconds = time.perf_counter() - start
+            for job, tokens in zip(batch, results):
+                job.result = tokens
+                job.done.set()
+            self._record(batch, start, run_seconds, sum(tokens.numel() for tokens in results))
+
+    def _record(self, batch, start, run_seconds, tokens):
+        with self._cond:
+            entry = self._stats.setdefault(len(batch), {
+                "batches": 0, "requests": 0, "wait_seconds": 0.0, "run_seconds": 0.0, "tokens": 0,
+            })
+            entry["batches"] += 1
+            entry["requests"] += len(batch)
+            entry["wait_seconds"] += sum(start - job.submitted for job in batch)
+            entry["run_seconds"] += run_seconds
+            entry["tokens"] += tokens
+
+    def stats(self):
+        """Throughput and latency per batch size, for monitoring."""
+        with self._cond:
+            by_size = {
+                size: {
+                    "batches": entry["batches"],
+                    "requests": entry["requests"],
+                    "mean_wait_ms": round(1000 * entry["wait_seconds"] / entry["requests"], 1),
+                    "mean_decode_seconds": round(entry["run_seconds"] / entry["batches"], 3),
+                    "tokens_per_second": round(entry["tokens"] / entry["run_seconds"], 1) if entry["run_seconds"] else 0.0,
+                }
+                for size, entry in sorted(self._stats.items())
+            }
+            return {
+                "enabled": self.enabled,
+                "max_wait_ms": round(self.max_wait * 1000, 1),
+                "max_batch_size": self.max_batch_size,
+                "pending": len(self._pending),
+                "by_batch_size": by_size,
+            }
+
+
+# Global scheduler; requests only go through it when batching is enabled
+batch_scheduler = BatchScheduler()
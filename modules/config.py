@@ -14,6 +14,39 @@ PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 VOICE_DIR = os.path.join(PROJECT_ROOT, "voice_samples")
 os.makedirs(VOICE_DIR, exist_ok=True)
 
+# Precomputed voice conditionals, content-addressed by reference audio hash
+CONDS_DIR = os.path.join(PROJECT_ROOT, "voice_conds")
+
+# Max chunks buffered between the T3 and S3Gen pipeline stages
+PIPELINE_QUEUE_SIZE = int(os.getenv("CHATTERBOX_PIPELINE_QUEUE_SIZE", "2"))
+
+# Model residency: memory budget for loaded weights in MB (0 = 80% of device
+# memory) and idle seconds after which a model is unloaded (0 = never)
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("CHATTERBOX_MODEL_MEMORY_MB", "0"))
+MODEL_IDLE_TIMEOUT = float(os.getenv("CHATTERBOX_MODEL_IDLE_SECONDS", "1800"))
+
+# Models to load and warm up at server start, e.g. "tts,mtl" (empty = load lazily)
+PRELOAD_MODELS = [m.strip() for m in os.getenv("CHATTERBOX_PRELOAD", "").split(",") if m.strip()]
+
+# Inference worker processes forked after preloading, sharing one copy of the
+# weights (1 = generate in the server process; CPU only)
+INFERENCE_WORKERS = int(os.getenv("CHATTERBOX_WORKERS", "1"))
+
+# Micro-batching of concurrent requests' T3 decoding: how long to wait for
+# compatible work (ms) and the largest batch to decode at once
+BATCHING = os.getenv("CHATTERBOX_BATCHING", "0").lower() in ("1", "true", "yes")
+BATCH_MAX_WAIT_MS = float(os.getenv("CHATTERBOX_BATCH_WAIT_MS", "20"))
+BATCH_MAX_SIZE = int(os.getenv("CHATTERBOX_BATCH_SIZE", "8"))
+
+# HTTP API (/v1): generations running at once (like the Gradio queue's
+# concurrency limit) and seconds an idle keep-alive connection stays open
+HTTP_CONCURRENCY = int(os.getenv("CHATTERBOX_HTTP_CONCURRENCY", "3"))
+HTTP_KEEP_ALIVE_SECONDS = int(os.getenv("CHATTERBOX_HTTP_KEEP_ALIVE", "75"))
+
+# Bitrates of the lossy output formats (encoded by ffmpeg)
+OPUS_BITRATE = os.getenv("CHATTERBOX_OPUS_BITRATE", "32k")
+MP3_BITRATE = os.getenv("CHATTERBOX_MP3_BITRATE", "64k")
+
 # Device configuration
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
@@ -46,9 +79,35 @@ else:
 print("=" * 50)
 print()
 
+# Weight precision the server loads models in. The int8 mode of the models
+# stays out of the server until deploy_scripts/benchmark_precision.py has
+# measured its speed and quality (see deploy_scripts/BENCHMARKS.md)
+MODEL_PRECISION = "fp32"
+if os.getenv("CHATTERBOX_PRECISION", "fp32").lower() != "fp32":
+    print("⚠️  CHATTERBOX_PRECISION is not supported by the server yet - using fp32")
+
+# Whether the server torch.compiles the T3 decode step and S3Gen estimator at
+# load time. This stays off until deploy_scripts/benchmark_compile.py has
+# measured it on the target CPUs (see deploy_scripts/BENCHMARKS.md)
+COMPILE_MODELS = False
+if os.getenv("CHATTERBOX_COMPILE", "0").lower() in ("1", "true", "yes"):
+    print("⚠️  CHATTERBOX_COMPILE is not supported by the server yet - running eager")
+
 # Supported languages from chatterbox.mtl_tts
 from chatterbox.mtl_tts import SUPPORTED_LANGUAGES
 
+# Back the shared conditionals cache with the on-disk voice store
+from chatterbox.cond_cache import CONDS_CACHE, ConditionalsStore
+CONDS_CACHE.store = ConditionalsStore(CONDS_DIR)
+
+# Fixed-seed synthesis results (CHATTERBOX_TOKEN_CACHE_MB/CHATTERBOX_AUDIO_CACHE_MB
+# size the in-memory tiers); set a directory to spill evicted entries to disk
+SYNTHESIS_SPILL_DIR = os.getenv("CHATTERBOX_SYNTH_CACHE_DIR", "")
+SYNTHESIS_SPILL_MB = float(os.getenv("CHATTERBOX_SYNTH_CACHE_DISK_MB", "2048"))
+from chatterbox.synthesis_cache import SYNTHESIS_CACHE
+if SYNTHESIS_SPILL_DIR:
+    SYNTHESIS_CACHE.enable_spill(SYNTHESIS_SPILL_DIR, int(SYNTHESIS_SPILL_MB * 1024**2))
+
 # Language configuration with sample audio and text
 LANGUAGE_CONFIG = {
     "ar": {"audio": "https://storage.googleapis.com/chatterbox-demo-samples/mtl_prompts/ar_f/ar_prompts2.flac", "text": "مرحبًا! أنا The Oracle Guy وأنا هنا لفتح أسرار الذكاء الاصطناعي! اشترك الآن وانضم إلى ثورة الذكاء الاصطناعي!"},
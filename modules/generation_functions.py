@@ -1,23 +1,26 @@
 """
 Speech generation, conversion, and utility functions for Chatterbox TTS Enhanced
 """
-import random
-import numpy as np
-import torch
+import queue
+import threading
 import time
-import re
-from .config import DEVICE, LANGUAGE_CONFIG, SUPPORTED_LANGUAGES
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from .config import DEVICE, LANGUAGE_CONFIG, SUPPORTED_LANGUAGES, PIPELINE_QUEUE_SIZE, MODEL_PRECISION
 from .model_manager import model_manager
+from .pipeline import ChunkPipeline
+from .batch_scheduler import batch_scheduler
 from .voice_manager import resolve_voice_path
+from .audio_encoders import get_encoder, write_output_file
+from .text_chunking import TextSegmenter, smart_chunk_text
+from .worker_pool import worker_pool
+from chatterbox.models.s3gen import S3GEN_SR
+from chatterbox.synthesis_cache import SYNTHESIS_CACHE
 
 
-def set_seed(seed: int):
-    """Set random seed for reproducibility."""
-    torch.manual_seed(seed)
-    torch.cuda.manual_seed(seed)
-    torch.cuda.manual_seed_all(seed)
-    random.seed(seed)
-    np.random.seed(seed)
+def model_id(model):
+    """Identify the weights that produce a model's output, for SYNTHESIS_CACHE keys."""
+    return f"{type(model).__name__}-{model.conds_tag}-{MODEL_PRECISION}"
 
 
 def estimate_generation_time(text_length):
@@ -34,84 +37,91 @@ def format_time(seconds):
     return f"{minutes} minute{'s' if minutes != 1 else ''} {seconds:.1f} seconds"
 
 
-def smart_chunk_text(text, max_words=40):
+def speech_voice_path(voice_name, language_code=None):
     """
-    Intelligently chunk text based on sentence boundaries and word count.
-    Accumulates sentences to maximize chunk size up to max_words.
-    Supports all languages including CJK (Chinese, Japanese, Korean).
+    Reference audio for a request's voice. No voice means the built-in voice,
+    or the language's sample voice for multilingual requests. Raises
+    ValueError for unknown voices.
     """
-    # Detect if text contains CJK characters (Chinese, Japanese, Korean)
-    def has_cjk(text):
-        return bool(re.search(r'[\u4e00-\u9fff\u3040-\u309f\u30a0-\u30ff\uac00-\ud7af]', text))
-    
-    is_cjk = has_cjk(text)
-    
-    # Enhanced sentence pattern supporting multiple languages
-    # Includes: . ! ? (Western), 。！？ (CJK), । (Hindi), ؟ (Arabic)
-    sentence_pattern = r'(?<=[.!?。！？।؟])\s*|\n+'
-    sentences = re.split(sentence_pattern, text)
-    
-    chunks = []
-    current_chunk = []
-    current_count = 0
-    
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if not sentence:
-            continue
-        
-        # Count words (space-separated) or characters (CJK)
-        if is_cjk:
-            sentence_count = len(re.sub(r'\s+', '', sentence))
-        else:
-            sentence_count = len(sentence.split())
-        
-        # Check if adding this sentence exceeds the limit
-        if current_count + sentence_count > max_words:
-            # If current chunk is not empty, save it
-            if current_chunk:
-                chunks.append(' '.join(current_chunk) if not is_cjk else ''.join(current_chunk))
-                current_chunk = []
-                current_count = 0
-            
-            # If the single sentence itself is longer than max_words, we must split it
-            if sentence_count > max_words:
-                # Split at commas/semicolons: , ; (Western), ，、； (CJK), ، (Arabic)
-                sub_parts = re.split(r'[,;،、；،]\s*', sentence)
-                for part in sub_parts:
-                    part = part.strip()
-                    if not part:
-                        continue
-                    
-                    if is_cjk:
-                        part_count = len(re.sub(r'\s+', '', part))
-                    else:
-                        part_count = len(part.split())
-                    
-                    if current_count + part_count > max_words and current_chunk:
-                        chunks.append(' '.join(current_chunk) if not is_cjk else ''.join(current_chunk))
-                        current_chunk = [part]
-                        current_count = part_count
-                    else:
-                        current_chunk.append(part)
-                        current_count += part_count
-            else:
-                # Sentence fits in a new chunk
-                current_chunk.append(sentence)
-                current_count += sentence_count
+    if not voice_name or voice_name == "None":
+        return LANGUAGE_CONFIG.get(language_code, {}).get("audio") if language_code else None
+    audio_prompt_path = resolve_voice_path(voice_name, language_code or "en")
+    if not audio_prompt_path:
+        raise ValueError(f"Voice '{voice_name}' not found")
+    return audio_prompt_path
+
+
+def vc_target_path(target_voice_name):
+    """Reference audio of a voice conversion target (None for the default voice). Raises ValueError for unknown voices."""
+    # Remove gender symbols if present
+    clean_name = (target_voice_name or "").replace(" ♂️", "").replace(" ♀️", "")
+    if not clean_name or clean_name == "None":
+        return None
+
+    # Try to find the voice with different gender suffix combinations
+    from .voice_manager import VOICES
+    possible_names = [
+        clean_name,
+        f"{clean_name}_male",
+        f"{clean_name}_female"
+    ]
+    for name in possible_names:
+        if name in VOICES["samples"]:
+            return VOICES["samples"][name]
+    raise ValueError(f"Target voice '{target_voice_name}' not found")
+
+
+class SpeechJob:
+    """
+    The core of one TTS request, shared by the Gradio handlers and the HTTP API.
+    Iterating it prepares a request-scoped voice context, then yields
+    (chunk index, (1, N) watermarked wav) as each text chunk is vocoded, with
+    T3 decoding chunk i+1 while S3Gen vocodes chunk i.
+    """
+
+    def __init__(self, model, text, audio_prompt_path, seed_num, exaggeration, sampling, language_code=None):
+        self.model = model
+        self.text = text
+        self.audio_prompt_path = audio_prompt_path
+        self.seed_num = seed_num
+        self.exaggeration = exaggeration
+        self.sampling = dict(sampling, language_id=language_code) if language_code else dict(sampling)
+        self.language = language_code.lower() if language_code else None
+        self.text_chunks = smart_chunk_text(text)
+        self.pipeline = None
+
+    def __iter__(self):
+        model = self.model
+        sampling = self.sampling
+
+        # The voice and the seeded sampling generator belong to this request,
+        # so the shared model is never changed. Every chunk is tokenized once.
+        context = model.new_context(self.audio_prompt_path, exaggeration=self.exaggeration, seed=int(self.seed_num))
+        model.frontend.tokenize_batch(self.text_chunks, self.language)
+
+        # Fixed-seed requests reuse cached tokens or audio from identical earlier requests
+        cache_key = SYNTHESIS_CACHE.request_key(
+            model_id(model), self.audio_prompt_path, self.text, self.seed_num,
+            exaggeration=self.exaggeration, **sampling,
+        )
+        if batch_scheduler.enabled and self.seed_num == 0:
+            # Unseeded chunks share T3 batches with other requests' chunks
+            decode = lambda index, chunk: batch_scheduler.decode(model, chunk, context, **sampling)
         else:
-            # Sentence fits in current chunk
-            current_chunk.append(sentence)
-            current_count += sentence_count
-    
-    # Add remaining chunk
-    if current_chunk:
-        chunks.append(' '.join(current_chunk) if not is_cjk else ''.join(current_chunk))
-    
-    return chunks if chunks else [text]
-
-
-def generate_speech(text, voice_name, exaggeration, temperature, seed_num, cfgw, min_p, top_p, repetition_penalty):
+            # Each seeded chunk samples from its own generator, so cache hits on other chunks cannot shift it
+            decode = lambda index, chunk: model.generate_tokens(chunk, context=context.for_chunk(index), **sampling)
+        vocode = lambda tokens: model.tokens_to_wav(tokens, context=context)
+        decode, vocode = SYNTHESIS_CACHE.stages(cache_key, decode, vocode)
+        self.pipeline = ChunkPipeline(decode=decode, vocode=vocode, queue_size=PIPELINE_QUEUE_SIZE)
+
+        yield from self.pipeline.run(list(enumerate(self.text_chunks)))
+        print(f"ℹ️ Pipeline stage utilization: {self.pipeline.format_utilization()}")
+
+    def format_utilization(self):
+        return self.pipeline.format_utilization() if self.pipeline is not None else "n/a"
+
+
+def generate_speech(text, voice_name, exaggeration, temperature, seed_num, cfgw, min_p, top_p, repetition_penalty, output_format="wav"):
     """Generate speech with progress tracking and validation."""
     try:
         start_time = time.time()
@@ -134,68 +144,65 @@ def generate_speech(text, voice_name, exaggeration, temperature, seed_num, cfgw,
                 return
             yield 10, None, f"Loading voice: {voice_name}..."
         
-        # Load model via manager (handles unloading others)
+        # Load model via manager (shares components with resident models)
         yield 20, None, "Loading TTS model..."
-        model = model_manager.get_tts_model()
-        if model is None:
-             yield 0, None, "❌ Error: Failed to load TTS model."
-             return
-        
-        # Set seed if specified
-        if seed_num != 0:
-            set_seed(int(seed_num))
-            yield 30, None, f"Seed set to {seed_num}"
-        
-        # Chunk text
-        text_chunks = smart_chunk_text(text)
-        total_chunks = len(text_chunks)
-        generated_wavs = []
-        
-        # Estimate time
-        estimated_time = estimate_generation_time(len(text))
-        yield 40, None, f"Generating speech (English)...\nChunks: {total_chunks}\nEstimated time: {format_time(estimated_time)}"
-        
-        # Generate audio for each chunk
-        for i, chunk in enumerate(text_chunks):
-            progress = 40 + int((i / total_chunks) * 50)
-            yield progress, None, f"Generating chunk {i+1}/{total_chunks}..."
-            
-            chunk_wav = model.generate(
-                chunk,
-                audio_prompt_path=audio_prompt_path,
-                exaggeration=exaggeration,
-                temperature=temperature,
-                cfg_weight=cfgw,
-                min_p=min_p,
-                top_p=top_p,
-                repetition_penalty=repetition_penalty,
+        with model_manager.use("tts") as model:
+            if model is None:
+                 yield 0, None, "❌ Error: Failed to load TTS model."
+                 return
+        
+            # Set seed if specified
+            if seed_num != 0:
+                yield 30, None, f"Seed set to {seed_num}"
+        
+            # Chunk text
+            job = SpeechJob(
+                model, text, audio_prompt_path, seed_num, exaggeration,
+                sampling=dict(
+                    temperature=temperature,
+                    cfg_weight=cfgw,
+                    min_p=min_p,
+                    top_p=top_p,
+                    repetition_penalty=repetition_penalty,
+                ),
             )
-            generated_wavs.append(chunk_wav)
-        
-        if not generated_wavs:
-             yield 0, None, "❌ Error: No audio generated."
-             return
+            total_chunks = len(job.text_chunks)
+            encoder = get_encoder(output_format, model.sr, streaming=False)
+            generated_chunks = 0
+        
+            # Estimate time
+            estimated_time = estimate_generation_time(len(text))
+            yield 40, None, f"Generating speech (English)...\nChunks: {total_chunks}\nEstimated time: {format_time(estimated_time)}"
+        
+            # Generate audio for each chunk, encoding it as soon as it is ready
+            try:
+                for i, chunk_wav in job:
+                    encoder.encode(chunk_wav.squeeze(0).numpy())
+                    generated_chunks += 1
+                    progress = 40 + int(((i + 1) / total_chunks) * 50)
+                    yield progress, None, f"Generated chunk {i+1}/{total_chunks}..."
+            
+                if not generated_chunks:
+                     yield 0, None, "❌ Error: No audio generated."
+                     return
 
-        yield 90, None, "Finalizing audio..."
-        
-        # Concatenate audio chunks
-        if len(generated_wavs) > 1:
-            full_wav = torch.cat(generated_wavs, dim=-1)
-        else:
-            full_wav = generated_wavs[0]
+                yield 90, None, "Finalizing audio..."
+                audio_path = write_output_file(encoder.finish(), output_format)
+            finally:
+                encoder.close()
         
-        # Calculate actual time taken
-        total_time = time.time() - start_time
-        final_status = f"✅ Generation complete!\nTime taken: {format_time(total_time)}\nText length: {len(text)} chars\nChunks: {total_chunks}"
+            # Calculate actual time taken
+            total_time = time.time() - start_time
+            final_status = f"✅ Generation complete!\nTime taken: {format_time(total_time)}\nText length: {len(text)} chars\nChunks: {total_chunks}\nStage utilization: {job.format_utilization()}"
         
-        yield 100, (model.sr, full_wav.squeeze(0).numpy()), final_status
+            yield 100, audio_path, final_status
         
     except Exception as e:
         error_status = f"❌ Error generating speech: {str(e)}"
         yield 0, None, error_status
 
 
-def generate_multilingual_speech(text, voice_name, language_code, exaggeration, temperature, seed_num, cfgw):
+def generate_multilingual_speech(text, voice_name, language_code, exaggeration, temperature, seed_num, cfgw, output_format="wav"):
     """Generate multilingual speech with progress tracking."""
     try:
         start_time = time.time()
@@ -223,67 +230,61 @@ def generate_multilingual_speech(text, voice_name, language_code, exaggeration,
                 return
             yield 10, None, f"Loading voice: {voice_name}..."
         
-        # Load model via manager (handles unloading others)
+        # Load model via manager (shares components with resident models)
         yield 20, None, "Loading Multilingual TTS model..."
-        model = model_manager.get_mtl_model()
-        if model is None:
-             yield 0, None, "❌ Error: Failed to load Multilingual model."
-             return
-        
-        # Set seed if specified
-        if seed_num != 0:
-            set_seed(int(seed_num))
-            yield 30, None, f"Seed set to {seed_num}"
-        
-        # Chunk text
-        text_chunks = smart_chunk_text(text)
-        total_chunks = len(text_chunks)
-        generated_wavs = []
-        
-        # Estimate time
-        estimated_time = estimate_generation_time(len(text))
-        lang_name = SUPPORTED_LANGUAGES.get(language_code, language_code)
-        yield 40, None, f"Generating speech in {lang_name}...\nChunks: {total_chunks}\nEstimated time: {format_time(estimated_time)}"
-        
-        # Generate audio for each chunk
-        for i, chunk in enumerate(text_chunks):
-            progress = 40 + int((i / total_chunks) * 50)
-            yield progress, None, f"Generating chunk {i+1}/{total_chunks}..."
-            
-            chunk_wav = model.generate(
-                chunk,
-                language_id=language_code,
-                audio_prompt_path=audio_prompt_path,
-                exaggeration=exaggeration,
-                temperature=temperature,
-                cfg_weight=cfgw,
+        with model_manager.use("mtl") as model:
+            if model is None:
+                 yield 0, None, "❌ Error: Failed to load Multilingual model."
+                 return
+        
+            # Set seed if specified
+            if seed_num != 0:
+                yield 30, None, f"Seed set to {seed_num}"
+        
+            # Chunk text
+            job = SpeechJob(
+                model, text, audio_prompt_path, seed_num, exaggeration,
+                sampling=dict(temperature=temperature, cfg_weight=cfgw),
+                language_code=language_code,
             )
-            generated_wavs.append(chunk_wav)
+            total_chunks = len(job.text_chunks)
+            encoder = get_encoder(output_format, model.sr, streaming=False)
+            generated_chunks = 0
+        
+            # Estimate time
+            estimated_time = estimate_generation_time(len(text))
+            lang_name = SUPPORTED_LANGUAGES.get(language_code, language_code)
+            yield 40, None, f"Generating speech in {lang_name}...\nChunks: {total_chunks}\nEstimated time: {format_time(estimated_time)}"
+        
+            # Generate audio for each chunk, encoding it as soon as it is ready
+            try:
+                for i, chunk_wav in job:
+                    encoder.encode(chunk_wav.squeeze(0).numpy())
+                    generated_chunks += 1
+                    progress = 40 + int(((i + 1) / total_chunks) * 50)
+                    yield progress, None, f"Generated chunk {i+1}/{total_chunks}..."
             
-        if not generated_wavs:
-             yield 0, None, "❌ Error: No audio generated."
-             return
-        
-        yield 90, None, "Finalizing audio..."
-        
-        # Concatenate audio chunks
-        if len(generated_wavs) > 1:
-            full_wav = torch.cat(generated_wavs, dim=-1)
-        else:
-            full_wav = generated_wavs[0]
+                if not generated_chunks:
+                     yield 0, None, "❌ Error: No audio generated."
+                     return
+
+                yield 90, None, "Finalizing audio..."
+                audio_path = write_output_file(encoder.finish(), output_format)
+            finally:
+                encoder.close()
         
-        # Calculate actual time taken
-        total_time = time.time() - start_time
-        final_status = f"✅ Generation complete!\nLanguage: {lang_name}\nTime taken: {format_time(total_time)}\nText length: {len(text)} chars\nChunks: {total_chunks}"
+            # Calculate actual time taken
+            total_time = time.time() - start_time
+            final_status = f"✅ Generation complete!\nLanguage: {lang_name}\nTime taken: {format_time(total_time)}\nText length: {len(text)} chars\nChunks: {total_chunks}\nStage utilization: {job.format_utilization()}"
         
-        yield 100, (model.sr, full_wav.squeeze(0).numpy()), final_status
+            yield 100, audio_path, final_status
         
     except Exception as e:
         error_status = f"❌ Error generating speech: {str(e)}"
         yield 0, None, error_status
 
 
-def convert_voice(input_audio, target_voice_name):
+def convert_voice(input_audio, target_voice_name, output_format="wav"):
     """Convert voice with progress tracking."""
     try:
         start_time = time.time()
@@ -295,52 +296,251 @@ def convert_voice(input_audio, target_voice_name):
         
         yield 20, None, "Loading input audio..."
         
-        # Remove gender symbols if present
-        clean_name = target_voice_name.replace(" ♂️", "").replace(" ♀️", "")
-        
-        if not clean_name or clean_name == "None":
-            target_voice_path = None
+        try:
+            target_voice_path = vc_target_path(target_voice_name)
+        except ValueError:
+            yield 0, None, f"❌ Error: Target voice '{target_voice_name}' not found."
+            return
+        if target_voice_path is None:
             yield 40, None, "⚠️ No target voice selected - using default..."
         else:
-            # Try to find the voice with different gender suffix combinations
-            from .voice_manager import VOICES
-            possible_names = [
-                clean_name,
-                f"{clean_name}_male",
-                f"{clean_name}_female"
-            ]
-            
-            target_voice_path = None
-            for name in possible_names:
-                if name in VOICES["samples"]:
-                    target_voice_path = VOICES["samples"][name]
-                    break
-            
-            if not target_voice_path:
-                yield 0, None, f"❌ Error: Target voice '{target_voice_name}' not found."
-                return
             yield 40, None, f"Using target voice: {target_voice_name}..."
         
-        # Load model via manager (handles unloading others)
+        # Load model via manager (shares components with resident models)
         yield 60, None, "Loading Voice Conversion model..."
-        model = model_manager.get_vc_model()
-        if model is None:
-             yield 0, None, "❌ Error: Failed to load VC model."
-             return
+        with model_manager.use("vc") as model:
+            if model is None:
+                 yield 0, None, "❌ Error: Failed to load VC model."
+                 return
         
-        yield 70, None, "Converting voice..."
+            yield 70, None, "Converting voice..."
         
-        # Convert voice
-        wav = model.generate(input_audio, target_voice_path=target_voice_path)
-        
-        yield 95, None, "Finalizing audio..."
+            # Convert voice
+            encoder = get_encoder(output_format, model.sr, streaming=False)
+            try:
+                wav = model.generate(input_audio, target_voice_path=target_voice_path)
+            
+                yield 95, None, "Finalizing audio..."
+                encoder.encode(wav.squeeze(0).numpy())
+                audio_path = write_output_file(encoder.finish(), output_format)
+            finally:
+                encoder.close()
         
-        # Calculate actual time taken
-        total_time = time.time() - start_time
-        final_status = f"✅ Conversion complete!\nTime taken: {format_time(total_time)}"
+            # Calculate actual time taken
+            total_time = time.time() - start_time
+            final_status = f"✅ Conversion complete!\nTime taken: {format_time(total_time)}"
         
-        yield 100, (model.sr, wav.squeeze(0).numpy()), final_status
+            yield 100, audio_path, final_status
         
     except Exception as e:
         error_status = f"❌ Error converting voice: {str(e)}"
         yield 0, None, error_status
+
+
+# ---------------------------
+# Streaming handlers for the HTTP API: each yields (sample rate, encoded bytes)
+# as soon as a chunk's audio is vocoded and encoded, and raises on invalid requests
+# ---------------------------
+def _encode_chunks(sample_rate, wavs, output_format):
+    encoder = get_encoder(output_format, sample_rate)
+    try:
+        for wav in wavs:
+            if data := encoder.encode(wav.squeeze(0).numpy()):
+                yield sample_rate, data
+        if data := encoder.finish():
+            yield sample_rate, data
+    finally:
+        encoder.close()
+
+
+def stream_speech(text, voice_name, exaggeration, temperature, seed_num, cfgw, min_p, top_p, repetition_penalty, output_format="wav"):
+    """Stream English speech chunk by chunk; the streaming counterpart of `generate_speech`."""
+    if not text or not text.strip():
+        raise ValueError("Input text cannot be empty")
+    audio_prompt_path = speech_voice_path(voice_name)
+    with model_manager.use("tts") as model:
+        if model is None:
+            raise RuntimeError("Failed to load TTS model")
+        job = SpeechJob(
+            model, text, audio_prompt_path, seed_num, exaggeration,
+            sampling=dict(
+                temperature=temperature,
+                cfg_weight=cfgw,
+                min_p=min_p,
+                top_p=top_p,
+                repetition_penalty=repetition_penalty,
+            ),
+        )
+        yield from _encode_chunks(model.sr, (chunk_wav for _, chunk_wav in job), output_format)
+
+
+def stream_multilingual_speech(text, voice_name, language_code, exaggeration, temperature, seed_num, cfgw, output_format="wav"):
+    """Stream multilingual speech chunk by chunk; the streaming counterpart of `generate_multilingual_speech`."""
+    if not text or not text.strip():
+        raise ValueError("Input text cannot be empty")
+    if language_code not in SUPPORTED_LANGUAGES:
+        raise ValueError(f"Unsupported language '{language_code}'")
+    audio_prompt_path = speech_voice_path(voice_name, language_code)
+    with model_manager.use("mtl") as model:
+        if model is None:
+            raise RuntimeError("Failed to load Multilingual model")
+        job = SpeechJob(
+            model, text, audio_prompt_path, seed_num, exaggeration,
+            sampling=dict(temperature=temperature, cfg_weight=cfgw),
+            language_code=language_code,
+        )
+        yield from _encode_chunks(model.sr, (chunk_wav for _, chunk_wav in job), output_format)
+
+
+def stream_converted_voice(input_audio, target_voice_name, output_format="wav"):
+    """Convert a voice for the HTTP API; the whole conversion is one chunk."""
+    target_voice_path = vc_target_path(target_voice_name)
+    with model_manager.use("vc") as model:
+        if model is None:
+            raise RuntimeError("Failed to load VC model")
+        wav = model.generate(input_audio, target_voice_path=target_voice_path)
+        yield from _encode_chunks(model.sr, [wav], output_format)
+
+
+@contextmanager
+def _session_model(language_code):
+    """Use the model that speaks a session: English without `language_code`, multilingual with it."""
+    with model_manager.use("mtl" if language_code else "tts") as model:
+        if model is None:
+            raise RuntimeError("Failed to load TTS model")
+        yield model
+
+
+def synthesize_session_segment(audio_prompt_path, language_code, seed_num, exaggeration, sampling, index, segment):
+    """Worker pool handler for one SpeechSession segment; yields its (N,) float32 wav."""
+    with _session_model(language_code) as model:
+        context = model.new_context(audio_prompt_path, exaggeration=exaggeration, seed=int(seed_num))
+        if batch_scheduler.enabled and seed_num == 0:
+            tokens = batch_scheduler.decode(model, segment, context, **sampling)
+        else:
+            tokens = model.generate_tokens(segment, context=context.for_chunk(index), **sampling)
+        wav = model.tokens_to_wav(tokens, context=context)
+    yield wav.squeeze(0).numpy()
+
+
+class SpeechSession:
+    """
+    A streaming synthesis session in one voice. Text fragments are fed in as
+    they arrive and segmented with TextSegmenter; iterating the session
+    yields (segment index, (N,) float32 wav) as each segment is vocoded.
+    When the worker pool is up each segment is a job for it, with the next
+    segment's job running while the current one finishes. Otherwise the
+    segments run in this process, decoding the next segment while the
+    current one is vocoded, and the voice context is prepared once for all
+    of them. `end` flushes the remaining text and finishes the iteration;
+    `cancel` drops it.
+    """
+
+    sr = S3GEN_SR
+
+    def __init__(self, audio_prompt_path, seed_num, exaggeration, sampling, language_code=None):
+        self.audio_prompt_path = audio_prompt_path
+        self.language_code = language_code
+        self.sampling = dict(sampling, language_id=language_code) if language_code else dict(sampling)
+        self.seed_num = seed_num
+        self.exaggeration = exaggeration
+        self.segmenter = TextSegmenter()
+        self.segments = []
+        self._pending = queue.Queue()
+
+    def _submit(self, segments):
+        for segment in segments:
+            self.segments.append(segment)
+            self._pending.put(segment)
+
+    def feed(self, fragment):
+        self._submit(self.segmenter.feed(fragment))
+
+    def flush(self):
+        self._submit(self.segmenter.flush())
+
+    def end(self):
+        self.flush()
+        self._pending.put(None)
+
+    def cancel(self):
+        self._pending.put(None)
+
+    def __iter__(self):
+        segments = iter(self._pending.get, None)
+        worker_pool.wait_settled()
+        if worker_pool.running:
+            yield from self._run_in_workers(segments)
+        else:
+            yield from self._run_in_process(segments)
+
+    def _run_in_process(self, segments):
+        with _session_model(self.language_code) as model:
+            yield from self._pipeline(model, segments)
+
+    def _pipeline(self, model, segments):
+        context = model.new_context(self.audio_prompt_path, exaggeration=self.exaggeration, seed=int(self.seed_num))
+        sampling, seed_num = self.sampling, self.seed_num
+
+        def decode(item):
+            index, segment = item
+            if batch_scheduler.enabled and seed_num == 0:
+                return batch_scheduler.decode(model, segment, context, **sampling)
+            # Each seeded segment samples from its own generator, as it does in
+            # the workers, so a session's audio does not depend on where it ran
+            return model.generate_tokens(segment, context=context.for_chunk(index), **sampling)
+
+        vocode = lambda tokens: model.tokens_to_wav(tokens, context=context).squeeze(0).numpy()
+        pipeline = ChunkPipeline(decode=decode, vocode=vocode, queue_size=PIPELINE_QUEUE_SIZE)
+        yield from pipeline.run(enumerate(segments))
+
+    def _run_in_workers(self, segments):
+        args = (self.audio_prompt_path, self.language_code, self.seed_num, self.exaggeration, self.sampling)
+
+        def synthesize(index, segment):
+            [wav] = worker_pool.run(synthesize_session_segment, args + (index, segment), {})
+            return wav
+
+        # Jobs are submitted as segments arrive and collected in order
+        jobs = queue.Queue()
+        stopped = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=2)
+
+        def submit():
+            for index, segment in enumerate(segments):
+                if stopped.is_set():
+                    break
+                jobs.put((index, executor.submit(synthesize, index, segment)))
+            jobs.put(None)
+
+        threading.Thread(target=submit, daemon=True).start()
+        try:
+            while (job := jobs.get()) is not None:
+                index, future = job
+                yield index, future.result()
+        finally:
+            stopped.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def open_speech_session(voice_name, language_code, exaggeration, temperature, seed_num, cfgw, min_p, top_p, repetition_penalty):
+    """
+    Start a SpeechSession on the English model (no `language_code`) or the
+    multilingual one; min_p, top_p and repetition_penalty apply to English
+    only. Raises ValueError for invalid settings. No model is loaded until
+    the session is iterated.
+    """
+    if language_code and language_code not in SUPPORTED_LANGUAGES:
+        raise ValueError(f"Unsupported language '{language_code}'")
+    audio_prompt_path = speech_voice_path(voice_name, language_code)
+    if language_code:
+        sampling = dict(temperature=temperature, cfg_weight=cfgw)
+    else:
+        sampling = dict(
+            temperature=temperature,
+            cfg_weight=cfgw,
+            min_p=min_p,
+            top_p=top_p,
+            repetition_penalty=repetition_penalty,
+        )
+    return SpeechSession(audio_prompt_path, seed_num, exaggeration, sampling, language_code)
@@ -0,0 +1,283 @@
+"""
+Streaming HTTP synthesis API for Chatterbox TTS Enhanced
+
+A lean JSON API beside the Gradio UI for backend services, without the Gradio
+queue, progress updates or buffered results:
+
+    POST /v1/tts               English TTS
+    POST /v1/tts/multilingual  Multilingual TTS
+    POST /v1/vc                Voice conversion (input audio base64-encoded)
+    WS   /v1/tts/stream        Text in as it is written, audio out per sentence
+
+Responses use chunked transfer encoding, and each text chunk's audio is
+encoded and written as soon as it is vocoded, in the request's `format`:
+"wav" (16-bit, header sizes left open), "pcm" (raw 16-bit little-endian),
+"flac", or "opus"/"mp3" (needs ffmpeg). The request is validated and its first chunk generated
+before the response starts, so failures up to that point return a JSON error.
+Generation goes through the same handlers, worker pool and single-flight
+coalescing as the Gradio UI.
+
+A WebSocket session binds a voice once and then accepts text fragments,
+e.g. LLM output token by token:
+
+    -> {"type": "start", "voice": ..., "language": ..., "seed": ..., ...}
+    <- {"type": "ready", "sample_rate": 24000}
+    -> {"type": "text", "text": "Hello th"}   (any number of fragments)
+    -> {"type": "flush"}                      (optional: speak what is buffered)
+    -> {"type": "end"}
+    <- {"type": "audio", "index": 0, "text": ..., "samples": ...} followed
+       by a binary frame of 16-bit PCM, for each segment as it is ready
+    <- {"type": "done"}
+
+Fragments are segmented with the `smart_chunk_text` sentence rules as they
+arrive. The session's text state stays in the server process, and each
+segment is generated in an inference worker when the pool is up, like the
+HTTP endpoints' requests.
+"""
+import asyncio
+import base64
+import os
+import tempfile
+import threading
+from typing import Literal, Optional
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from .audio_encoders import check_format, pcm16
+from .config import HTTP_CONCURRENCY, SUPPORTED_LANGUAGES
+from .generation_functions import (
+    speech_voice_path,
+    vc_target_path,
+    open_speech_session,
+    stream_speech,
+    stream_multilingual_speech,
+    stream_converted_voice,
+)
+from .single_flight import coalesce
+from .worker_pool import dispatch
+
+router = APIRouter(prefix="/v1", tags=["synthesis"])
+
+# Streaming handlers, run in an inference worker when the pool is up
+_stream_speech = coalesce(dispatch(stream_speech))
+_stream_multilingual_speech = coalesce(dispatch(stream_multilingual_speech))
+_stream_converted_voice = dispatch(stream_converted_voice)
+
+# Bounds concurrent generations, as the Gradio queue does for the UI
+_generation_slots = threading.BoundedSemaphore(max(1, HTTP_CONCURRENCY))
+
+_END = object()
+
+OutputFormat = Literal["wav", "pcm", "flac", "opus", "mp3"]
+
+
+# ---------------------------
+# Request schemas
+# ---------------------------
+class TTSRequest(BaseModel):
+    text: str = Field(min_length=1)
+    voice: Optional[str] = Field(None, description="Voice name; omit for the default voice")
+    exaggeration: float = Field(0.5, ge=0.25, le=2.0)
+    temperature: float = Field(0.8, ge=0.05, le=5.0)
+    seed: int = Field(0, description="0 for a random take")
+    cfg_weight: float = Field(0.5, ge=0.0, le=1.0)
+    min_p: float = Field(0.05, ge=0.0, le=1.0)
+    top_p: float = Field(1.0, ge=0.0, le=1.0)
+    repetition_penalty: float = Field(1.2, ge=1.0, le=2.0)
+    format: OutputFormat = "wav"
+
+
+class MultilingualTTSRequest(BaseModel):
+    text: str = Field(min_length=1)
+    language: str = Field(description="Language code, e.g. 'fr'")
+    voice: Optional[str] = Field(None, description="Voice name; omit for the language's default voice")
+    exaggeration: float = Field(0.5, ge=0.25, le=2.0)
+    temperature: float = Field(0.8, ge=0.05, le=5.0)
+    seed: int = Field(0, description="0 for a random take")
+    cfg_weight: float = Field(0.5, ge=0.0, le=1.0)
+    format: OutputFormat = "wav"
+
+
+class VCRequest(BaseModel):
+    audio: str = Field(min_length=1, description="Input audio file, base64-encoded")
+    target_voice: Optional[str] = Field(None, description="Voice name; omit for the default voice")
+    format: OutputFormat = "wav"
+
+
+class SessionStart(BaseModel):
+    voice: Optional[str] = Field(None, description="Voice name; omit for the default voice")
+    language: Optional[str] = Field(None, description="Language code for the multilingual model; omit for English")
+    exaggeration: float = Field(0.5, ge=0.25, le=2.0)
+    temperature: float = Field(0.8, ge=0.05, le=5.0)
+    seed: int = Field(0, description="0 for a random take")
+    cfg_weight: float = Field(0.5, ge=0.0, le=1.0)
+    min_p: float = Field(0.05, ge=0.0, le=1.0)
+    top_p: float = Field(1.0, ge=0.0, le=1.0)
+    repetition_penalty: float = Field(1.2, ge=1.0, le=2.0)
+
+
+# ---------------------------
+# Responses
+# ---------------------------
+def _error(status_code, message):
+    return JSONResponse({"error": str(message)}, status_code=status_code)
+
+
+def _limited(stream):
+    with _generation_slots:
+        yield from stream
+
+
+async def _stream_response(stream, audio_format):
+    """
+    Generate the first chunk of `stream`, then respond with it and the rest
+    as they are ready. Failures before the first chunk become JSON errors.
+    """
+    chunks = _limited(stream)
+    try:
+        first = await run_in_threadpool(next, chunks, _END)
+    except ValueError as e:
+        return _error(400, e)
+    except Exception as e:
+        print(f"❌ HTTP synthesis failed: {e}")
+        return _error(500, e)
+    if first is _END:
+        return _error(500, "No audio generated")
+    sample_rate, first_bytes = first
+
+    def body():
+        try:
+            yield first_bytes
+            for _, data in chunks:
+                yield data
+        except Exception as e:
+            # Headers are already sent; aborting the transfer tells the client the audio is incomplete
+            print(f"❌ HTTP synthesis failed mid-stream: {e}")
+            raise
+        finally:
+            chunks.close()
+
+    media_type = check_format(audio_format).content_type(sample_rate)
+    return StreamingResponse(body(), media_type=media_type, headers={"X-Sample-Rate": str(sample_rate)})
+
+
+# ---------------------------
+# Endpoints
+# ---------------------------
+@router.post("/tts")
+async def tts(request: TTSRequest):
+    if not request.text.strip():
+        return _error(400, "Input text cannot be empty")
+    try:
+        check_format(request.format)
+        await run_in_threadpool(speech_voice_path, request.voice)
+    except ValueError as e:
+        return _error(400, e)
+    stream = _stream_speech(
+        request.text, request.voice, request.exaggeration, request.temperature, request.seed,
+        request.cfg_weight, request.min_p, request.top_p, request.repetition_penalty, request.format,
+    )
+    return await _stream_response(stream, request.format)
+
+
+@router.post("/tts/multilingual")
+async def multilingual_tts(request: MultilingualTTSRequest):
+    if not request.text.strip():
+        return _error(400, "Input text cannot be empty")
+    if request.language not in SUPPORTED_LANGUAGES:
+        return _error(400, f"Unsupported language '{request.language}'")
+    try:
+        check_format(request.format)
+        await run_in_threadpool(speech_voice_path, request.voice, request.language)
+    except ValueError as e:
+        return _error(400, e)
+    stream = _stream_multilingual_speech(
+        request.text, request.voice, request.language, request.exaggeration,
+        request.temperature, request.seed, request.cfg_weight, request.format,
+    )
+    return await _stream_response(stream, request.format)
+
+
+@router.post("/vc")
+async def voice_conversion(request: VCRequest):
+    try:
+        audio = base64.b64decode(request.audio, validate=True)
+        vc_target_path(request.target_voice)
+        check_format(request.format)
+    except ValueError as e:
+        return _error(400, e)
+
+    fd, input_path = tempfile.mkstemp(prefix="chatterbox_vc_")
+    with os.fdopen(fd, "wb") as f:
+        f.write(audio)
+    try:
+        # The conversion is a single chunk, so the input has been read by the time the response starts
+        return await _stream_response(_stream_converted_voice(input_path, request.target_voice, request.format), request.format)
+    finally:
+        os.remove(input_path)
+
+
+async def _receive_text(websocket, session):
+    """Feed the session's text messages to it until the client ends the session."""
+    try:
+        while True:
+            message = await websocket.receive_json()
+            kind = message.get("type") if isinstance(message, dict) else None
+            if kind == "text":
+                session.feed(str(message.get("text", "")))
+            elif kind == "flush":
+                session.flush()
+            elif kind == "end":
+                session.end()
+                return
+            else:
+                await websocket.send_json({"type": "error", "error": f"Unknown message type '{kind}'"})
+    except (WebSocketDisconnect, ValueError):
+        session.cancel()
+
+
+@router.websocket("/tts/stream")
+async def tts_session(websocket: WebSocket):
+    await websocket.accept()
+    try:
+        start = SessionStart.model_validate(await websocket.receive_json())
+        session = await run_in_threadpool(
+            open_speech_session, start.voice, start.language, start.exaggeration, start.temperature,
+            start.seed, start.cfg_weight, start.min_p, start.top_p, start.repetition_penalty,
+        )
+    except WebSocketDisconnect:
+        return
+    except (ValidationError, ValueError, RuntimeError) as e:
+        await websocket.send_json({"type": "error", "error": str(e)})
+        await websocket.close(code=1008)
+        return
+    await websocket.send_json({"type": "ready", "sample_rate": session.sr})
+
+    receiver = asyncio.create_task(_receive_text(websocket, session))
+    audio = iter(session)
+    try:
+        while (item := await run_in_threadpool(next, audio, _END)) is not _END:
+            index, wav = item
+            pcm = pcm16(wav)
+            await websocket.send_json({
+                "type": "audio", "index": index, "text": session.segments[index], "samples": len(pcm) // 2,
+            })
+            await websocket.send_bytes(pcm)
+        await websocket.send_json({"type": "done"})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"❌ Streaming session failed: {e}")
+        try:
+            await websocket.send_json({"type": "error", "error": str(e)})
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+    finally:
+        session.cancel()
+        receiver.cancel()
+        await run_in_threadpool(audio.close)
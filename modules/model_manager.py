@@ -1,82 +1,306 @@
 """
 Model management for Chatterbox TTS Enhanced
 """
+import gc
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import psutil
 import torch
-from .config import DEVICE
+from .config import DEVICE, MODEL_MEMORY_BUDGET_MB, MODEL_IDLE_TIMEOUT, MODEL_PRECISION, COMPILE_MODELS
 from chatterbox.tts import ChatterboxTTS
 from chatterbox.vc import ChatterboxVC
 from chatterbox.mtl_tts import ChatterboxMultilingualTTS
+from chatterbox.registry import COMPONENTS
+from chatterbox.compilation import compile_model
+
+
+MODEL_TYPES = {
+    "tts": (ChatterboxTTS, "TTS"),
+    "mtl": (ChatterboxMultilingualTTS, "Multilingual"),
+    "vc": (ChatterboxVC, "VC"),
+}
+
+
+def model_storages(model):
+    """Map storage pointer (or packed layer) -> size in bytes for every weight of a model."""
+    storages = {}
+    for name in ("t3", "s3gen", "ve"):
+        module = getattr(model, name, None)
+        if not isinstance(module, torch.nn.Module):
+            continue
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            storage = tensor.untyped_storage()
+            storages[storage.data_ptr()] = storage.nbytes()
+        # int8 layers keep their weights packed, outside parameters() and buffers()
+        for layer in module.modules():
+            if isinstance(layer, torch.ao.nn.quantized.dynamic.Linear):
+                storages[("packed", id(layer))] = layer.in_features * layer.out_features + 4 * layer.out_features
+    return storages
+
+
+def default_memory_budget_mb():
+    """80% of the GPU's memory when running on CUDA, else 80% of system RAM."""
+    if DEVICE == "cuda":
+        total = torch.cuda.get_device_properties(0).total_memory
+    else:
+        total = psutil.virtual_memory().total
+    return total * 0.8 / 1024**2
 
 
 class ModelManager:
-    """Manages loading and unloading of TTS, Multilingual, and VC models."""
+    """
+    Manages loading and unloading of TTS, Multilingual, and VC models.
+    Models stay co-resident while their weights fit in the memory budget;
+    the least recently used ones are evicted to make room, and models idle
+    for longer than the timeout are unloaded in the background. Shared
+    submodules (S3Gen, VoiceEncoder) come from the component registry and
+    are only counted once. Loads run one at a time under their own lock,
+    so residency checks and `stats()` never wait for a load to finish.
+    Models taken with `use` are pinned while the block runs: an unloaded
+    model that a request still holds would stay in memory uncounted, so
+    pinned models are never evicted, and evictions that only they could
+    satisfy wait until they are released.
+    """
     
-    def __init__(self):
-        self.tts_model = None
-        self.mtl_model = None
-        self.vc_model = None
+    def __init__(self, memory_budget_mb=None, idle_timeout=MODEL_IDLE_TIMEOUT):
+        self.memory_budget_mb = memory_budget_mb or MODEL_MEMORY_BUDGET_MB or default_memory_budget_mb()
+        self.idle_timeout = idle_timeout
+        self.models = OrderedDict()  # model type -> model, least recently used first
+        self.last_used = {}
+        self.load_times = {}
+        self.model_sizes = {}  # model type -> bytes measured at its last load
+        self.users = {}  # model type -> callers inside `use`, which pin it
+        self.evictions_deferred = False  # over budget until a pinned model is released
+        self.loads = 0
+        self.evictions = 0
+        self.idle_evictions = 0
         self.current_model_type = None
+        self._lock = threading.RLock()  # Guards the bookkeeping above
+        self._load_lock = threading.Lock()  # Held for the duration of a load
+        self._stop = threading.Event()
+        self._reaper = None
+        if self.idle_timeout > 0:
+            self._reaper = threading.Thread(target=self._reap_idle_models, daemon=True)
+            self._reaper.start()
 
-    def unload_all(self):
-        """Unload all models to free up memory."""
-        if self.tts_model is not None:
-            del self.tts_model
-            self.tts_model = None
-        if self.mtl_model is not None:
-            del self.mtl_model
-            self.mtl_model = None
-        if self.vc_model is not None:
-            del self.vc_model
-            self.vc_model = None
-        
+    @property
+    def tts_model(self):
+        return self.models.get("tts")
+
+    @property
+    def mtl_model(self):
+        return self.models.get("mtl")
+
+    @property
+    def vc_model(self):
+        return self.models.get("vc")
+
+    def resident_bytes(self):
+        """Bytes of weights held by all resident models, counting shared storages once."""
+        storages = {}
+        for model in list(self.models.values()):
+            storages.update(model_storages(model))
+        return sum(storages.values())
+
+    def _free_memory(self):
+        gc.collect()
         if DEVICE == "cuda":
             torch.cuda.empty_cache()
-            import gc
-            gc.collect()
-        self.current_model_type = None
-        print("🧹 Memory cleared: All models unloaded")
 
-    def get_tts_model(self):
-        """Load TTS model and unload others if needed."""
-        if self.current_model_type != "tts":
-            print("🔄 Switching to TTS model...")
-            self.unload_all()
+    def unload(self, model_type):
+        """Unload one model; components still used by other models stay resident."""
+        with self._lock:
+            if self.models.pop(model_type, None) is None:
+                return False
+            self.last_used.pop(model_type, None)
+            if self.current_model_type == model_type:
+                self.current_model_type = None
+        self._free_memory()
+        print(f"🧹 Unloaded {MODEL_TYPES[model_type][1]} model")
+        return True
+
+    def unload_all(self):
+        """Unload all models that are not in use to free up memory."""
+        with self._lock:
+            in_use = [model_type for model_type in self.models if self.users.get(model_type)]
+            for model_type in list(self.models):
+                if model_type not in in_use:
+                    self.models.pop(model_type)
+                    self.last_used.pop(model_type, None)
+            if self.current_model_type not in in_use:
+                self.current_model_type = None
+        self._free_memory()
+        if in_use:
+            print(f"🧹 Memory cleared: models in use stay loaded ({', '.join(in_use)})")
+        else:
+            print("🧹 Memory cleared: All models unloaded")
+
+    def _evict_until(self, fits, keep=None):
+        """
+        Evict least recently used models (never `keep` or a pinned model) until
+        `fits()` holds; if only pinned models are left, retry when one is released.
+        """
+        while not fits():
+            victims = [
+                model_type for model_type in self.models
+                if model_type != keep and not self.users.get(model_type)
+            ]
+            if not victims:
+                if not self.evictions_deferred:
+                    print(f"⏳ Over the {self.memory_budget_mb:.0f} MB budget until a model in use is released")
+                self.evictions_deferred = True
+                return
+            print(f"♻️ Evicting {MODEL_TYPES[victims[0]][1]} model to stay within {self.memory_budget_mb:.0f} MB")
+            self.unload(victims[0])
+            self.evictions += 1
+        self.evictions_deferred = False
+
+    def _touch(self, model_type, pin=False):
+        """Return the resident model of `model_type`, marking it most recently used (and pinning it), or None."""
+        with self._lock:
+            model = self.models.get(model_type)
+            if model is not None:
+                self.models.move_to_end(model_type)
+                self.last_used[model_type] = time.time()
+                self.current_model_type = model_type
+                if pin:
+                    self.users[model_type] = self.users.get(model_type, 0) + 1
+            return model
+
+    def _release(self, model_type):
+        """Unpin a model taken with `use`, then run any eviction that was waiting for it."""
+        with self._lock:
+            self.users[model_type] -= 1
+            if not self.users[model_type]:
+                del self.users[model_type]
+            if model_type in self.models:
+                self.last_used[model_type] = time.time()
+            if self.evictions_deferred:
+                budget = self.memory_budget_mb * 1024**2
+                self._evict_until(lambda: self.resident_bytes() <= budget)
+
+    @contextmanager
+    def use(self, model_type):
+        """
+        Load a model if it is not resident yet and pin it for the duration of
+        the block. Yields None if it failed to load.
+        """
+        model = self._get_model(model_type, pin=True)
+        try:
+            yield model
+        finally:
+            if model is not None:
+                self._release(model_type)
+
+    def _get_model(self, model_type, pin=False):
+        if (model := self._touch(model_type, pin)) is not None:
+            return model
+
+        with self._load_lock:
+            # Another thread may have loaded it while this one waited
+            if (model := self._touch(model_type, pin)) is not None:
+                return model
+
+            cls, label = MODEL_TYPES[model_type]
+            budget = self.memory_budget_mb * 1024**2
+
+            # Make room up front when this model's size is known from an earlier load
+            if model_type in self.model_sizes:
+                needed = self.model_sizes[model_type]
+                with self._lock:
+                    self._evict_until(lambda: self.resident_bytes() + needed <= budget)
+
+            print(f"🔄 Loading {label} model...")
+            start = time.time()
             try:
-                self.tts_model = ChatterboxTTS.from_pretrained(DEVICE)
-                self.current_model_type = "tts"
-                print("✅ TTS model loaded")
+                model = cls.from_pretrained(DEVICE, precision=MODEL_PRECISION)
+                if COMPILE_MODELS:
+                    compile_model(model)
             except Exception as e:
-                print(f"❌ Error loading TTS model: {e}")
+                print(f"❌ Error loading {label} model: {e}")
                 return None
-        return self.tts_model
+            size = sum(model_storages(model).values())
+
+            with self._lock:
+                self.load_times[model_type] = time.time() - start
+                self.loads += 1
+                self.models[model_type] = model
+                self.model_sizes[model_type] = size
+                if pin:
+                    self.users[model_type] = self.users.get(model_type, 0) + 1
+                print(
+                    f"✅ {label} model loaded in {self.load_times[model_type]:.1f}s "
+                    f"({size / 1024**2:.0f} MB, shared components: {COMPONENTS.stats()})"
+                )
+                self._evict_until(lambda: self.resident_bytes() <= budget, keep=model_type)
+                self.last_used[model_type] = time.time()
+                self.current_model_type = model_type
+            return model
+
+    def stop_idle_reaper(self):
+        """Keep resident models loaded however long they sit idle. Returns once the reaper thread has exited."""
+        self._stop.set()
+        self.idle_timeout = 0
+        if self._reaper is not None:
+            self._reaper.join()
+
+    def _reap_idle_models(self):
+        interval = max(1.0, min(60.0, self.idle_timeout / 4))
+        while not self._stop.wait(interval):
+            now = time.time()
+            # Under the lock, so no request can pin a model between the check and its unloading
+            with self._lock:
+                idle = [
+                    model_type for model_type, last in self.last_used.items()
+                    if now - last > self.idle_timeout and not self.users.get(model_type)
+                ]
+                for model_type in idle:
+                    if self.unload(model_type):
+                        self.idle_evictions += 1
+
+    def stats(self):
+        """Residency, memory use, eviction counts and load times, for monitoring."""
+        with self._lock:
+            now = time.time()
+            return {
+                "resident": {
+                    model_type: {
+                        "size_mb": round(self.model_sizes.get(model_type, 0) / 1024**2, 1),
+                        "idle_seconds": round(now - self.last_used.get(model_type, now), 1),
+                        "in_use": self.users.get(model_type, 0),
+                        "load_seconds": round(self.load_times.get(model_type, 0.0), 2),
+                        "text_cache": model.frontend.stats() if hasattr(model, "frontend") else None,
+                    }
+                    for model_type, model in self.models.items()
+                },
+                "resident_mb": round(self.resident_bytes() / 1024**2, 1),
+                "budget_mb": round(self.memory_budget_mb, 1),
+                "precision": MODEL_PRECISION,
+                "compiled": COMPILE_MODELS,
+                "idle_timeout_seconds": self.idle_timeout,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "idle_evictions": self.idle_evictions,
+                "evictions_deferred": self.evictions_deferred,
+                "last_load_seconds": {
+                    model_type: round(seconds, 2) for model_type, seconds in self.load_times.items()
+                },
+            }
+
+    def get_tts_model(self):
+        """Load TTS model if it is not resident yet."""
+        return self._get_model("tts")
 
     def get_mtl_model(self):
-        """Load Multilingual model and unload others if needed."""
-        if self.current_model_type != "mtl":
-            print("🔄 Switching to Multilingual model...")
-            self.unload_all()
-            try:
-                self.mtl_model = ChatterboxMultilingualTTS.from_pretrained(DEVICE)
-                self.current_model_type = "mtl"
-                print("✅ Multilingual model loaded")
-            except Exception as e:
-                print(f"❌ Error loading Multilingual model: {e}")
-                return None
-        return self.mtl_model
+        """Load Multilingual model if it is not resident yet."""
+        return self._get_model("mtl")
 
     def get_vc_model(self):
-        """Load VC model and unload others if needed."""
-        if self.current_model_type != "vc":
-            print("🔄 Switching to VC model...")
-            self.unload_all()
-            try:
-                self.vc_model = ChatterboxVC.from_pretrained(DEVICE)
-                self.current_model_type = "vc"
-                print("✅ VC model loaded")
-            except Exception as e:
-                print(f"❌ Error loading VC model: {e}")
-                return None
-        return self.vc_model
+        """Load VC model if it is not resident yet."""
+        return self._get_model("vc")
 
 
 # Global model manager instance
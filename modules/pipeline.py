@@ -0,0 +1,115 @@
+"""
+Pipelined chunk execution for Chatterbox TTS Enhanced.
+
+T3 token decoding of chunk i+1 runs on one worker thread while S3Gen
+vocodes and watermarks chunk i on another, with bounded queues between
+the stages so a slow stage applies backpressure instead of buffering.
+"""
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+class ChunkPipeline:
+    """Run `decode` (text -> speech tokens) and `vocode` (tokens -> wav) as overlapping stages."""
+
+    def __init__(self, decode, vocode, queue_size=2):
+        self.decode = decode
+        self.vocode = vocode
+        self.queue_size = queue_size
+        self.busy = {"t3": 0.0, "s3gen": 0.0}
+        self.wall_time = 0.0
+        self._stop = threading.Event()
+
+    def _put(self, q, item):
+        # Poll so workers notice cancellation while blocked on a full queue
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _run_stage(self, name, fn, in_items, out_q):
+        try:
+            for item in in_items:
+                if item is _DONE or self._stop.is_set():
+                    break
+                if isinstance(item, _StageError):
+                    self._put(out_q, item)
+                    return
+                index, payload = item
+                t0 = time.perf_counter()
+                result = fn(payload)
+                self.busy[name] += time.perf_counter() - t0
+                if not self._put(out_q, (index, result)):
+                    return
+        except Exception as e:
+            self._put(out_q, _StageError(e))
+            return
+        self._put(out_q, _DONE)
+
+    def _iter_queue(self, q):
+        while True:
+            item = self._get(q)
+            yield item
+            if item is _DONE or isinstance(item, _StageError):
+                return
+
+    def run(self, chunks):
+        """Yield (index, wav) for every chunk, in order, as each one finishes vocoding."""
+        tokens_q = queue.Queue(maxsize=self.queue_size)
+        wavs_q = queue.Queue(maxsize=self.queue_size)
+        start = time.perf_counter()
+
+        workers = [
+            threading.Thread(
+                target=self._run_stage,
+                args=("t3", self.decode, enumerate(chunks), tokens_q),
+                daemon=True,
+            ),
+            threading.Thread(
+                target=self._run_stage,
+                args=("s3gen", self.vocode, self._iter_queue(tokens_q), wavs_q),
+                daemon=True,
+            ),
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            for item in self._iter_queue(wavs_q):
+                if item is _DONE:
+                    break
+                if isinstance(item, _StageError):
+                    raise item.exc
+                yield item
+        finally:
+            self._stop.set()
+            for worker in workers:
+                worker.join()
+            self.wall_time = time.perf_counter() - start
+
+    def utilization(self):
+        """Fraction of the pipeline's wall time each stage spent busy."""
+        wall = self.wall_time or 1e-9
+        return {name: min(busy / wall, 1.0) for name, busy in self.busy.items()}
+
+    def format_utilization(self):
+        return ", ".join(f"{name.upper()} {util:.0%}" for name, util in self.utilization().items())
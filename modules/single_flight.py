@@ -0,0 +1,134 @@
+"""
+Single-flight coalescing of identical in-flight requests for Chatterbox TTS Enhanced
+
+When the same text is requested many times at once, only the first request
+runs; concurrent requests with the same normalized text, voice, seed and
+parameters attach to that job and receive the same progress updates and
+result. Only fixed-seed requests are coalesced: seed 0 asks for a fresh
+random take every time. Coalescing happens in the server process, ahead of
+`dispatch`, so identical requests share one job even across workers.
+"""
+import functools
+import inspect
+import re
+import threading
+
+
+class _Flight:
+    """Updates of one running job, replayed to every request attached to it."""
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.cond = threading.Condition()
+
+
+class SingleFlight:
+    """Run at most one job per key; concurrent callers with the same key share its updates."""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    def run(self, key, start):
+        """Yield the updates of the job for `key`, starting it with `start()` unless one is in flight."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.started += 1
+            else:
+                self.coalesced += 1
+            with flight.cond:
+                flight.subscribers += 1
+
+        # The job runs on its own thread so one client disconnecting does not
+        # cancel it for the others
+        if leader:
+            threading.Thread(target=self._pump, args=(key, flight, start), daemon=True).start()
+
+        try:
+            seen = 0
+            while True:
+                with flight.cond:
+                    while seen >= len(flight.items) and not flight.done:
+                        flight.cond.wait()
+                    new_items = flight.items[seen:]
+                    done, error = flight.done, flight.error
+                seen += len(new_items)
+                yield from new_items
+                if done:
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            with flight.cond:
+                flight.subscribers -= 1
+
+    def _pump(self, key, flight, start):
+        stream = start()
+        try:
+            for item in stream:
+                with flight.cond:
+                    flight.items.append(item)
+                    flight.cond.notify_all()
+                # Stop early once every attached request has gone away
+                with self._lock, flight.cond:
+                    if flight.subscribers == 0:
+                        self._flights.pop(key, None)
+                        self.abandoned += 1
+                        break
+        except Exception as e:
+            flight.error = e
+        finally:
+            stream.close()
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "started": self.started,
+                "coalesced": self.coalesced,
+                "abandoned": self.abandoned,
+            }
+
+
+# Global coalescer shared by every handler wrapped with `coalesce`
+single_flight = SingleFlight()
+
+_SPACES = re.compile(r"[ \t]+")
+
+
+def coalesce(fn, text_arg="text", seed_arg="seed_num"):
+    """
+    Wrap a generator handler so concurrent fixed-seed calls with the same
+    arguments share one run. Text is keyed with runs of spaces collapsed,
+    which chunking and punctuation normalization ignore anyway.
+    """
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = dict(bound.arguments)
+        if not params.get(seed_arg):
+            yield from fn(*args, **kwargs)
+            return
+        params[text_arg] = _SPACES.sub(" ", str(params[text_arg] or "")).strip()
+        key = (fn.__name__,) + tuple(sorted((name, repr(value)) for name, value in params.items()))
+        yield from single_flight.run(key, lambda: fn(*args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,136 @@
+"""
+Sentence-aware text chunking for Chatterbox TTS Enhanced
+"""
+import re
+
+
+# Sentence boundaries: . ! ? (Western) before whitespace or the end of the text,
+# so "3.5" stays whole; 。！？ (CJK), । (Hindi), ؟ (Arabic); and line breaks
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?])(?:\s+|$)|(?<=[。！？।؟])\s*|\n+')
+
+# Clause boundaries: , ; (Western), ，、； (CJK), ، (Arabic)
+CLAUSE_PATTERN = re.compile(r'[,;，、；،]\s*')
+
+CJK_PATTERN = re.compile(r'[\u4e00-\u9fff\u3040-\u309f\u30a0-\u30ff\uac00-\ud7af]')
+
+# Enders that also occur inside a token ("3.5", "e.g."), so streamed text only
+# counts them as a sentence end once whitespace follows
+ASCII_SENTENCE_ENDERS = ".!?"
+
+
+def smart_chunk_text(text, max_words=40):
+    """
+    Intelligently chunk text based on sentence boundaries and word count.
+    Accumulates sentences to maximize chunk size up to max_words.
+    Supports all languages including CJK (Chinese, Japanese, Korean).
+    """
+    # Detect if text contains CJK characters (Chinese, Japanese, Korean)
+    def has_cjk(text):
+        return bool(CJK_PATTERN.search(text))
+    
+    is_cjk = has_cjk(text)
+    
+    # Enhanced sentence pattern supporting multiple languages
+    sentences = SENTENCE_PATTERN.split(text)
+    
+    chunks = []
+    current_chunk = []
+    current_count = 0
+    
+    for sentence in sentences:
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        
+        # Count words (space-separated) or characters (CJK)
+        if is_cjk:
+            sentence_count = len(re.sub(r'\s+', '', sentence))
+        else:
+            sentence_count = len(sentence.split())
+        
+        # Check if adding this sentence exceeds the limit
+        if current_count + sentence_count > max_words:
+            # If current chunk is not empty, save it
+            if current_chunk:
+                chunks.append(' '.join(current_chunk) if not is_cjk else ''.join(current_chunk))
+                current_chunk = []
+                current_count = 0
+            
+            # If the single sentence itself is longer than max_words, we must split it
+            if sentence_count > max_words:
+                # Split at commas/semicolons
+                sub_parts = CLAUSE_PATTERN.split(sentence)
+                for part in sub_parts:
+                    part = part.strip()
+                    if not part:
+                        continue
+                    
+                    if is_cjk:
+                        part_count = len(re.sub(r'\s+', '', part))
+                    else:
+                        part_count = len(part.split())
+                    
+                    if current_count + part_count > max_words and current_chunk:
+                        chunks.append(' '.join(current_chunk) if not is_cjk else ''.join(current_chunk))
+                        current_chunk = [part]
+                        current_count = part_count
+                    else:
+                        current_chunk.append(part)
+                        current_count += part_count
+            else:
+                # Sentence fits in a new chunk
+                current_chunk.append(sentence)
+                current_count += sentence_count
+        else:
+            # Sentence fits in current chunk
+            current_chunk.append(sentence)
+            current_count += sentence_count
+    
+    # Add remaining chunk
+    if current_chunk:
+        chunks.append(' '.join(current_chunk) if not is_cjk else ''.join(current_chunk))
+    
+    return chunks if chunks else [text]
+
+
+class TextSegmenter:
+    """
+    Incremental `smart_chunk_text` for text that arrives in fragments, such as
+    LLM output streamed token by token. `feed` returns the chunks completed so
+    far and `flush` the rest. A sentence ending in ASCII . ! ? counts as
+    complete once whitespace follows, so "3." arriving before "5" is not
+    spoken on its own. The CJK, Hindi and Arabic enders never occur inside
+    a token and complete a sentence at once, as CJK text has no space after
+    them. A run-on sentence longer than `max_words` is released up to its
+    last comma, so it does not hold up the stream.
+    """
+
+    def __init__(self, max_words=40):
+        self.max_words = max_words
+        self.buffer = ""
+
+    @staticmethod
+    def _length(text):
+        # Words, or characters for CJK text, as smart_chunk_text counts them
+        if CJK_PATTERN.search(text):
+            return len(re.sub(r'\s+', '', text))
+        return len(text.split())
+
+    def feed(self, fragment):
+        self.buffer += fragment
+        end = 0
+        for match in SENTENCE_PATTERN.finditer(self.buffer):
+            if match.end() > match.start() or self.buffer[match.start() - 1] not in ASCII_SENTENCE_ENDERS:
+                end = match.end()
+        if not end and self._length(self.buffer) > self.max_words:
+            clauses = list(CLAUSE_PATTERN.finditer(self.buffer))
+            if clauses:
+                end = clauses[-1].end()
+        return self._release(end)
+
+    def flush(self):
+        return self._release(len(self.buffer))
+
+    def _release(self, end):
+        complete, self.buffer = self.buffer[:end], self.buffer[end:]
+        return smart_chunk_text(complete, self.max_words) if complete.strip() else []
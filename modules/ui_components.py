@@ -5,6 +5,17 @@ Contains function to create each tab's UI layout
 import gradio as gr
 from .config import LANGUAGE_CONFIG, SUPPORTED_LANGUAGES
 from .voice_manager import load_voices, get_voices_for_language, get_all_voices_with_gender
+from .audio_encoders import PLAYABLE_FORMATS
+
+
+def create_output_format_select():
+    """Dropdown of the formats generated audio can be encoded in."""
+    return gr.Dropdown(
+        choices=PLAYABLE_FORMATS,
+        value="wav",
+        label="Output Format",
+        info="FLAC is lossless at about half the size of WAV; Opus and MP3 are much smaller"
+    )
 
 
 def create_header():
@@ -68,13 +79,14 @@ def create_tts_tab():
                 min_p = gr.Slider(0.00, 1.00, step=0.01, label="min_p (0.00 disables)", value=0.05)
                 top_p = gr.Slider(0.00, 1.00, step=0.01, label="top_p (1.0 disables)", value=1.00)
                 repetition_penalty = gr.Slider(1.00, 2.00, step=0.1, label="Repetition Penalty", value=1.2)
+                output_format = create_output_format_select()
 
             generate_btn = gr.Button("🎙️ Generate Speech", variant="primary", size="lg")
 
         with gr.Column():
             progress_bar_tts = gr.Slider(label="Progress", minimum=0, maximum=100, value=0, interactive=False)
             status_box_tts = gr.Textbox(label="Status", value="Ready to generate...", lines=3, interactive=False)
-            audio_output_tts = gr.Audio(label="Generated Audio", autoplay=True, show_download_button=True)
+            audio_output_tts = gr.Audio(label="Generated Audio", autoplay=True, show_download_button=True, format=None)
 
     return {
         "text": text,
@@ -86,6 +98,7 @@ def create_tts_tab():
         "min_p": min_p,
         "top_p": top_p,
         "repetition_penalty": repetition_penalty,
+        "output_format": output_format,
         "generate_btn": generate_btn,
         "progress_bar": progress_bar_tts,
         "status_box": status_box_tts,
@@ -131,13 +144,14 @@ def create_multilingual_tab():
             with gr.Accordion("⚙️ Advanced Options", open=False):
                 seed_num_mtl = gr.Number(value=0, label="Random seed (0 for random)")
                 temp_mtl = gr.Slider(0.05, 5, step=.05, label="Temperature", value=.8)
+                output_format_mtl = create_output_format_select()
 
             generate_btn_mtl = gr.Button("🎙️ Generate Speech", variant="primary", size="lg")
 
         with gr.Column():
             progress_bar_mtl = gr.Slider(label="Progress", minimum=0, maximum=100, value=0, interactive=False)
             status_box_mtl = gr.Textbox(label="Status", value="Ready to generate...", lines=3, interactive=False)
-            audio_output_mtl = gr.Audio(label="Generated Audio", autoplay=True, show_download_button=True)
+            audio_output_mtl = gr.Audio(label="Generated Audio", autoplay=True, show_download_button=True, format=None)
             
             gr.Markdown(f"""
             ### Supported Languages ({len(SUPPORTED_LANGUAGES)}):
@@ -153,6 +167,7 @@ def create_multilingual_tab():
         "cfg_weight": cfg_weight_mtl,
         "seed_num": seed_num_mtl,
         "temp": temp_mtl,
+        "output_format": output_format_mtl,
         "generate_btn": generate_btn_mtl,
         "progress_bar": progress_bar_mtl,
         "status_box": status_box_mtl,
@@ -184,17 +199,20 @@ def create_voice_conversion_tab():
             
             preview_audio_vc = gr.Audio(label="Target Voice Preview", interactive=False, visible=True)
             
+            output_format_vc = create_output_format_select()
+            
             convert_btn = gr.Button("🔄 Convert Voice", variant="primary", size="lg")
 
         with gr.Column():
             progress_bar_vc = gr.Slider(label="Progress", minimum=0, maximum=100, value=0, interactive=False)
             status_box_vc = gr.Textbox(label="Status", value="Ready to convert...", lines=3, interactive=False)
-            audio_output_vc = gr.Audio(label="Converted Audio", autoplay=True, show_download_button=True)
+            audio_output_vc = gr.Audio(label="Converted Audio", autoplay=True, show_download_button=True, format=None)
 
     return {
         "input_audio": input_audio_vc,
         "target_voice_select": target_voice_select,
         "preview_audio": preview_audio_vc,
+        "output_format": output_format_vc,
         "convert_btn": convert_btn,
         "progress_bar": progress_bar_vc,
         "status_box": status_box_vc,
@@ -7,6 +7,7 @@ import tempfile
 import urllib.request
 import gradio as gr
 from .config import VOICE_DIR, LANGUAGE_CONFIG, SUPPORTED_LANGUAGES
+from chatterbox.cond_cache import CONDS_CACHE, file_digest
 
 # Voice storage
 VOICES = {"samples": {}}
@@ -118,6 +119,17 @@ def resolve_voice_path(voice_name, language_code):
     return None
 
 
+def _digest_in_use(digest):
+    """Whether any remaining voice's audio has the given content digest."""
+    for path in VOICES["samples"].values():
+        try:
+            if file_digest(path) == digest:
+                return True
+        except OSError:
+            continue
+    return False
+
+
 def get_all_voices_with_gender():
     """Get all voices formatted with gender symbols for display."""
     formatted_voices = []
@@ -155,6 +167,9 @@ def clone_voice(audio_file, new_voice_name, voice_language, voice_gender):
         
         # Update voices dictionary
         VOICES["samples"][new_voice_name] = wav_path
+
+        # Conditionals are computed by the first generation with this voice,
+        # which persists them to the voice store; no model is loaded here
         updated_voices = list(VOICES["samples"].keys())
         
         # Format display name with gender symbol
@@ -193,11 +208,17 @@ def delete_voice(voice_name):
         
         # Delete the file
         wav_path = VOICES["samples"][actual_name]
-        if os.path.exists(wav_path):
+        digest = file_digest(wav_path) if os.path.exists(wav_path) else None
+        if digest is not None:
             os.remove(wav_path)
         
         # Remove from dictionary
         del VOICES["samples"][actual_name]
+
+        # Stored conditionals are keyed by content, so keep them while another
+        # voice has the same audio
+        if digest is not None and CONDS_CACHE.store is not None and not _digest_in_use(digest):
+            CONDS_CACHE.store.remove(digest)
         
         remaining_voices = get_all_voices_with_gender()
         new_selected = remaining_voices[0] if remaining_voices else "None"
@@ -0,0 +1,115 @@
+"""
+Startup preloading, warmup and readiness state for Chatterbox TTS Enhanced
+"""
+import os
+import threading
+import time
+
+from chatterbox.compilation import WARMUP_TEXTS
+
+from .config import VOICE_DIR, COMPILE_MODELS
+from .model_manager import MODEL_TYPES, model_manager
+
+WARMUP_TEXT = "Warming up the speech engine."
+
+
+def _warmup_texts():
+    """One short text, or several lengths so compiled graphs exist for typical shapes."""
+    return WARMUP_TEXTS if COMPILE_MODELS else [WARMUP_TEXT]
+
+
+class Readiness:
+    """Ready/not-ready flag polled by load balancers through the /ready endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = "starting"
+        self.detail = ""
+        self.warmup_seconds = {}
+        self.started_at = time.time()
+        self.ready_at = None
+
+    def set(self, state, detail=""):
+        with self._lock:
+            self.state = state
+            self.detail = detail
+            if state == "ready":
+                self.ready_at = time.time()
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def status(self):
+        with self._lock:
+            return {
+                "ready": self.state == "ready",
+                "state": self.state,
+                "detail": self.detail,
+                "warmup_seconds": dict(self.warmup_seconds),
+                "seconds_to_ready": round(self.ready_at - self.started_at, 2) if self.ready_at else None,
+            }
+
+
+readiness = Readiness()
+
+
+def _warmup_audio():
+    """A bundled voice sample to push through the VC model, if any exist."""
+    for name in sorted(os.listdir(VOICE_DIR)):
+        if name.endswith(".wav"):
+            return os.path.join(VOICE_DIR, name)
+    return None
+
+
+def warmup_model(model_type):
+    """Load a model and run one short synthesis through T3 and S3Gen (or S3Gen alone for VC)."""
+    if model_type not in ("tts", "mtl", "vc"):
+        raise ValueError(f"Unknown model type '{model_type}' (expected tts, mtl or vc)")
+    with model_manager.use(model_type) as model:
+        if model is None:
+            raise RuntimeError(f"{MODEL_TYPES[model_type][1]} model failed to load")
+        if model_type == "tts":
+            for text in _warmup_texts():
+                model.generate(text)
+        elif model_type == "mtl":
+            for text in _warmup_texts():
+                model.generate(text, language_id="en")
+        elif (audio := _warmup_audio()) is not None:
+            model.generate(audio)
+
+
+def preload_and_warmup(model_types, mark_ready=True):
+    """
+    Warm every requested model in turn, then flip the readiness flag (unless
+    `mark_ready` is False, for callers with more to do before serving).
+    Returns True if every model warmed up.
+    """
+    for model_type in model_types:
+        readiness.set("warming", f"Warming up {model_type} model")
+        print(f"🔥 Warming up {model_type} model...")
+        start = time.time()
+        try:
+            warmup_model(model_type)
+        except Exception as e:
+            print(f"❌ Warmup of {model_type} model failed: {e}")
+            readiness.set("failed", f"Warmup of {model_type} model failed: {e}")
+            return False
+        readiness.warmup_seconds[model_type] = round(time.time() - start, 2)
+        print(f"✅ {model_type} model warm in {readiness.warmup_seconds[model_type]:.1f}s")
+    if mark_ready:
+        readiness.set("ready")
+    return True
+
+
+def start_preload(model_types):
+    """
+    Start preloading in the background so the server can answer probes
+    meanwhile. With nothing to preload the server is ready immediately.
+    """
+    if not model_types:
+        readiness.set("ready", "No models preloaded; they load on first use")
+        return None
+    thread = threading.Thread(target=preload_and_warmup, args=(list(model_types),), daemon=True)
+    thread.start()
+    return thread
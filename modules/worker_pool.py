@@ -0,0 +1,417 @@
+"""
+Preload-then-fork inference workers for Chatterbox TTS Enhanced
+
+With CHATTERBOX_WORKERS > 1 the models are loaded, warmed and frozen once in
+a multiprocessing fork server (see worker_preload), and the worker processes
+are forked from it. The fork server is started before the server runs any
+threads and has none of its own, so no worker inherits a lock that a server
+thread happened to hold when it was forked. The server answers probes while
+the fork server warms up, and the supervisor thread turns /ready ready once
+the workers are up. A forked child shares its parent's pages copy-on-write
+and frozen weights are never written, so all workers read the same physical
+copy (the safetensors weights are file-backed mappings to begin with). Each
+worker's private memory is then just its activations and KV cache. Handlers
+wrapped with `dispatch` run in a worker, and their progress updates are
+relayed back to the server process. Each worker is pinned to a disjoint set
+of cores and sizes torch's intra-op pool to match, so workers do not contend
+for the same cores. The supervisor re-forks any worker that dies from the
+warm fork server. Each worker streams updates back on its own pipe, so a
+worker killed mid-message cannot corrupt any other worker's updates. CUDA
+contexts do not survive a fork, so the pool only runs on CPU.
+"""
+import functools
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from multiprocessing import forkserver
+from multiprocessing.connection import wait
+
+import psutil
+import torch
+
+from .config import DEVICE, INFERENCE_WORKERS
+from .warmup import readiness
+
+# Messages sent from workers to the server process
+_START, _ITEM, _ERROR, _DONE = "start", "item", "error", "done"
+
+# Model types the fork server preloads, passed through its environment
+WORKER_MODELS_ENV = "CHATTERBOX_WORKER_MODELS"
+
+
+def freeze_model(model):
+    """Put a model's components in eval mode without autograd so their weights are never written."""
+    for name in ("t3", "s3gen", "ve"):
+        module = getattr(model, name, None)
+        if isinstance(module, torch.nn.Module):
+            module.eval().requires_grad_(False)
+
+
+def partition_cores(num_workers):
+    """Split the cores this process may run on into `num_workers` disjoint, contiguous sets."""
+    try:
+        cores = sorted(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS
+        cores = list(range(os.cpu_count() or 1))
+    if len(cores) < num_workers:
+        # More workers than cores: each gets one, shared round-robin
+        return [[cores[i % len(cores)]] for i in range(num_workers)]
+    per_worker, extra = divmod(len(cores), num_workers)
+    sets, start = [], 0
+    for i in range(num_workers):
+        size = per_worker + (1 if i < extra else 0)
+        sets.append(cores[start:start + size])
+        start += size
+    return sets
+
+
+def _worker_main(cores, tasks, results):
+    """Worker loop: run handlers on the inherited models and stream their updates back."""
+    # Keep this worker and its intra-op threads on its own cores
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+    pid = os.getpid()
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        job_id, handler, args, kwargs = task
+        results.send((job_id, pid, _START, None))
+        try:
+            for item in handler(*args, **kwargs):
+                results.send((job_id, pid, _ITEM, item))
+        except Exception as e:
+            # Only the category crosses the pipe: a ValueError is the caller's
+            # bad input, anything else a failure
+            results.send((job_id, pid, _ERROR, (isinstance(e, ValueError), str(e))))
+        else:
+            results.send((job_id, pid, _DONE, None))
+
+
+class _Slot:
+    """One worker position: its cores, its current process and task queue, and its accounting."""
+
+    def __init__(self, index, cores):
+        self.index = index
+        self.cores = cores
+        self.process = None
+        self.tasks = None
+        self.outstanding = []  # job ids sent to this worker and not finished, in order
+        self.running = None  # job id the worker has started, if any
+        self.job_started = 0.0
+        self.busy_seconds = 0.0
+        self.started_at = 0.0
+        self.jobs_done = 0
+        self.restarts = 0
+
+    @property
+    def pid(self):
+        return self.process.pid if self.process is not None else None
+
+    def utilization(self, now):
+        busy = self.busy_seconds + (now - self.job_started if self.running is not None else 0.0)
+        elapsed = now - self.started_at
+        return busy / elapsed if elapsed > 0 else 0.0
+
+
+class WorkerPool:
+    """
+    Forked inference processes, each pinned to its own cores with its own task
+    queue. Jobs go to the worker with the fewest outstanding jobs, and a
+    supervisor thread forks the workers from the warm fork server and
+    re-forks any that die.
+    """
+
+    # Minimum seconds between restarts of one worker, so a crash loop cannot spin
+    RESTART_INTERVAL = 5.0
+    # Times a job is sent to a worker before a crash is blamed on the job itself
+    MAX_ATTEMPTS = 2
+
+    def __init__(self, num_workers=INFERENCE_WORKERS):
+        self.num_workers = num_workers
+        self.slots = []
+        self.jobs = {}  # job id -> queue of updates for the waiting request
+        self.job_tasks = {}  # job id -> (handler, args, kwargs), until it finishes
+        self.job_slots = {}  # job id -> slot it was sent to
+        self.job_attempts = {}  # job id -> workers it has been sent to
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._ctx = mp.get_context("forkserver")
+        self._readers = set()  # read ends of the workers' result pipes, until EOF
+        self._settled = threading.Event()  # clear while a background start is in progress
+        self._settled.set()
+
+    @property
+    def running(self):
+        return bool(self.slots)
+
+    def start(self, model_types, fallback=None):
+        """
+        Start the fork server, which loads and warms `model_types`, and fork
+        the workers from it in the supervisor thread. Call this before the
+        server starts its threads; it returns at once. /ready turns ready once
+        the workers are up, and dispatched handlers called before then wait
+        for them. If the pool cannot be used, `fallback` runs and generation
+        stays in-process. Returns False when the pool is not started at all.
+        """
+        if DEVICE == "cuda":
+            print("⚠️ Inference workers need CPU inference (CUDA cannot be forked); generating in-process")
+            if fallback is not None:
+                fallback()
+            return False
+
+        os.environ[WORKER_MODELS_ENV] = ",".join(model_types)
+        self._ctx.set_forkserver_preload(["modules.worker_preload"])
+        forkserver.ensure_running()
+        readiness.set("warming", f"Warming up {', '.join(model_types)} for {self.num_workers} inference workers")
+        self._settled.clear()
+        threading.Thread(target=self._supervise, args=(fallback,), name="worker-pool-supervisor", daemon=True).start()
+        return True
+
+    def wait_settled(self):
+        """Block until a background start has either forked the workers or given up."""
+        self._settled.wait()
+
+    def _spawn(self, slot):
+        """
+        Fork a worker for `slot` from the fork server, whose loaded, warmed
+        models the child inherits. Blocks until the fork server has preloaded.
+        """
+        slot.tasks = self._ctx.Queue()
+        # Written synchronously, so an update is sent before the worker moves on
+        # and a crash cannot lose updates still buffered in a feeder thread
+        reader, writer = self._ctx.Pipe(duplex=False)
+        try:
+            slot.process = self._ctx.Process(
+                target=_worker_main,
+                args=(slot.cores, slot.tasks, writer),
+                name=f"chatterbox-worker-{slot.index}",
+                daemon=True,
+            )
+            slot.process.start()
+        finally:
+            # Only the child writes, so the pipe reports EOF once it exits
+            writer.close()
+        with self._lock:
+            self._readers.add(reader)
+        slot.started_at = time.time()
+        slot.busy_seconds = 0.0
+
+    def _submit(self, job_id):
+        """Send a job to the live worker with the fewest outstanding jobs."""
+        with self._lock:
+            candidates = [slot for slot in self.slots if slot.process.is_alive()] or self.slots
+            slot = min(candidates, key=lambda s: len(s.outstanding))
+            slot.outstanding.append(job_id)
+            self.job_slots[job_id] = slot
+            self.job_attempts[job_id] = self.job_attempts.get(job_id, 0) + 1
+            handler, args, kwargs = self.job_tasks[job_id]
+            slot.tasks.put((job_id, handler, args, kwargs))
+
+    def _relay_results(self):
+        """Route worker updates to the requests waiting on them."""
+        while True:
+            with self._lock:
+                readers = list(self._readers)
+            for reader in wait(readers, timeout=1.0):
+                try:
+                    message = reader.recv()
+                except Exception as e:
+                    # The worker exited, possibly mid-message; the supervisor
+                    # re-forks it with a new pipe and settles its jobs
+                    if not isinstance(e, EOFError):
+                        print(f"⚠️ Closing a broken inference worker pipe: {e}")
+                    with self._lock:
+                        self._readers.discard(reader)
+                    reader.close()
+                    continue
+                try:
+                    self._route(*message)
+                except Exception as e:
+                    print(f"⚠️ Dropping malformed inference worker update: {e}")
+
+    def _route(self, job_id, pid, kind, payload):
+        with self._lock:
+            slot = self.job_slots.get(job_id)
+            # Drop updates from a worker the job is no longer assigned to
+            if slot is None or slot.pid != pid:
+                return
+            now = time.time()
+            if kind == _START:
+                slot.running = job_id
+                slot.job_started = now
+                return
+            if kind in (_ERROR, _DONE):
+                self._finish(job_id, slot, now)
+            job = self.jobs.get(job_id)
+        if job is not None:
+            job.put((kind, payload))
+
+    def _finish(self, job_id, slot, now):
+        # Caller holds self._lock
+        if slot.running == job_id:
+            slot.busy_seconds += now - slot.job_started
+            slot.running = None
+        if job_id in slot.outstanding:
+            slot.outstanding.remove(job_id)
+        slot.jobs_done += 1
+        self.job_slots.pop(job_id, None)
+        self.job_tasks.pop(job_id, None)
+        self.job_attempts.pop(job_id, None)
+
+    def _supervise(self, fallback=None):
+        """
+        Fork the workers and publish readiness, then restart dead workers.
+        Their queued jobs move to other workers; the job that was running
+        fails, as does any job that has now been on MAX_ATTEMPTS crashed
+        workers (a worker may die before reporting the start).
+        """
+        slots = [_Slot(i, cores) for i, cores in enumerate(partition_cores(self.num_workers))]
+        try:
+            for slot in slots:
+                self._spawn(slot)
+        except Exception as e:
+            print(f"❌ Could not start inference workers: {e}")
+            for slot in slots:
+                if slot.process is not None and slot.process.is_alive():
+                    slot.process.kill()
+            self._settled.set()
+            if fallback is not None:
+                fallback()
+            else:
+                readiness.set("ready", "Inference workers unavailable; generating in-process")
+            return
+
+        self.slots = slots
+        threading.Thread(target=self._relay_results, name="worker-pool-relay", daemon=True).start()
+        print(
+            f"✅ Forked {self.num_workers} inference workers from the warm fork server "
+            f"(cores: {'; '.join(_format_cores(slot.cores) for slot in self.slots)})"
+        )
+        readiness.set("ready")
+        self._settled.set()
+
+        while True:
+            time.sleep(1.0)
+            for slot in self.slots:
+                if slot.process.is_alive() or time.time() - slot.started_at < self.RESTART_INTERVAL:
+                    continue
+                self._restart(slot)
+
+    def _restart(self, slot):
+        old_pid, exitcode = slot.pid, slot.process.exitcode
+        with self._lock:
+            failed = [
+                job_id for job_id in slot.outstanding
+                if job_id == slot.running or self.job_attempts.get(job_id, 0) >= self.MAX_ATTEMPTS
+            ]
+            retry = [job_id for job_id in slot.outstanding if job_id not in failed]
+            for job_id in failed:
+                self._finish(job_id, slot, time.time())
+                if (job := self.jobs.get(job_id)) is not None:
+                    job.put((_ERROR, (False, f"Inference worker {old_pid} exited")))
+            slot.outstanding = []
+            slot.running = None
+            for job_id in retry:
+                self.job_slots.pop(job_id, None)
+            slot.restarts += 1
+
+        print(f"⚠️ Inference worker {slot.index} (pid {old_pid}) exited with code {exitcode}; restarting")
+        self._spawn(slot)
+        for job_id in retry:
+            if job_id in self.job_tasks:
+                self._submit(job_id)
+
+    def run(self, handler, args, kwargs):
+        """
+        Run `handler` (a module-level generator function) in a worker and yield
+        its updates. Its failures are re-raised as ValueError when it rejected
+        its input, like the in-process handlers, and RuntimeError otherwise.
+        """
+        job_id = next(self._ids)
+        job = queue.Queue()
+        with self._lock:
+            self.jobs[job_id] = job
+            self.job_tasks[job_id] = (handler, args, kwargs)
+        self._submit(job_id)
+        try:
+            while True:
+                kind, payload = job.get()
+                if kind == _ITEM:
+                    yield payload
+                elif kind == _ERROR:
+                    invalid, message = payload
+                    raise (ValueError if invalid else RuntimeError)(message)
+                else:
+                    return
+        finally:
+            with self._lock:
+                self.jobs.pop(job_id, None)
+
+    def stats(self):
+        """
+        Per-worker cores, queue depth (jobs sent and not finished), utilization
+        (busy share of its lifetime), restarts and memory; `uss_mb` is the
+        memory not shared with anyone.
+        """
+        now = time.time()
+        workers = []
+        with self._lock:
+            for slot in self.slots:
+                workers.append({
+                    "worker": slot.index,
+                    "pid": slot.pid,
+                    "alive": slot.process.is_alive(),
+                    "cores": _format_cores(slot.cores),
+                    "queue_depth": len(slot.outstanding),
+                    "busy": slot.running is not None,
+                    "utilization": round(slot.utilization(now), 3),
+                    "jobs": slot.jobs_done,
+                    "restarts": slot.restarts,
+                })
+            active = len(self.jobs)
+        for entry in workers:
+            try:
+                memory = psutil.Process(entry["pid"]).memory_full_info()
+                entry["rss_mb"] = round(memory.rss / 1024**2, 1)
+                entry["uss_mb"] = round(memory.uss / 1024**2, 1)
+            except psutil.Error:
+                pass
+        return {"workers": workers, "active_jobs": active}
+
+
+def _format_cores(cores):
+    """Render a core list compactly, e.g. [0, 1, 2, 3, 8] -> '0-3,8'."""
+    ranges, start = [], None
+    for i, core in enumerate(cores):
+        if start is None:
+            start = core
+        if i + 1 == len(cores) or cores[i + 1] != core + 1:
+            ranges.append(f"{start}-{core}" if core != start else f"{core}")
+            start = None
+    return ",".join(ranges)
+
+
+# Global worker pool; generation stays in-process until it is started
+worker_pool = WorkerPool()
+
+
+def dispatch(fn):
+    """
+    Wrap a generator handler so it runs in a worker process whenever the pool
+    is up. `fn` must be a module-level function, which workers import by name.
+    """
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        worker_pool.wait_settled()
+        if worker_pool.running:
+            yield from worker_pool.run(fn, args, kwargs)
+        else:
+            yield from fn(*args, **kwargs)
+
+    return wrapper
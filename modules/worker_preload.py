@@ -0,0 +1,36 @@
+"""
+Fork server preload for the inference workers
+
+Inference workers are forked by a multiprocessing fork server rather than by
+the server process, whose uvicorn, Gradio and relay threads may hold locks at
+any moment. The fork server is a fresh interpreter with no threads of its own.
+It imports this module once before forking anything: the models listed in
+CHATTERBOX_WORKER_MODELS are loaded, warmed and frozen here, so every worker,
+including replacements for crashed ones, starts warm and shares their weights
+copy-on-write. A warmup failure raises, which stops the fork server, and the
+server then generates in-process.
+"""
+import gc
+import os
+
+import gradio  # noqa: F401  (workers re-import the main module, which needs it)
+
+from . import generation_functions, http_api  # noqa: F401  (the handlers workers run)
+from .model_manager import model_manager
+from .warmup import preload_and_warmup
+from .worker_pool import WORKER_MODELS_ENV, freeze_model
+
+model_types = [name for name in os.getenv(WORKER_MODELS_ENV, "").split(",") if name]
+if not preload_and_warmup(model_types, mark_ready=False):
+    raise RuntimeError(f"Warmup of the inference workers' models ({', '.join(model_types)}) failed")
+for model in model_manager.models.values():
+    freeze_model(model)
+
+# Workers are forked from here for the server's lifetime: no idle unloading,
+# and no thread may be running when they are
+model_manager.stop_idle_reaper()
+
+# Move everything allocated so far out of the collector's reach, so collections
+# in the workers do not touch (and copy) the pages they share with this process
+gc.collect()
+gc.freeze()
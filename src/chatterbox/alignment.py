@@ -0,0 +1,130 @@
+"""
+Online text-speech alignment checks for multilingual T3 decoding.
+
+The multilingual T3 implicitly aligns speech to text in a few of its
+self-attention heads. `T3.inference` watches those heads through
+`AlignmentStreamAnalyzer` to hold back a premature stop token and to force
+one when speech keeps going after the text is done. This module applies the
+same heuristics per sample to the batched decoding loop in `t3_batch`, where
+rows are left-padded and several samples share each forward pass.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+
+import torch
+
+
+logger = logging.getLogger(__name__)
+
+# (layer, head) pairs whose attention tracks the text position, as in AlignmentStreamAnalyzer
+LLAMA_ALIGNED_HEADS = [(12, 15), (13, 11), (9, 2)]
+
+_capture = threading.local()
+_install_lock = threading.Lock()
+
+
+def _install_spies(t3):
+    """
+    Hook the aligned attention layers of `t3` once. The hooks only record
+    while `capture_attention` is active in the calling thread, so other
+    decodes sharing the model are unaffected.
+    """
+    with _install_lock:
+        if getattr(t3, "_alignment_spies", False):
+            return
+        for layer_idx, head_idx in LLAMA_ALIGNED_HEADS:
+            def record(module, args, output, layer_idx=layer_idx, head_idx=head_idx):
+                maps = getattr(_capture, "maps", None)
+                if maps is not None and isinstance(output, tuple) and len(output) > 1 and output[1] is not None:
+                    maps[layer_idx] = output[1][:, head_idx]  # (rows, T_query, T_key)
+            t3.tfmr.layers[layer_idx].self_attn.register_forward_hook(record)
+        # Fused SDPA kernels do not return attention weights, as in AlignmentStreamAnalyzer
+        if getattr(t3.tfmr.config, "_attn_implementation", None) == "sdpa":
+            t3.tfmr.config._attn_implementation = "eager"
+        t3._alignment_spies = True
+
+
+@contextmanager
+def capture_attention(t3):
+    """
+    Record the aligned heads' attention of every `t3` forward pass run in this
+    thread inside the block. Yields a dict of layer -> (rows, T_query, T_key).
+    """
+    _install_spies(t3)
+    previous = getattr(_capture, "maps", None)
+    _capture.maps = maps = {}
+    try:
+        yield maps
+    finally:
+        _capture.maps = previous
+
+
+def aligned_attention(maps):
+    """Average the captured heads into one (rows, T_query, T_key) CPU tensor, or None if any is missing."""
+    if len(maps) < len(LLAMA_ALIGNED_HEADS):
+        return None
+    return torch.stack([maps[layer_idx] for layer_idx, _ in LLAMA_ALIGNED_HEADS]).float().mean(dim=0).cpu()
+
+
+class AlignmentAnalyzer:
+    """
+    Alignment checks for one sample, fed one decoding step at a time.
+    `text_span` is the (start, end) position of the sample's text tokens in
+    its (padded) input row. While the alignment has not reached the last text
+    tokens the stop token is suppressed; once it has, a long tail on the final
+    tokens, attention jumping back into earlier text, or a repeated speech
+    token forces the stop token.
+    """
+
+    def __init__(self, text_span, eos):
+        self.start, self.end = text_span
+        self.eos = eos
+        self.alignment = torch.zeros(0, self.end - self.start)
+        self.frame = 0
+        self.text_position = 0
+        self.completed_at = None
+        self.recent_tokens = []
+
+    def step(self, logits, attention, last_token):
+        """
+        Update the alignment with this step's `attention` (T_query, T_key) for
+        the sample and return its (1, V) `logits`, adjusted when needed.
+        `last_token` is the sample's most recently generated token.
+        """
+        i, j = self.start, self.end
+        # The prompt pass also covers the text; later steps add one speech frame each
+        chunk = (attention[j:, i:j] if self.frame == 0 else attention[:, i:j]).clone()
+        chunk[:, self.frame + 1:] = 0
+        self.alignment = torch.cat((self.alignment, chunk), dim=0)
+        A = self.alignment
+        T, S = A.shape
+
+        position = chunk[-1].argmax().item()
+        if -4 < position - self.text_position < 7:  # Ignore implausible jumps
+            self.text_position = position
+
+        if self.completed_at is None and self.text_position >= S - 3:
+            self.completed_at = T
+        complete = self.completed_at is not None
+
+        long_tail = complete and A[self.completed_at:, -3:].sum(dim=0).max().item() >= 5  # 200 ms
+        repetition = complete and S > 5 and A[self.completed_at:, :-5].max(dim=1).values.sum().item() > 5
+
+        self.recent_tokens = (self.recent_tokens + [last_token])[-8:]
+        token_repetition = len(self.recent_tokens) >= 3 and len(set(self.recent_tokens[-2:])) == 1
+
+        logits = logits.clone()
+        if position < S - 3 and S > 5:
+            logits[..., self.eos] = -2**15
+
+        if long_tail or repetition or token_repetition:
+            logger.info(
+                f"Forcing stop token after {T} frames: "
+                f"long_tail={long_tail}, repetition={repetition}, token_repetition={token_repetition}"
+            )
+            logits = torch.full_like(logits, -2**15)
+            logits[..., self.eos] = 2**15
+
+        self.frame += 1
+        return logits
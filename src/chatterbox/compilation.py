@@ -0,0 +1,64 @@
+"""
+Opt-in torch.compile for the inference hot paths.
+
+Two graphs dominate synthesis time:
+  - T3's per-token decode step (the transformer forward plus the speech head),
+    which runs once per generated token;
+  - S3Gen's flow-matching estimator, which runs once per ODE step per chunk.
+
+`compile_model` compiles both with dynamic shapes, so growing KV caches
+and varying batch and chunk lengths reuse a few graphs instead of
+recompiling for every shape. Inductor's FX graph cache is written to
+CHATTERBOX_MODEL_DIR/inductor_cache (or TORCHINDUCTOR_CACHE_DIR), so
+restarts load compiled kernels from disk rather than recompiling.
+Compiled modules are shared components, so compiling one model also
+speeds up every other model that shares its T3 or S3Gen.
+"""
+import os
+
+import torch
+
+from .local_models import MODEL_DIR
+from .t3_batch import decode_step
+
+
+COMPILE_CACHE_DIR = os.getenv("TORCHINDUCTOR_CACHE_DIR", str(MODEL_DIR / "inductor_cache"))
+
+# Texts of increasing length whose synthesis exercises the shapes seen in production
+WARMUP_TEXTS = [
+    "Hello.",
+    "Warming up the speech engine for production traffic.",
+    "This longer sentence is here so that warmup also covers the prompt and sequence lengths "
+    "that a typical paragraph chunk produces, before the first real request arrives.",
+]
+
+
+def enable_compile_cache(cache_dir=COMPILE_CACHE_DIR):
+    """Persist compiled graphs and kernels under `cache_dir` so restarts reuse them."""
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ["TORCHINDUCTOR_CACHE_DIR"] = str(cache_dir)
+    os.environ.setdefault("TRITON_CACHE_DIR", os.path.join(cache_dir, "triton"))
+    import torch._inductor.config as inductor_config
+    inductor_config.fx_graph_cache = True
+
+
+def _compile_module(module, mode):
+    """Compile `module` in place, once; shared components may be passed repeatedly."""
+    if getattr(module, "_compiled_call_impl", None) is None:
+        module.compile(dynamic=True, mode=mode)
+
+
+def compile_model(model, mode=None):
+    """
+    Compile the T3 decode step (TTS models) and the S3Gen estimator of a
+    loaded ChatterboxTTS, ChatterboxMultilingualTTS or ChatterboxVC. Graphs
+    are built lazily on first use, so synthesize WARMUP_TEXTS once to pay
+    that cost before serving.
+    """
+    enable_compile_cache()
+    t3 = getattr(model, "t3", None)
+    if t3 is not None and getattr(t3, "compiled_decode_step", None) is None:
+        t3.compiled_decode_step = torch.compile(decode_step, dynamic=True, mode=mode)
+    _compile_module(model.s3gen.flow.decoder.estimator, mode)
+    return model
+
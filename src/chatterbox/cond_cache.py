@@ -0,0 +1,160 @@
+"""
+In-memory LRU cache of voice Conditionals shared by ChatterboxTTS and
+ChatterboxMultilingualTTS, so `prepare_conditionals` runs once per voice
+instead of once per generated chunk.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+_DIGEST_CHUNK = 1 << 20
+_digest_memo = {}
+_digest_lock = threading.Lock()
+
+
+def file_digest(fpath) -> str:
+    """
+    Return the sha256 hex digest of a file's content.
+    Digests are memoized on (path, size, mtime) so repeated lookups of an
+    unchanged file do not re-read it.
+    """
+    fpath = os.path.abspath(os.fspath(fpath))
+    st = os.stat(fpath)
+    memo_key = (fpath, st.st_size, st.st_mtime_ns)
+    with _digest_lock:
+        digest = _digest_memo.get(memo_key)
+    if digest is not None:
+        return digest
+
+    h = hashlib.sha256()
+    with open(fpath, "rb") as f:
+        for block in iter(lambda: f.read(_DIGEST_CHUNK), b""):
+            h.update(block)
+    digest = h.hexdigest()
+
+    with _digest_lock:
+        _digest_memo[memo_key] = digest
+    return digest
+
+
+class ConditionalsCache:
+    """
+    Bounded LRU mapping of (reference audio digest, exaggeration, ...) to
+    prepared `Conditionals`. Cached entries are shared between callers and
+    must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Optional ConditionalsStore backing the in-memory entries across restarts
+        self.store = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(wav_fpath, exaggeration, *extra):
+        """
+        Build a cache key for a reference file, or return None when the
+        reference is not a local file (e.g. a URL) and cannot be hashed.
+        """
+        try:
+            if not os.path.isfile(wav_fpath):
+                return None
+            digest = file_digest(wav_fpath)
+        except (TypeError, OSError):
+            return None
+        return (digest, round(float(exaggeration), 4)) + tuple(extra)
+
+    def get(self, key):
+        if key is None or self.max_entries <= 0:
+            return None
+        with self._lock:
+            conds = self._entries.get(key)
+            if conds is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return conds
+
+    def put(self, key, conds):
+        if key is None or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = conds
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class ConditionalsStore:
+    """
+    Content-addressed on-disk store of precomputed Conditionals.
+    Files are named `<audio sha256>.<tag>.pt`, where the tag stamps the
+    model version that produced them, so stale entries are never loaded.
+    """
+
+    def __init__(self, root):
+        self.root = os.fspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, digest: str, tag: str) -> str:
+        return os.path.join(self.root, f"{digest}.{tag}.pt")
+
+    def load(self, digest: str, tag: str, loader, map_location="cpu"):
+        """Load stored conditionals with `loader` (e.g. `Conditionals.load`), or None."""
+        fpath = self.path_for(digest, tag)
+        if not os.path.exists(fpath):
+            return None
+        try:
+            return loader(fpath, map_location=map_location)
+        except Exception as e:
+            print(f"Ignoring unreadable conditionals file {fpath}: {e}")
+            return None
+
+    def save(self, digest: str, tag: str, conds):
+        """Atomically write conditionals so concurrent readers never see a partial file."""
+        fpath = self.path_for(digest, tag)
+        tmp_path = f"{fpath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            conds.save(tmp_path)
+            os.replace(tmp_path, fpath)
+        except OSError as e:
+            print(f"Could not persist conditionals to {fpath}: {e}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def remove(self, digest: str):
+        """Remove every stored entry for a reference file, whatever its tag."""
+        for name in os.listdir(self.root):
+            if name.startswith(f"{digest}."):
+                os.remove(os.path.join(self.root, name))
+
+
+# Process-wide cache shared by the English and multilingual models
+CONDS_CACHE = ConditionalsCache(
+    max_entries=int(os.getenv("CHATTERBOX_CONDS_CACHE_SIZE", "32"))
+)
@@ -0,0 +1,144 @@
+"""
+Request-scoped inference state.
+
+ChatterboxTTS and ChatterboxMultilingualTTS keep a current voice in
+`self.conds`, and sampling normally draws from the global torch RNG, so
+concurrent requests on one model overwrite each other's voice and reseed
+each other's sampling. A GenerationContext carries a request's own
+conditionals and torch.Generator instead; methods given a context read only
+from it and never assign model attributes, so any number of threads can
+generate on one loaded model.
+
+S3Gen has no generator argument and draws its noise from the torch RNG.
+`vocoder_rng` gives the calling thread its own generator for one S3Gen call,
+seeded per chunk from the request seed, so seeded requests reproduce their
+audio while other threads keep vocoding in parallel.
+"""
+import hashlib
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import torch
+from torch.distributions.uniform import Uniform
+
+from .models.s3gen import flow_matching, hifigan
+
+# Per-thread noise source for S3Gen: the seed of the current call and its generators by device
+_noise = threading.local()
+
+
+def _noise_generator(device):
+    """The calling thread's seeded generator for `device`, or None to draw from the global RNG."""
+    seed = getattr(_noise, "seed", None)
+    if seed is None:
+        return None
+    device = torch.device(device)
+    generator = _noise.generators.get(device)
+    if generator is None:
+        generator = _noise.generators[device] = torch.Generator(device=device)
+        generator.manual_seed(seed)
+    return generator
+
+
+class _SeededTorch:
+    """
+    Stands in for `torch` inside S3Gen's flow matching and HiFiGAN source
+    modules, whose only random draws are `torch.randn_like`. Those come from
+    the thread's `vocoder_rng` generator when one is set.
+    """
+
+    def __getattr__(self, name):
+        return getattr(torch, name)
+
+    @staticmethod
+    def randn_like(input, *, dtype=None, device=None, **kwargs):
+        generator = _noise_generator(device or input.device)
+        if generator is None:
+            return torch.randn_like(input, dtype=dtype, device=device, **kwargs)
+        return torch.randn(
+            input.shape, generator=generator, dtype=dtype or input.dtype, device=device or input.device
+        )
+
+
+class _SeededUniform(Uniform):
+    """HiFiGAN's random harmonic phases, drawn from the thread's `vocoder_rng` generator when one is set."""
+
+    def sample(self, sample_shape=torch.Size()):
+        generator = _noise_generator(self.low.device)
+        if generator is None:
+            return super().sample(sample_shape)
+        shape = self._extended_shape(sample_shape)
+        rand = torch.rand(shape, generator=generator, dtype=self.low.dtype, device=self.low.device)
+        return self.low + rand * (self.high - self.low)
+
+
+flow_matching.torch = hifigan.torch = _SeededTorch()
+hifigan.Uniform = _SeededUniform
+
+
+@contextmanager
+def vocoder_rng(seed=None):
+    """
+    Draw S3Gen's noise in this thread from a generator seeded with `seed`
+    for the duration of the block. Without a seed it comes from the global
+    torch RNG as usual. No lock is taken either way.
+    """
+    if seed is None:
+        yield
+        return
+    previous = getattr(_noise, "seed", None), getattr(_noise, "generators", None)
+    _noise.seed, _noise.generators = seed, {}
+    try:
+        yield
+    finally:
+        _noise.seed, _noise.generators = previous
+
+
+@dataclass
+class GenerationContext:
+    """The voice a request speaks in and the generator its T3 tokens are sampled from."""
+    conds: Any
+    generator: torch.Generator
+    seed: Optional[int] = None
+
+    @classmethod
+    def create(cls, conds, device, seed=None):
+        """
+        Build a context around `conds`. A non-zero `seed` makes sampling
+        reproducible; otherwise the generator starts from a random seed.
+        """
+        generator = torch.Generator(device=device)
+        if seed:
+            generator.manual_seed(int(seed))
+        else:
+            generator.seed()
+        return cls(conds=conds, generator=generator, seed=int(seed) if seed else None)
+
+    def for_chunk(self, index):
+        """
+        Context for text chunk `index` of a seeded request, with its own
+        generator seeded from the request seed and the index. Each chunk then
+        samples the same tokens whether or not the chunks before it were
+        decoded or came from a cache. Unseeded contexts are returned as is.
+        """
+        if self.seed is None:
+            return self
+        digest = hashlib.sha256(f"{self.seed}:chunk:{index}".encode()).digest()
+        generator = torch.Generator(device=self.generator.device)
+        generator.manual_seed(int.from_bytes(digest[:8], "little") >> 1)
+        return GenerationContext(conds=self.conds, generator=generator, seed=self.seed)
+
+    def noise_seed(self, speech_tokens):
+        """
+        Seed for S3Gen's noise when vocoding `speech_tokens`, or None for an
+        unseeded request. It depends only on the request seed and the tokens,
+        so a chunk renders the same audio whichever order chunks are vocoded
+        in and whichever of them came from a cache.
+        """
+        if self.seed is None:
+            return None
+        tokens = speech_tokens.to("cpu", torch.int64).numpy().tobytes()
+        digest = hashlib.sha256(f"{self.seed}:".encode() + tokens).digest()
+        return int.from_bytes(digest[:8], "little") >> 1
@@ -0,0 +1,200 @@
+"""
+Offline-first resolution of model checkpoints.
+
+Each hub repo's files live in a local directory under CHATTERBOX_MODEL_DIR
+together with a `manifest.json` recording their sha256 digests. Once a
+directory is complete, `resolve_model_dir` returns it without any network
+access. Each file's integrity is verified against the manifest once, and
+the result is cached in `.verified.json` (keyed by size and mtime), so later
+model loads cost one stat call per file. Missing or corrupt files are
+fetched from the Hugging Face hub, unless HF_HUB_OFFLINE is set, and only
+recorded once they match the content hash the hub reports for them.
+
+Populate a directory ahead of time (e.g. in a Docker build) with:
+
+    python -m chatterbox.local_models
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from huggingface_hub import get_hf_file_metadata, hf_hub_download, hf_hub_url
+
+from .cond_cache import file_digest
+
+
+MODEL_DIR = Path(os.getenv("CHATTERBOX_MODEL_DIR", Path.home() / ".cache" / "chatterbox" / "models"))
+
+MANIFEST_NAME = "manifest.json"
+VERIFIED_NAME = ".verified.json"
+
+_lock = threading.Lock()
+
+
+def _read_json(fpath):
+    try:
+        with open(fpath, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(fpath, data):
+    tmp_path = f"{fpath}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, fpath)
+
+
+def _hub_offline():
+    return os.getenv("HF_HUB_OFFLINE", "0").lower() in ("1", "true", "yes")
+
+
+def _is_verified(model_dir, fname, entry, verified):
+    """True if `fname` matches its manifest digest, hashing it only when it changed on disk."""
+    fpath = model_dir / fname
+    if not fpath.exists():
+        return False
+    st = fpath.stat()
+    cached = verified.get(fname)
+    if cached == [st.st_size, st.st_mtime_ns, entry["sha256"]]:
+        return True
+    if st.st_size != entry["size"] or file_digest(fpath) != entry["sha256"]:
+        return False
+    verified[fname] = [st.st_size, st.st_mtime_ns, entry["sha256"]]
+    return True
+
+
+def _git_blob_sha1(fpath):
+    """Git's object id for a file: sha1 over a `blob <size>` header and the content."""
+    h = hashlib.sha1(f"blob {fpath.stat().st_size}\0".encode())
+    with open(fpath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _matches_hub(fpath, repo_id, fname, revision, token):
+    """
+    True if `fpath` has the size and content hash the hub reports for
+    `fname`. LFS files carry their sha256 as etag, other files their git
+    blob id.
+    """
+    metadata = get_hf_file_metadata(hf_hub_url(repo_id, fname, revision=revision), token=token)
+    if metadata.size is not None and fpath.stat().st_size != metadata.size:
+        return False
+    etag = (metadata.etag or "").strip('"').lower()
+    if len(etag) == 64:
+        return file_digest(fpath) == etag
+    if len(etag) == 40:
+        return _git_blob_sha1(fpath) == etag
+    return True  # Unrecognized etag: the size is all there is to check
+
+
+def _record(fpath, fname, verified):
+    """Hash a file into a manifest entry and mark it verified."""
+    st = fpath.stat()
+    digest = file_digest(fpath)
+    verified[fname] = [st.st_size, st.st_mtime_ns, digest]
+    return {"sha256": digest, "size": st.st_size}
+
+
+def verified_digest(fpath):
+    """
+    Return the sha256 recorded for `fpath` in its directory's verification
+    cache, or None if it was never verified or has changed on disk since.
+    Costs one stat call.
+    """
+    fpath = Path(fpath)
+    try:
+        st = fpath.stat()
+    except OSError:
+        return None
+    cached = _read_json(fpath.parent / VERIFIED_NAME).get(fpath.name)
+    if isinstance(cached, list) and len(cached) == 3 and cached[:2] == [st.st_size, st.st_mtime_ns]:
+        return cached[2]
+    return None
+
+
+def resolve_model_dir(repo_id, filenames, revision="main", token=None) -> Path:
+    """
+    Return a local directory holding every file in `filenames` from
+    `repo_id`, verified against the directory's manifest. Only files that
+    are missing or fail verification are downloaded. Files placed in the
+    directory by hand are checked against the hub before being adopted,
+    or adopted as they are when HF_HUB_OFFLINE is set.
+    """
+    model_dir = MODEL_DIR / repo_id.replace("/", "--")
+    with _lock:
+        model_dir.mkdir(parents=True, exist_ok=True)
+        manifest = _read_json(model_dir / MANIFEST_NAME)
+        verified = _read_json(model_dir / VERIFIED_NAME)
+        files = manifest.setdefault("files", {})
+        verified_before = dict(verified)
+
+        manifest_changed = False
+        missing = []
+        for fname in filenames:
+            fpath = model_dir / fname
+            if fname not in files and fpath.exists():
+                # Adopt files placed here by hand, e.g. copied into an air-gapped pod
+                try:
+                    matches = None if _hub_offline() else _matches_hub(fpath, repo_id, fname, revision, token)
+                except Exception as e:
+                    print(f"⚠️ Could not check {fpath} against the hub: {e}")
+                    matches = None
+                if matches is None:
+                    print(f"⚠️ Adopting {fpath} unverified")
+                elif not matches:
+                    print(f"⚠️ {fpath} does not match {repo_id}/{fname} on the hub, replacing it")
+                    missing.append(fname)
+                    continue
+                files[fname] = _record(fpath, fname, verified)
+                manifest_changed = True
+            elif fname not in files or not _is_verified(model_dir, fname, files[fname], verified):
+                missing.append(fname)
+
+        if missing:
+            if _hub_offline():
+                raise FileNotFoundError(
+                    f"Model files {missing} are missing or corrupt in {model_dir} and HF_HUB_OFFLINE is set. "
+                    f"Populate the directory with `python -m chatterbox.local_models` first."
+                )
+            for fname in missing:
+                fpath = model_dir / fname
+                print(f"Downloading {repo_id}/{fname} to {model_dir}")
+                # A corrupt local copy must not be taken for a finished download
+                fpath.unlink(missing_ok=True)
+                verified.pop(fname, None)
+                hf_hub_download(
+                    repo_id=repo_id,
+                    filename=fname,
+                    revision=revision,
+                    token=token,
+                    local_dir=model_dir,
+                    force_download=True,
+                )
+                if not _matches_hub(fpath, repo_id, fname, revision, token):
+                    raise OSError(f"Downloaded {repo_id}/{fname} does not match the hub's content hash")
+                files[fname] = _record(fpath, fname, verified)
+            manifest.update(repo_id=repo_id, revision=revision)
+            manifest_changed = True
+
+        if manifest_changed:
+            _write_json(model_dir / MANIFEST_NAME, manifest)
+
+        if verified != verified_before:
+            _write_json(model_dir / VERIFIED_NAME, verified)
+    return model_dir
+
+
+if __name__ == "__main__":
+    # Fetch every checkpoint so the model directory can be used fully offline
+    from .tts import ChatterboxTTS
+    from .mtl_tts import ChatterboxMultilingualTTS
+    from .vc import ChatterboxVC
+
+    for model_cls in (ChatterboxTTS, ChatterboxMultilingualTTS, ChatterboxVC):
+        print(f"{model_cls.__name__}: {model_cls.resolve_checkpoint_dir()}")
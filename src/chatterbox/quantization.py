@@ -0,0 +1,88 @@
+"""
+Dynamic int8 quantization for CPU inference.
+
+With `precision="int8"`, the Linear layers of T3 and of S3Gen's flow decoder
+(the CFM estimator that dominates vocoding time) are replaced by dynamically
+quantized versions. Their weights are stored as int8 and activations are
+quantized on the fly. The quantized state dicts are cached under
+CHATTERBOX_MODEL_DIR/quantized_cache, so later loads skip the fp32
+checkpoint. The int8 kernels (fbgemm/qnnpack) only run on CPU.
+"""
+import os
+from pathlib import Path
+
+import torch
+from torch.ao.quantization import quantize_dynamic
+
+from .local_models import MODEL_DIR
+from .registry import COMPONENTS
+from .weights import source_key
+
+
+PRECISIONS = ("fp32", "int8")
+
+QUANTIZED_DIR = MODEL_DIR / "quantized_cache"
+
+
+def check_precision(precision, device):
+    """Reject unknown precisions and int8 on devices without quantized kernels."""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unsupported precision '{precision}'. Expected one of {PRECISIONS}")
+    if precision == "int8" and str(device) != "cpu":
+        raise ValueError(f"int8 precision is only supported on CPU, not '{device}'")
+
+
+def quantize_int8(module, submodule=None):
+    """Quantize the Linear layers of `module`, or only those under its dotted `submodule`, in place."""
+    target = module.get_submodule(submodule) if submodule else module
+    quantize_dynamic(target, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return module
+
+
+def load_int8_component(kind, ckpt_path, make, load_state_dict, submodule=None, strict=True):
+    """
+    Return the int8 `kind` component for the fp32 checkpoint at `ckpt_path`,
+    shared through COMPONENTS like its fp32 counterpart. `make()` builds an
+    unloaded module and `load_state_dict()` reads the fp32 weights, which is
+    only needed the first time, to fill the on-disk cache.
+    """
+    ckpt_path = Path(ckpt_path)
+    # Packed int8 weights are not guaranteed to load across torch versions
+    cache_path = QUANTIZED_DIR / f"{kind}-{source_key(ckpt_path)}-torch{torch.__version__}.int8.pt"
+    fresh = {}
+
+    def load_quantized_state():
+        if cache_path.exists():
+            return torch.load(cache_path, weights_only=True)
+
+        print(f"Quantizing {kind} weights to int8 (one-time)")
+        module = make()
+        module.load_state_dict(load_state_dict(), strict=strict, assign=True)
+        module = quantize_int8(module.eval(), submodule)
+        fresh["module"] = module
+        state_dict = module.state_dict()
+
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            torch.save(state_dict, tmp_path)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"Could not cache int8 {kind} weights ({e})")
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        return state_dict
+
+    def build(state_dict):
+        if "module" in fresh:
+            return fresh.pop("module")
+        module = quantize_int8(make().eval(), submodule)
+        module.load_state_dict(state_dict, strict=strict)
+        return module
+
+    return COMPONENTS.get(
+        f"{kind}:int8", ckpt_path, "cpu",
+        load_state_dict=load_quantized_state,
+        build=build,
+    )
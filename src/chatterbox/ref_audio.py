@@ -0,0 +1,118 @@
+"""
+Reference-audio loading for voice conditioning.
+
+`load_reference` decodes at most MAX_REF_SECONDS of a reference file at its
+native rate and derives both the 24 kHz (S3Gen) and 16 kHz (tokenizer and
+voice encoder) views from that one decode, with polyphase resampling whose
+FIR kernels are designed once per rate pair. Decoded views are cached per
+file, so ChatterboxTTS, ChatterboxMultilingualTTS and ChatterboxVC share
+them, and long uploads no longer cost a full-file decode and resample.
+"""
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from math import gcd
+
+import librosa
+import numpy as np
+from scipy.signal import firwin, resample_poly
+
+from .models.s3tokenizer import S3_SR
+from .models.s3gen import S3GEN_SR
+
+
+# Longest reference prefix used; S3Gen and the T3 prompt use only the first
+# 10 and 6 seconds, the voice encoder averages over whatever it is given
+MAX_REF_SECONDS = float(os.getenv("CHATTERBOX_MAX_REF_SECONDS", "30"))
+
+
+@lru_cache(maxsize=16)
+def _poly_kernel(up, down):
+    # Same low-pass design resample_poly uses by default, computed once
+    max_rate = max(up, down)
+    kernel = firwin(2 * 10 * max_rate + 1, 1.0 / max_rate, window=("kaiser", 5.0))
+    kernel.setflags(write=False)
+    return kernel
+
+
+def resample(wav, orig_sr, target_sr):
+    """Polyphase-resample a 1D float32 array, reusing the filter kernel for each rate pair."""
+    if orig_sr == target_sr:
+        return wav
+    g = gcd(int(orig_sr), int(target_sr))
+    up, down = int(target_sr) // g, int(orig_sr) // g
+    return resample_poly(wav, up, down, window=_poly_kernel(up, down)).astype(np.float32)
+
+
+class ReferenceAudioCache:
+    """
+    Bounded LRU of decoded reference audio, keyed by file path, size and
+    mtime so edited files are decoded again. Cached arrays are shared
+    between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(fpath, max_seconds):
+        try:
+            fpath = os.path.abspath(os.fspath(fpath))
+            st = os.stat(fpath)
+            return (fpath, st.st_size, st.st_mtime_ns, max_seconds)
+        except (TypeError, OSError):
+            return (str(fpath), None, None, max_seconds)
+
+    def load(self, fpath, max_seconds=MAX_REF_SECONDS):
+        """Return (24 kHz, 16 kHz) mono float32 views of the first `max_seconds` of `fpath`."""
+        key = self._key(fpath, max_seconds)
+        with self._lock:
+            views = self._entries.get(key)
+            if views is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return views
+            self.misses += 1
+
+        # Decode only the prefix, at the file's own rate, then derive both views
+        wav, sr = librosa.load(fpath, sr=None, mono=True, duration=max_seconds)
+        views = (resample(wav, sr, S3GEN_SR), resample(wav, sr, S3_SR))
+
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[key] = views
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return views
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Process-wide cache shared by every model that conditions on reference audio
+REF_AUDIO_CACHE = ReferenceAudioCache(
+    max_entries=int(os.getenv("CHATTERBOX_REF_AUDIO_CACHE_SIZE", "16"))
+)
+
+
+def load_reference(fpath, max_seconds=MAX_REF_SECONDS):
+    """Return cached (24 kHz, 16 kHz) views of a reference file's first `max_seconds`."""
+    return REF_AUDIO_CACHE.load(fpath, max_seconds)
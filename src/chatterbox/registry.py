@@ -0,0 +1,165 @@
+"""
+Registry of loaded model components shared by ChatterboxTTS,
+ChatterboxMultilingualTTS and ChatterboxVC.
+
+All three models embed an S3Gen, and the two TTS models also embed a
+VoiceEncoder. Components are keyed by a fingerprint of their weights, so a
+checkpoint is turned into a module once per device and every model that
+needs identical weights gets the same instance, whatever file format they
+were stored in. Entries are held weakly: a component is freed as soon as
+no loaded model references it.
+
+Hashing a state dict reads every byte of it, so each checkpoint's
+fingerprint is computed once per version on disk and remembered in
+`fingerprints.json` under CHATTERBOX_MODEL_DIR. A checkpoint is identified
+by the digest `local_models` already verified it against, or else by its
+path, size and mtime. A later cold load of an unchanged checkpoint only
+reads the weights when no matching component is resident.
+"""
+import hashlib
+import json
+import os
+import threading
+import weakref
+
+import torch
+
+from .local_models import MODEL_DIR, verified_digest
+
+
+FINGERPRINTS_PATH = MODEL_DIR / "fingerprints.json"
+
+
+def _hash_value(h, value):
+    if isinstance(value, (tuple, list)):
+        # Quantized layers store their packed (weight, bias) as a tuple
+        for item in value:
+            _hash_value(h, item)
+        return
+    if not torch.is_tensor(value):
+        h.update(repr(value).encode())
+        return
+    h.update(f"{value.dtype}{tuple(value.shape)}".encode())
+    if value.is_quantized:
+        if value.qscheme() in (torch.per_tensor_affine, torch.per_tensor_symmetric):
+            h.update(f"{value.q_scale()}:{value.q_zero_point()}".encode())
+        else:
+            _hash_value(h, value.q_per_channel_scales())
+            _hash_value(h, value.q_per_channel_zero_points())
+        value = value.int_repr()
+    h.update(value.detach().cpu().contiguous().reshape(-1).view(torch.uint8).numpy())
+
+
+def state_dict_fingerprint(state_dict) -> str:
+    """Return a sha256 digest over the names, dtypes, shapes and bytes of a state dict."""
+    h = hashlib.sha256()
+    for name in sorted(state_dict):
+        h.update(name.encode())
+        _hash_value(h, state_dict[name])
+    return h.hexdigest()
+
+
+def _source_id(kind, ckpt_path, st):
+    """Identify the `kind` component of a checkpoint file by content digest if verified, else by path, size and mtime."""
+    digest = verified_digest(ckpt_path)
+    if digest is not None:
+        return f"{kind}:sha256:{digest}"
+    return f"{kind}:{ckpt_path}:{st.st_size}:{st.st_mtime_ns}"
+
+
+class ComponentRegistry:
+    """Load each distinct component once per device and hand out the shared instance."""
+
+    def __init__(self, fingerprints_path=FINGERPRINTS_PATH):
+        self._components = weakref.WeakValueDictionary()  # (kind, fingerprint, device) -> module
+        self._fingerprints_path = fingerprints_path
+        self._fingerprints = None  # source id -> fingerprint, loaded on first use
+        self._lock = threading.RLock()
+        self.loads = 0
+        self.reuses = 0
+        self.fingerprinted = 0
+
+    def _known_fingerprints(self):
+        if self._fingerprints is None:
+            try:
+                with open(self._fingerprints_path, "r", encoding="utf-8") as f:
+                    self._fingerprints = json.load(f)
+            except (OSError, ValueError):
+                self._fingerprints = {}
+        return self._fingerprints
+
+    def _remember(self, source_id, fingerprint):
+        fingerprints = self._known_fingerprints()
+        fingerprints[source_id] = fingerprint
+        try:
+            os.makedirs(os.path.dirname(self._fingerprints_path), exist_ok=True)
+            tmp_path = f"{self._fingerprints_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(fingerprints, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self._fingerprints_path)
+        except OSError as e:
+            # Still remembered for this process
+            print(f"⚠️ Could not save component fingerprints: {e}")
+
+    def get(self, kind, ckpt_path, device, load_state_dict, build):
+        """
+        Return the `kind` component for the checkpoint at `ckpt_path` on
+        `device`. `load_state_dict()` reads the weights and `build(state_dict)`
+        constructs the module; neither runs when a matching instance is
+        already resident.
+        """
+        ckpt_path = os.path.abspath(os.fspath(ckpt_path))
+        st = os.stat(ckpt_path)
+        device = str(device)
+        source_id = _source_id(kind, ckpt_path, st)
+
+        with self._lock:
+            # Fast path: this checkpoint was fingerprinted before and its component is resident
+            fingerprint = self._known_fingerprints().get(source_id)
+            if fingerprint is not None:
+                component = self._components.get((kind, fingerprint, device))
+                if component is not None:
+                    self.reuses += 1
+                    return component
+
+            state_dict = load_state_dict()
+            if fingerprint is None:
+                fingerprint = state_dict_fingerprint(state_dict)
+                self.fingerprinted += 1
+                self._remember(source_id, fingerprint)
+
+            # Identical weights may already be resident from another checkpoint file
+            key = (kind, fingerprint, device)
+            component = self._components.get(key)
+            if component is not None:
+                self.reuses += 1
+                return component
+
+            component = build(state_dict)
+            component.registry_fingerprint = fingerprint
+            self._components[key] = component
+            self.loads += 1
+            return component
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "resident": sorted(f"{kind}@{device}" for kind, _, device in self._components.keys()),
+                "loads": self.loads,
+                "reuses": self.reuses,
+                "fingerprinted": self.fingerprinted,
+            }
+
+
+def components_tag(*components) -> str:
+    """
+    Short stamp of the weights behind `components`, for keys of data derived
+    from them such as cached voice conditionals. Components not built by the
+    registry are told apart by identity only.
+    """
+    ids = [getattr(c, "registry_fingerprint", None) or f"{type(c).__name__}@{id(c)}" for c in components]
+    return hashlib.sha256(":".join(ids).encode()).hexdigest()[:12]
+
+
+# Process-wide registry used by every model's from_local
+COMPONENTS = ComponentRegistry()
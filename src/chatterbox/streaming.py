@@ -0,0 +1,115 @@
+"""
+Incremental vocoding of T3 speech tokens for low-latency streaming.
+
+Tokens are vocoded with S3Gen in overlapping windows as soon as enough of
+them have been decoded. Each window re-synthesizes some already-emitted
+tokens as left context, so the new audio starts from a warm state, and a
+few trailing tokens are held back until the following window supplies
+their lookahead. Consecutive blocks are crossfaded to hide the seams.
+"""
+import numpy as np
+import torch
+
+
+# Speech token ids at or above this are special (start/stop) tokens
+SPEECH_VOCAB_SIZE = 6561
+
+
+class StreamingVocoder:
+    """
+    Accumulate speech tokens and turn them into contiguous PCM blocks.
+
+    `vocode` maps a 1D tensor of speech tokens to a float32 numpy waveform.
+    """
+
+    def __init__(self, vocode, context_tokens=50, lookahead_tokens=3, fade_samples=480):
+        self.vocode = vocode
+        self.context_tokens = context_tokens
+        self.lookahead_tokens = lookahead_tokens
+        self.fade_samples = fade_samples
+        self.tokens = []
+        self.done = 0  # tokens whose audio has been emitted (or is held in `tail`)
+        self.tail = None  # last samples of the previous block, kept back for the crossfade
+
+    @property
+    def pending(self):
+        """Number of pushed tokens whose audio has not been emitted yet."""
+        return len(self.tokens) - self.done
+
+    def push(self, token):
+        self.tokens.append(int(token))
+
+    def next_block(self, final=False):
+        """
+        Vocode the pending tokens and return the next PCM block, or None if
+        nothing is ready. With `final`, all remaining audio is flushed.
+        """
+        n = len(self.tokens)
+        end = n if final else n - self.lookahead_tokens
+        if end <= self.done:
+            if final and self.tail is not None:
+                block, self.tail = self.tail, None
+                return block
+            return None
+
+        start = max(0, self.done - self.context_tokens)
+        wav = self.vocode(torch.tensor(self.tokens[start:n], dtype=torch.long))
+        samples_per_token = len(wav) / (n - start)
+        lo = int(round((self.done - start) * samples_per_token))
+        hi = len(wav) if final else int(round((end - start) * samples_per_token))
+        block = wav[lo:hi]
+
+        if self.tail is not None:
+            fade = len(self.tail)
+            if lo >= fade:
+                # The context region re-synthesizes the held-back tail; blend the two
+                ramp = np.linspace(0.0, 1.0, fade, dtype=wav.dtype)
+                blended = self.tail * (1.0 - ramp) + wav[lo - fade:lo] * ramp
+            else:
+                blended = self.tail
+            block = np.concatenate([blended, block])
+
+        if not final and len(block) > self.fade_samples:
+            self.tail = block[-self.fade_samples:]
+            block = block[:-self.fade_samples]
+        else:
+            self.tail = None
+        self.done = end
+        return block
+
+
+def stream_wav_blocks(
+    token_steps,
+    vocode,
+    eos,
+    chunk_size=25,
+    context_tokens=50,
+    lookahead_tokens=3,
+    fade_samples=480,
+):
+    """
+    Consume per-step speech tokens from `token_steps` (as yielded by
+    `iter_batched_tokens` for a single sample) and yield float32 PCM blocks
+    every `chunk_size` tokens, flushing the remainder at the stop token.
+    """
+    vocoder = StreamingVocoder(
+        vocode,
+        context_tokens=context_tokens,
+        lookahead_tokens=lookahead_tokens,
+        fade_samples=fade_samples,
+    )
+    for step_tokens in token_steps:
+        token = int(step_tokens[0])
+        if token == eos:
+            break
+        if token >= SPEECH_VOCAB_SIZE:
+            continue
+        vocoder.push(token)
+        if vocoder.pending >= chunk_size + lookahead_tokens:
+            block = vocoder.next_block()
+            if block is not None and len(block):
+                yield block
+
+    block = vocoder.next_block(final=True)
+    if block is not None and len(block):
+        yield block
@@ -0,0 +1,273 @@
+"""
+Content-addressed cache of synthesis results for deterministic requests.
+
+A request with a fixed seed is determined by its text, voice, seed, sampling
+parameters and model version, so repeating it can reuse earlier work. Each
+text chunk is cached in two tiers:
+  - T3 speech tokens, stored as int16 and three orders of magnitude smaller
+    than the audio they produce, so their tier holds many more entries; a
+    hit skips T3 and only runs S3Gen;
+  - final watermarked waveforms, which fill their tier much faster and so
+    keep only recent repeats; a hit skips synthesis entirely.
+Both tiers are LRU-bounded by bytes and can spill evicted entries to disk,
+where they survive restarts and are shared by worker processes.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import torch
+
+from .cond_cache import file_digest
+
+# Bumped whenever the way a request is sampled changes, so entries cached before no longer match
+KEY_VERSION = 2
+
+
+class CacheTier:
+    """
+    Byte-bounded LRU of CPU tensors keyed by hex digest, optionally spilling
+    evicted entries to `spill_dir` (itself bounded to `max_spill_bytes`).
+    Cached tensors are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, name, max_bytes):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.spill_dir = None
+        self.max_spill_bytes = 0
+        self._spilled = OrderedDict()  # file name -> size, oldest first
+        self.spill_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def enable_spill(self, spill_dir, max_spill_bytes):
+        """Spill evicted entries to `spill_dir`, picking up files left by earlier runs."""
+        os.makedirs(spill_dir, exist_ok=True)
+        files = []
+        for name in os.listdir(spill_dir):
+            if name.endswith(".pt"):
+                st = os.stat(os.path.join(spill_dir, name))
+                files.append((st.st_mtime_ns, name, st.st_size))
+        with self._lock:
+            self.spill_dir = spill_dir
+            self.max_spill_bytes = max_spill_bytes
+            self._spilled = OrderedDict((name, size) for _, name, size in sorted(files))
+            self.spill_bytes = sum(self._spilled.values())
+
+    @staticmethod
+    def _nbytes(tensor):
+        return tensor.numel() * tensor.element_size()
+
+    def get(self, key):
+        with self._lock:
+            tensor = self._entries.get(key)
+            if tensor is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return tensor
+        tensor = self._load_spilled(key)
+        with self._lock:
+            if tensor is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self.put(key, tensor)
+        return tensor
+
+    def put(self, key, tensor):
+        nbytes = self._nbytes(tensor)
+        if nbytes > self.max_bytes:
+            return
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._nbytes(self._entries[key])
+            self._entries[key] = tensor
+            self._entries.move_to_end(key)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                old_key, old = self._entries.popitem(last=False)
+                self.bytes -= self._nbytes(old)
+                self.evictions += 1
+                evicted.append((old_key, old))
+        for old_key, old in evicted:
+            self._spill(old_key, old)
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, f"{key}.pt")
+
+    def _load_spilled(self, key):
+        if self.spill_dir is None:
+            return None
+        fpath = self._spill_path(key)
+        try:
+            tensor = torch.load(fpath, map_location="cpu", weights_only=True)
+            os.utime(fpath)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Ignoring unreadable {self.name} cache file {fpath}: {e}")
+            return None
+        with self._lock:
+            if f"{key}.pt" in self._spilled:
+                self._spilled.move_to_end(f"{key}.pt")
+        return tensor
+
+    def _spill(self, key, tensor):
+        """Atomically write an evicted entry, then trim the oldest spilled files."""
+        if self.spill_dir is None or self.max_spill_bytes <= 0:
+            return
+        name = f"{key}.pt"
+        fpath = self._spill_path(key)
+        if not os.path.exists(fpath):
+            tmp_path = f"{fpath}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                torch.save(tensor, tmp_path)
+                os.replace(tmp_path, fpath)
+            except OSError as e:
+                print(f"Could not spill {self.name} cache entry to {fpath}: {e}")
+                return
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        stale = []
+        with self._lock:
+            self.spill_bytes -= self._spilled.pop(name, 0)
+            self._spilled[name] = os.path.getsize(fpath)
+            self.spill_bytes += self._spilled[name]
+            while self.spill_bytes > self.max_spill_bytes and len(self._spilled) > 1:
+                old_name, size = self._spilled.popitem(last=False)
+                self.spill_bytes -= size
+                stale.append(old_name)
+        for old_name in stale:
+            try:
+                os.remove(os.path.join(self.spill_dir, old_name))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_mb": round(self.bytes / 1024**2, 2),
+                "max_mb": round(self.max_bytes / 1024**2, 2),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "spilled_entries": len(self._spilled),
+                "spilled_mb": round(self.spill_bytes / 1024**2, 2),
+            }
+
+
+def voice_id(audio_prompt_path) -> str:
+    """Identify a voice by content for local files, by location otherwise (e.g. a URL)."""
+    if audio_prompt_path is None:
+        return "builtin"
+    try:
+        if os.path.isfile(audio_prompt_path):
+            return file_digest(audio_prompt_path)
+    except (TypeError, OSError):
+        pass
+    return str(audio_prompt_path)
+
+
+class SynthesisCache:
+    """Two-tier cache of per-chunk speech tokens and waveforms for fixed-seed requests."""
+
+    def __init__(self, token_bytes, audio_bytes):
+        self.tokens = CacheTier("tokens", token_bytes)
+        self.audio = CacheTier("audio", audio_bytes)
+
+    @property
+    def enabled(self) -> bool:
+        return self.tokens.max_bytes > 0 or self.audio.max_bytes > 0
+
+    def enable_spill(self, spill_dir, max_spill_bytes):
+        """Spill both tiers under `spill_dir`, splitting the disk budget in proportion to their memory budgets."""
+        total = self.tokens.max_bytes + self.audio.max_bytes
+        for tier in (self.tokens, self.audio):
+            share = max_spill_bytes * tier.max_bytes / total if total else 0
+            tier.enable_spill(os.path.join(spill_dir, tier.name), int(share))
+
+    def request_key(self, model, voice, text, seed, **params):
+        """
+        Digest every input that determines the output of a request. `model`
+        must change whenever the weights do (class, version, precision).
+        Returns None for unseeded requests, which are never cached.
+        """
+        if not seed or not self.enabled:
+            return None
+        fields = {
+            "key_version": KEY_VERSION,
+            "model": model,
+            "voice": voice_id(voice),
+            "text": text,
+            "seed": int(seed),
+            **{name: round(value, 6) if isinstance(value, float) else value for name, value in params.items()},
+        }
+        payload = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def stages(self, request_key, decode, vocode):
+        """
+        Wrap a ChunkPipeline's `decode` ((index, text) -> tokens) and `vocode`
+        (tokens -> wav) stages to consult the cache. The wrapped decode takes
+        `(index, chunk)` items, since a chunk's output with a fixed seed
+        depends on its position. `decode` must sample each chunk from its own
+        generator (see GenerationContext.for_chunk), never from state shared
+        with earlier chunks, or a hit on one chunk would change the chunks
+        after it. With `request_key` None the stages simply pass through.
+        """
+        def cached_decode(item):
+            index, chunk = item
+            if request_key is None:
+                return None, decode(index, chunk), None
+            key = f"{request_key}-{index}"
+            if (wav := self.audio.get(key)) is not None:
+                return key, None, wav
+            if (tokens := self.tokens.get(key)) is not None:
+                return key, tokens.long(), None
+            tokens = decode(index, chunk)
+            self.tokens.put(key, tokens.to("cpu", torch.int16))
+            return key, tokens, None
+
+        def cached_vocode(decoded):
+            key, tokens, wav = decoded
+            if wav is None:
+                wav = vocode(tokens)
+                if key is not None:
+                    self.audio.put(key, wav)
+            return wav
+
+        return cached_decode, cached_vocode
+
+    def clear(self):
+        self.tokens.clear()
+        self.audio.clear()
+
+    def stats(self) -> dict:
+        return {"tokens": self.tokens.stats(), "audio": self.audio.stats()}
+
+
+# Process-wide cache shared by the English and multilingual models
+SYNTHESIS_CACHE = SynthesisCache(
+    token_bytes=int(float(os.getenv("CHATTERBOX_TOKEN_CACHE_MB", "64")) * 1024**2),
+    audio_bytes=int(float(os.getenv("CHATTERBOX_AUDIO_CACHE_MB", "256")) * 1024**2),
+)
@@ -0,0 +1,248 @@
+"""
+Batched autoregressive decoding for T3.
+
+`T3.inference` decodes one text (plus its CFG twin) per call. The helpers here
+left-pad several texts into a single batch and run the same sampling loop,
+tracking end-of-speech separately for every sample. Multilingual models also
+get `T3.inference`'s alignment checks on the stop token, per sample.
+"""
+import torch
+import torch.nn.functional as F
+from transformers.generation.logits_process import (
+    MinPLogitsWarper,
+    RepetitionPenaltyLogitsProcessor,
+    TopPLogitsWarper,
+)
+
+from .alignment import AlignmentAnalyzer, aligned_attention, capture_attention
+from .token_budget import MAX_NEW_TOKENS, RunawayDetector
+
+
+def prepare_batch_inputs(t3, t3_conds, text_tokens, cfg_weight=0.0):
+    """
+    Build left-padded input embeddings for a batch of texts.
+
+    `text_tokens` is a list of (1, T_i) tensors already wrapped in start/stop
+    text tokens, and `t3_conds` holds one T3Cond per text. When CFG is enabled
+    rows are ordered [cond_0 .. cond_{B-1}, uncond_0 .. uncond_{B-1}].
+    Returns (embeds, attention_mask, text_spans), where `text_spans` holds the
+    (start, end) positions of each text's tokens in its padded cond row.
+    """
+    use_cfg = cfg_weight > 0.0
+    device = t3.device
+    sos = t3.hp.start_speech_token
+
+    bos_token = torch.tensor([[sos]], dtype=torch.long, device=device)
+    bos_embed = t3.speech_emb(bos_token) + t3.speech_pos_emb.get_fixed_embedding(0)
+
+    cond_rows, uncond_rows, spans = [], [], []
+    for t3_cond, tokens in zip(t3_conds, text_tokens):
+        tokens = torch.atleast_2d(tokens).to(dtype=torch.long, device=device)
+        if use_cfg:
+            tokens = torch.cat([tokens, tokens], dim=0)  # Need two seqs for CFG
+        embeds, len_cond = t3.prepare_input_embeds(
+            t3_cond=t3_cond,
+            text_tokens=tokens,
+            speech_tokens=sos * torch.ones_like(tokens[:, :1]),
+            cfg_weight=cfg_weight,
+        )
+        # Mirror T3.inference, which appends a BOS embedding to the prepared inputs
+        embeds = torch.cat([embeds, bos_embed.expand(embeds.size(0), -1, -1)], dim=1)
+        cond_rows.append(embeds[0])
+        spans.append((len_cond, len_cond + tokens.size(-1)))
+        if use_cfg:
+            uncond_rows.append(embeds[1])
+
+    rows = cond_rows + uncond_rows
+    max_len = max(row.size(0) for row in rows)
+    embeds = torch.stack([F.pad(row, (0, 0, max_len - row.size(0), 0)) for row in rows])
+    attention_mask = torch.stack([
+        F.pad(torch.ones(row.size(0), dtype=torch.long, device=device), (max_len - row.size(0), 0))
+        for row in rows
+    ])
+    text_spans = [
+        (start + max_len - row.size(0), end + max_len - row.size(0))
+        for (start, end), row in zip(spans, cond_rows)
+    ]
+    return embeds, attention_mask, text_spans
+
+
+def decode_step(t3, inputs_embeds, attention_mask, position_ids, past_key_values=None, output_attentions=False):
+    """
+    One transformer forward pass. Returns the speech logits at the last
+    position and the updated KV cache. Models compiled with
+    `compilation.compile_model` run a compiled version of this per token.
+    """
+    output = t3.tfmr(
+        inputs_embeds=inputs_embeds,
+        attention_mask=attention_mask,
+        position_ids=position_ids,
+        past_key_values=past_key_values,
+        use_cache=True,
+        output_attentions=output_attentions,
+        return_dict=True,
+    )
+    return t3.speech_head(output.last_hidden_state[:, -1, :]), output.past_key_values
+
+
+def sample_tokens(probs, generator=None):
+    """Draw one token per row of `probs` from `generator` (one, one per row, or None)."""
+    if isinstance(generator, (list, tuple)):
+        return torch.cat([
+            torch.multinomial(row[None], num_samples=1, generator=g)
+            for row, g in zip(probs, generator)
+        ]).squeeze(1)
+    return torch.multinomial(probs, num_samples=1, generator=generator).squeeze(1)
+
+
+@torch.inference_mode()
+def iter_batched_tokens(
+    t3,
+    *,
+    t3_conds,
+    text_tokens,
+    max_new_tokens=MAX_NEW_TOKENS,
+    temperature=0.8,
+    cfg_weight=0.5,
+    repetition_penalty=1.2,
+    min_p=0.05,
+    top_p=1.0,
+    detect_runaway=True,
+    check_alignment=None,
+    generator=None,
+):
+    """
+    Yield the next speech token of every sample as a (B,) tensor, one per step.
+    `max_new_tokens` is either one budget for all samples or one per sample.
+    With `detect_runaway`, samples stuck in repetition loops or long silences
+    are stopped early by emitting the stop token in their place.
+    With `check_alignment` (default: multilingual models only, as in
+    `T3.inference`), each sample's text-speech alignment holds back a stop
+    token before the end of its text and forces one on hallucinated tails.
+    Samples that already stopped keep yielding the stop token; decoding ends
+    once every sample has stopped or exhausted its budget.
+    `generator` is a torch.Generator to sample every row from, or one per
+    sample so each row's tokens depend only on its own generator; None
+    samples from the global RNG.
+    """
+    batch_size = len(text_tokens)
+    use_cfg = cfg_weight > 0.0
+    device = t3.device
+    eos = t3.hp.stop_speech_token
+
+    if isinstance(max_new_tokens, int):
+        max_new_tokens = [max_new_tokens] * batch_size
+    budgets = torch.tensor(max_new_tokens, device=device)
+    detector = RunawayDetector(batch_size) if detect_runaway else None
+
+    embeds, attention_mask, text_spans = prepare_batch_inputs(t3, t3_conds, text_tokens, cfg_weight)
+    # Left padding shifts every row, so positions are counted over real tokens only
+    position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+
+    top_p_warper = TopPLogitsWarper(top_p=top_p)
+    min_p_warper = MinPLogitsWarper(min_p=min_p)
+    repetition_penalty_processor = RepetitionPenaltyLogitsProcessor(penalty=float(repetition_penalty))
+
+    generated_ids = torch.full((batch_size, 1), t3.hp.start_speech_token, dtype=torch.long, device=device)
+    finished = torch.zeros(batch_size, dtype=torch.bool, device=device)
+
+    if check_alignment is None:
+        check_alignment = getattr(t3.hp, "is_multilingual", False)
+    analyzers = [AlignmentAnalyzer(span, eos) for span in text_spans] if check_alignment else None
+
+    def forward(step, *args):
+        if analyzers is None:
+            return step(t3, *args) + (None,)
+        with capture_attention(t3) as maps:
+            logits, past_key_values = step(t3, *args, output_attentions=True)
+        return logits, past_key_values, aligned_attention(maps)
+
+    # The prompt pass runs once per request and stays eager; only the per-token step is compiled.
+    # Alignment checks read attention weights through hooks, so they keep the step eager too.
+    step = (analyzers is None and getattr(t3, "compiled_decode_step", None)) or decode_step
+    logits, past_key_values, attention = forward(decode_step, embeds, attention_mask, position_ids)
+    for i in range(max(max_new_tokens, default=0)):
+        if use_cfg:
+            cond, uncond = logits[:batch_size], logits[batch_size:]
+            logits = cond + cfg_weight * (cond - uncond)
+
+        if attention is not None:
+            for b, analyzer in enumerate(analyzers):
+                if not finished[b]:
+                    row = analyzer.step(logits[b:b + 1].float(), attention[b], generated_ids[b, -1].item())
+                    logits[b:b + 1] = row.to(logits.dtype)
+
+        logits = repetition_penalty_processor(generated_ids, logits)
+        if temperature != 1.0:
+            logits = logits / temperature
+        logits = min_p_warper(generated_ids, logits)
+        logits = top_p_warper(generated_ids, logits)
+
+        probs = torch.softmax(logits, dim=-1)
+        next_tokens = sample_tokens(probs, generator)
+        next_tokens = torch.where(finished, torch.full_like(next_tokens, eos), next_tokens)
+        if detector is not None:
+            runaway = detector.update(next_tokens, finished)
+            next_tokens = torch.where(runaway, torch.full_like(next_tokens, eos), next_tokens)
+
+        generated_ids = torch.cat([generated_ids, next_tokens[:, None]], dim=1)
+        finished |= next_tokens == eos
+        yield next_tokens
+
+        # Samples that used up their own budget stop here, without a stop token
+        finished |= budgets <= i + 1
+        if finished.all():
+            break
+
+        next_embed = t3.speech_emb(next_tokens[:, None]) + t3.speech_pos_emb.get_fixed_embedding(i + 1)
+        if use_cfg:
+            next_embed = torch.cat([next_embed, next_embed])
+        attention_mask = F.pad(attention_mask, (0, 1), value=1)
+        position_ids = position_ids[:, -1:] + 1
+
+        logits, past_key_values, attention = forward(step, next_embed, attention_mask, position_ids, past_key_values)
+
+
+def batched_t3_inference(
+    t3, *, t3_conds, text_tokens, max_batch_size=8, max_new_tokens=MAX_NEW_TOKENS, generator=None, **kwargs
+):
+    """
+    Decode speech tokens for every text, batching up to `max_batch_size` texts
+    of similar length per forward pass to limit padding.
+    `max_new_tokens` may be a single budget or one budget per text, and
+    `generator` a single torch.Generator or one per text.
+    Returns one 1D token tensor per text, in input order, ending at the stop
+    token when one was emitted.
+    """
+    eos = t3.hp.stop_speech_token
+    order = sorted(range(len(text_tokens)), key=lambda i: text_tokens[i].size(-1), reverse=True)
+    results = [None] * len(text_tokens)
+
+    for start in range(0, len(order), max_batch_size):
+        idx = order[start:start + max_batch_size]
+        steps = list(iter_batched_tokens(
+            t3,
+            t3_conds=[t3_conds[i] for i in idx],
+            text_tokens=[text_tokens[i] for i in idx],
+            max_new_tokens=(
+                max_new_tokens if isinstance(max_new_tokens, int)
+                else [max_new_tokens[i] for i in idx]
+            ),
+            generator=(
+                [generator[i] for i in idx] if isinstance(generator, (list, tuple))
+                else generator
+            ),
+            **kwargs,
+        ))
+        if steps:
+            tokens = torch.stack(steps, dim=1)
+        else:
+            tokens = torch.empty(len(idx), 0, dtype=torch.long, device=t3.device)
+
+        for row, i in enumerate(idx):
+            seq = tokens[row]
+            stops = (seq == eos).nonzero()
+            if len(stops):
+                seq = seq[:stops[0, 0].item() + 1]
+            results[i] = seq
+    return results
@@ -0,0 +1,180 @@
+"""
+Text frontend shared by ChatterboxTTS and ChatterboxMultilingualTTS:
+punctuation normalization and tokenization, with an LRU cache from
+(language, text) to token ids so repeated prompts skip both.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import torch
+import torch.nn.functional as F
+
+
+# Token ids cached per model, keyed by (language, raw text)
+TEXT_CACHE_SIZE = int(os.getenv("CHATTERBOX_TEXT_CACHE_SIZE", "4096"))
+
+EMPTY_TEXT = "You need to add some text for me to talk."
+
+SENTENCE_ENDERS = (".", "!", "?", "-", ",")
+CJK_SENTENCE_ENDERS = SENTENCE_ENDERS + ("、", "，", "。", "？", "！")
+
+# Uncommon/LLM punctuation, rewritten in this order
+PUNC_TO_REPLACE = [
+    ("...", ", "),
+    ("…", ", "),
+    (":", ","),
+    (" - ", ", "),
+    (";", ", "),
+    ("—", "-"),
+    ("–", "-"),
+    (" ,", ","),
+    ("“", "\""),
+    ("”", "\""),
+    ("‘", "'"),
+    ("’", "'"),
+]
+
+# The quote rewrites are single characters that no other rewrite produces or
+# consumes, so one translate() applies them all
+_QUOTES = str.maketrans({old: new for old, new in PUNC_TO_REPLACE[-4:]})
+
+# Every other rewrite matches only spaces and punctuation, and so does its
+# output. Matching a maximal run of those characters that contains something
+# to rewrite, and applying the ordered rewrites to that run alone, gives the
+# same result as applying them one after another to the whole string, in a
+# single scan.
+_RUN_CHARS = r"[ .…:;,\-—–]"
+_PUNC_RUN = re.compile(rf"{_RUN_CHARS}*(?:[.…:;—–]| [-,]){_RUN_CHARS}*")
+
+
+@lru_cache(maxsize=1024)
+def _rewrite_run(run):
+    for old, new in PUNC_TO_REPLACE[:-4]:
+        run = run.replace(old, new)
+    return run
+
+
+def punc_norm(text: str, sentence_enders=SENTENCE_ENDERS) -> str:
+    """
+        Quick cleanup func for punctuation from LLMs or
+        containing chars not seen often in the dataset
+    """
+    if len(text) == 0:
+        return EMPTY_TEXT
+
+    # Capitalise first letter
+    if text[0].islower():
+        text = text[0].upper() + text[1:]
+
+    # Remove multiple space chars
+    text = " ".join(text.split())
+
+    # Replace uncommon/llm punc
+    text = _PUNC_RUN.sub(lambda m: _rewrite_run(m.group()), text).translate(_QUOTES)
+
+    # Add full stop if no ending punc
+    text = text.rstrip(" ")
+    if not text.endswith(sentence_enders):
+        text += "."
+
+    return text
+
+
+class TextFrontend:
+    """
+    Normalizes and tokenizes text for one model. Token ids, already wrapped
+    in start/stop text tokens and placed on the model's device, are cached
+    per (language, raw text). Cached tensors are shared between callers and
+    must be treated as read-only.
+    """
+
+    def __init__(self, encode, sot, eot, device, sentence_enders=SENTENCE_ENDERS, max_entries=None,
+                 encode_batch=None):
+        # encode(text, language_id) -> list of ids; encode_batch(texts, language_id) -> list of lists
+        self.encode = encode
+        self.encode_batch = encode_batch
+        self.sot = sot
+        self.eot = eot
+        self.device = device
+        self.sentence_enders = sentence_enders
+        self.max_entries = TEXT_CACHE_SIZE if max_entries is None else max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key):
+        with self._lock:
+            tokens = self._entries.get(key)
+            if tokens is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return tokens
+
+    def _store(self, key, tokens):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = tokens
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _wrap(self, ids):
+        tokens = torch.tensor([ids], dtype=torch.long, device=self.device)
+        return F.pad(F.pad(tokens, (1, 0), value=self.sot), (0, 1), value=self.eot)
+
+    def tokenize(self, text, language_id=None):
+        """Return the (1, T) token ids of `text`, wrapped in start/stop text tokens."""
+        return self.tokenize_batch([text], language_id)[0]
+
+    def tokenize_batch(self, texts, language_id=None):
+        """
+        Tokenize several texts at once. Cache hits are returned directly and
+        the distinct misses are normalized and encoded in one batch.
+        """
+        results = [None] * len(texts)
+        misses = OrderedDict()  # raw text -> indices waiting for it
+        for i, text in enumerate(texts):
+            tokens = self._lookup((language_id, text))
+            if tokens is None:
+                misses.setdefault(text, []).append(i)
+            else:
+                results[i] = tokens
+
+        if misses:
+            normalized = [punc_norm(text, self.sentence_enders) for text in misses]
+            if self.encode_batch is not None:
+                ids_batch = self.encode_batch(normalized, language_id)
+            else:
+                ids_batch = [self.encode(text, language_id) for text in normalized]
+            for (text, indices), ids in zip(misses.items(), ids_batch):
+                tokens = self._wrap(ids)
+                self._store((language_id, text), tokens)
+                for i in indices:
+                    results[i] = tokens
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
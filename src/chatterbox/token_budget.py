@@ -0,0 +1,103 @@
+"""
+Speech-token budgets and runaway-decoding detection for T3.
+
+T3 emits speech tokens at 25 per second of audio. Instead of always allowing
+a fixed 1000 tokens (40 s), the budget is derived from the text length and
+the typical speaking rate of its language, and decoding is cut short when
+the recent tokens show a repetition loop or a long silence/stall.
+"""
+import logging
+import math
+
+import torch
+
+
+logger = logging.getLogger(__name__)
+
+SPEECH_TOKENS_PER_SECOND = 25
+MAX_NEW_TOKENS = 1000
+
+# Approximate spoken characters per second (whitespace excluded)
+DEFAULT_CHARS_PER_SECOND = 13.0
+CHARS_PER_SECOND = {
+    "en": 14.0,
+    "ja": 7.0,
+    "ko": 6.0,
+    "zh": 5.0,
+}
+
+
+def speech_token_budget(
+    text: str,
+    language_id: str = "en",
+    slack: float = 2.0,
+    base_tokens: int = 50,
+    min_tokens: int = 75,
+    max_tokens: int = MAX_NEW_TOKENS,
+) -> int:
+    """
+    Return the max number of speech tokens to decode for `text`: the expected
+    duration at the language's speaking rate, times `slack`, plus a fixed
+    allowance for leading/trailing silence.
+    """
+    n_chars = len("".join(text.split()))
+    rate = CHARS_PER_SECOND.get((language_id or "en").lower(), DEFAULT_CHARS_PER_SECOND)
+    budget = math.ceil(n_chars / rate * SPEECH_TOKENS_PER_SECOND * slack) + base_tokens
+    return max(min_tokens, min(max_tokens, budget))
+
+
+class RunawayDetector:
+    """
+    Per-sample online check of the most recent speech tokens. A sample is
+    flagged when a single token repeats `max_token_run` times, when the last
+    `window` tokens contain fewer than `min_distinct` ids (silence or a
+    stalled model), or when the tail is periodic with period <= `max_period`
+    over at least `min_loop_tokens` tokens and `min_repeats` periods.
+    """
+
+    def __init__(
+        self,
+        batch_size,
+        max_token_run=40,
+        window=75,
+        min_distinct=4,
+        max_period=25,
+        min_repeats=3,
+        min_loop_tokens=24,
+    ):
+        self.max_token_run = max_token_run
+        self.window = window
+        self.min_distinct = min_distinct
+        self.max_period = max_period
+        self.min_repeats = min_repeats
+        self.min_loop_tokens = min_loop_tokens
+        self.history = [[] for _ in range(batch_size)]
+        self.reasons = [None] * batch_size
+
+    def _check(self, h):
+        if len(h) >= self.max_token_run and len(set(h[-self.max_token_run:])) == 1:
+            return "token run"
+        if len(h) >= self.window and len(set(h[-self.window:])) < self.min_distinct:
+            return "silence"
+        for period in range(2, self.max_period + 1):
+            span = period * max(self.min_repeats, math.ceil(self.min_loop_tokens / period))
+            if len(h) < span:
+                continue
+            tail = h[-span:]
+            if tail[:-period] == tail[period:]:
+                return f"loop (period {period})"
+        return None
+
+    def update(self, tokens, finished):
+        """Record one step of (B,) tokens; return a (B,) bool tensor of samples to stop."""
+        stop = [False] * len(self.history)
+        for b, (token, done) in enumerate(zip(tokens.tolist(), finished.tolist())):
+            if done:
+                continue
+            self.history[b].append(token)
+            reason = self._check(self.history[b])
+            if reason is not None:
+                self.reasons[b] = reason
+                stop[b] = True
+                logger.info(f"Stopping runaway decode of sample {b} after {len(self.history[b])} tokens: {reason}")
+        return torch.tensor(stop, dtype=torch.bool, device=tokens.device)
@@ -1,64 +1,37 @@
 from dataclasses import dataclass
 from pathlib import Path
 
-import librosa
 import torch
 import perth
-import torch.nn.functional as F
-from huggingface_hub import hf_hub_download
-from safetensors.torch import load_file
 
 from .models.t3 import T3
 from .models.s3tokenizer import S3_SR, drop_invalid_tokens
 from .models.s3gen import S3GEN_SR, S3Gen
 from .models.tokenizers import EnTokenizer
+from .models.tokenizers.tokenizer import SPACE
 from .models.voice_encoder import VoiceEncoder
 from .models.t3.modules.cond_enc import T3Cond
+from .cond_cache import CONDS_CACHE
+from .ref_audio import load_reference
+from .registry import COMPONENTS, components_tag
+from .local_models import resolve_model_dir
+from .weights import load_weights
+from .quantization import check_precision, load_int8_component
+from .t3_batch import batched_t3_inference, iter_batched_tokens
+from .streaming import stream_wav_blocks
+from .token_budget import speech_token_budget
+from .generation_context import GenerationContext, vocoder_rng
+from .text_frontend import TextFrontend, punc_norm
+from . import __version__
 
 
 REPO_ID = "ResembleAI/chatterbox"
 
 
-def punc_norm(text: str) -> str:
-    """
-        Quick cleanup func for punctuation from LLMs or
-        containing chars not seen often in the dataset
-    """
-    if len(text) == 0:
-        return "You need to add some text for me to talk."
-
-    # Capitalise first letter
-    if text[0].islower():
-        text = text[0].upper() + text[1:]
-
-    # Remove multiple space chars
-    text = " ".join(text.split())
-
-    # Replace uncommon/llm punc
-    punc_to_replace = [
-        ("...", ", "),
-        ("…", ", "),
-        (":", ","),
-        (" - ", ", "),
-        (";", ", "),
-        ("—", "-"),
-        ("–", "-"),
-        (" ,", ","),
-        ("“", "\""),
-        ("”", "\""),
-        ("‘", "'"),
-        ("’", "'"),
-    ]
-    for old_char_sequence, new_char in punc_to_replace:
-        text = text.replace(old_char_sequence, new_char)
-
-    # Add full stop if no ending punc
-    text = text.rstrip(" ")
-    sentence_enders = {".", "!", "?", "-", ","}
-    if not any(text.endswith(p) for p in sentence_enders):
-        text += "."
-
-    return text
+def _encode_batch(tokenizer, texts):
+    """Encode normalized texts in one call to the underlying HF tokenizer, as EnTokenizer.encode does one."""
+    encodings = tokenizer.tokenizer.encode_batch([text.replace(" ", SPACE) for text in texts])
+    return [encoding.ids for encoding in encodings]
 
 
 @dataclass
@@ -95,6 +68,18 @@ class Conditionals:
         )
         torch.save(arg_dict, fpath)
 
+    def with_exaggeration(self, exaggeration, device):
+        """Return conditionals with `exaggeration` applied, leaving `self` untouched."""
+        if float(exaggeration) == float(self.t3.emotion_adv[0, 0, 0].item()):
+            return self
+        _cond: T3Cond = self.t3
+        t3_cond = T3Cond(
+            speaker_emb=_cond.speaker_emb,
+            cond_prompt_speech_tokens=_cond.cond_prompt_speech_tokens,
+            emotion_adv=exaggeration * torch.ones(1, 1, 1),
+        ).to(device=device)
+        return Conditionals(t3_cond, self.gen)
+
     @classmethod
     def load(cls, fpath, map_location="cpu"):
         if isinstance(map_location, str):
@@ -104,6 +89,7 @@ class Conditionals:
 
 
 class ChatterboxTTS:
+    CHECKPOINT_FILES = ["ve.safetensors", "t3_cfg.safetensors", "s3gen.safetensors", "tokenizer.json", "conds.pt"]
     ENC_COND_LEN = 6 * S3_SR
     DEC_COND_LEN = 10 * S3GEN_SR
 
@@ -124,10 +110,18 @@ class ChatterboxTTS:
         self.device = device
         self.conds = conds
         self.watermarker = perth.PerthImplicitWatermarker()
+        self.frontend = TextFrontend(
+            encode=lambda text, language_id: tokenizer.text_to_tokens(text)[0].tolist(),
+            encode_batch=lambda texts, language_id: _encode_batch(tokenizer, texts),
+            sot=t3.hp.start_text_token,
+            eot=t3.hp.stop_text_token,
+            device=device,
+        )
 
     @classmethod
-    def from_local(cls, ckpt_dir, device) -> 'ChatterboxTTS':
+    def from_local(cls, ckpt_dir, device, precision="fp32") -> 'ChatterboxTTS':
         ckpt_dir = Path(ckpt_dir)
+        check_precision(precision, device)
 
         # Always load to CPU first for non-CUDA devices to handle CUDA-saved models
         if device in ["cpu", "mps"]:
@@ -135,24 +129,58 @@ class ChatterboxTTS:
         else:
             map_location = None
 
-        ve = VoiceEncoder()
-        ve.load_state_dict(
-            load_file(ckpt_dir / "ve.safetensors")
-        )
-        ve.to(device).eval()
-
-        t3 = T3()
-        t3_state = load_file(ckpt_dir / "t3_cfg.safetensors")
-        if "model" in t3_state.keys():
-            t3_state = t3_state["model"][0]
-        t3.load_state_dict(t3_state)
-        t3.to(device).eval()
-
-        s3gen = S3Gen()
-        s3gen.load_state_dict(
-            load_file(ckpt_dir / "s3gen.safetensors"), strict=False
+        # Components are shared with any other loaded model that uses identical weights
+        def build_ve(state_dict):
+            ve = VoiceEncoder()
+            ve.load_state_dict(state_dict, assign=True)
+            return ve.to(device).eval()
+
+        ve = COMPONENTS.get(
+            "ve", ckpt_dir / "ve.safetensors", device,
+            load_state_dict=lambda: load_weights(ckpt_dir / "ve.safetensors"),
+            build=build_ve,
         )
-        s3gen.to(device).eval()
+
+        def load_t3_state():
+            t3_state = load_weights(ckpt_dir / "t3_cfg.safetensors")
+            if "model" in t3_state.keys():
+                t3_state = t3_state["model"][0]
+            return t3_state
+
+        def build_t3(state_dict):
+            t3 = T3()
+            t3.load_state_dict(state_dict, assign=True)
+            return t3.to(device).eval()
+
+        if precision == "int8":
+            t3 = load_int8_component(
+                "t3", ckpt_dir / "t3_cfg.safetensors",
+                make=T3, load_state_dict=load_t3_state,
+            )
+        else:
+            t3 = COMPONENTS.get(
+                "t3", ckpt_dir / "t3_cfg.safetensors", device,
+                load_state_dict=load_t3_state,
+                build=build_t3,
+            )
+
+        def build_s3gen(state_dict):
+            s3gen = S3Gen()
+            s3gen.load_state_dict(state_dict, strict=False, assign=True)
+            return s3gen.to(device).eval()
+
+        if precision == "int8":
+            s3gen = load_int8_component(
+                "s3gen", ckpt_dir / "s3gen.safetensors",
+                make=S3Gen, load_state_dict=lambda: load_weights(ckpt_dir / "s3gen.safetensors"),
+                submodule="flow.decoder", strict=False,
+            )
+        else:
+            s3gen = COMPONENTS.get(
+                "s3gen", ckpt_dir / "s3gen.safetensors", device,
+                load_state_dict=lambda: load_weights(ckpt_dir / "s3gen.safetensors"),
+                build=build_s3gen,
+            )
 
         tokenizer = EnTokenizer(
             str(ckpt_dir / "tokenizer.json")
@@ -165,7 +193,7 @@ class ChatterboxTTS:
         return cls(t3, s3gen, ve, tokenizer, device, conds=conds)
 
     @classmethod
-    def from_pretrained(cls, device) -> 'ChatterboxTTS':
+    def from_pretrained(cls, device, precision="fp32") -> 'ChatterboxTTS':
         # Check if MPS is available on macOS
         if device == "mps" and not torch.backends.mps.is_available():
             if not torch.backends.mps.is_built():
@@ -174,16 +202,44 @@ class ChatterboxTTS:
                 print("MPS not available because the current MacOS version is not 12.3+ and/or you do not have an MPS-enabled device on this machine.")
             device = "cpu"
 
-        for fpath in ["ve.safetensors", "t3_cfg.safetensors", "s3gen.safetensors", "tokenizer.json", "conds.pt"]:
-            local_path = hf_hub_download(repo_id=REPO_ID, filename=fpath)
+        return cls.from_local(cls.resolve_checkpoint_dir(), device, precision=precision)
 
-        return cls.from_local(Path(local_path).parent, device)
+    @classmethod
+    def resolve_checkpoint_dir(cls) -> Path:
+        """Local directory with this model's checkpoint files, downloaded only if missing."""
+        return resolve_model_dir(REPO_ID, cls.CHECKPOINT_FILES)
+
+    @property
+    def conds_tag(self) -> str:
+        """Model-version and encoder-weights stamp for conditionals persisted in a ConditionalsStore."""
+        return f"v{__version__}-p{self.t3.hp.speech_cond_prompt_len}-{components_tag(self.ve, self.s3gen)}"
 
     def prepare_conditionals(self, wav_fpath, exaggeration=0.5):
-        ## Load reference wav
-        s3gen_ref_wav, _sr = librosa.load(wav_fpath, sr=S3GEN_SR)
+        """Make the voice of `wav_fpath` the model's current voice."""
+        self.conds = self.load_conditionals(wav_fpath, exaggeration=exaggeration)
+
+    def load_conditionals(self, wav_fpath, exaggeration=0.5) -> Conditionals:
+        """Return the Conditionals of a reference file without changing the current voice."""
+        # Reuse conditionals already computed for this reference file
+        cache_key = CONDS_CACHE.make_key(
+            wav_fpath, exaggeration, str(self.device), self.t3.hp.speech_cond_prompt_len,
+            components_tag(self.ve, self.s3gen),
+        )
+        if (conds := CONDS_CACHE.get(cache_key)) is not None:
+            return conds
+
+        # Then try the on-disk voice store, which survives process restarts
+        digest = cache_key[0] if cache_key is not None else None
+        store = CONDS_CACHE.store
+        if store is not None and digest is not None:
+            conds = store.load(digest, self.conds_tag, Conditionals.load)
+            if conds is not None:
+                conds = conds.to(self.device).with_exaggeration(exaggeration, self.device)
+                CONDS_CACHE.put(cache_key, conds)
+                return conds
 
-        ref_16k_wav = librosa.resample(s3gen_ref_wav, orig_sr=S3GEN_SR, target_sr=S3_SR)
+        ## Load reference wav
+        s3gen_ref_wav, ref_16k_wav = load_reference(wav_fpath)
 
         s3gen_ref_wav = s3gen_ref_wav[:self.DEC_COND_LEN]
         s3gen_ref_dict = self.s3gen.embed_ref(s3gen_ref_wav, S3GEN_SR, device=self.device)
@@ -203,9 +259,67 @@ class ChatterboxTTS:
             cond_prompt_speech_tokens=t3_cond_prompt_tokens,
             emotion_adv=exaggeration * torch.ones(1, 1, 1),
         ).to(device=self.device)
-        self.conds = Conditionals(t3_cond, s3gen_ref_dict)
+        conds = Conditionals(t3_cond, s3gen_ref_dict)
+        CONDS_CACHE.put(cache_key, conds)
+        if store is not None and digest is not None:
+            store.save(digest, self.conds_tag, conds)
+        return conds
+
+    def resolve_conditionals(self, voice, exaggeration=0.5) -> Conditionals:
+        """
+        Conditionals for `voice`: a Conditionals is used as given, a reference
+        audio path is loaded, and None means the current voice. `exaggeration`
+        applies to the latter two.
+        """
+        if isinstance(voice, Conditionals):
+            return voice
+        if voice:
+            return self.load_conditionals(voice, exaggeration=exaggeration)
+        assert self.conds is not None, "Please `prepare_conditionals` first or specify a voice"
+        return self.conds.with_exaggeration(exaggeration, self.device)
+
+    def new_context(self, voice=None, exaggeration=0.5, seed=None) -> GenerationContext:
+        """
+        Request-scoped state for generating in `voice` (see `resolve_conditionals`)
+        with its own sampling generator, seeded with `seed` when non-zero.
+        Pass it as `context=` to generate on this model from several threads at once.
+        """
+        return GenerationContext.create(
+            self.resolve_conditionals(voice, exaggeration), self.device, seed=seed
+        )
 
-    def generate(
+    def tokenize_text(self, text):
+        """Normalize `text` and return its (1, T) token ids wrapped in start/stop text tokens."""
+        return self.frontend.tokenize(text)
+
+    def tokens_to_wav(self, speech_tokens, ref_dict=None, context=None):
+        """
+        Vocode a 1D sequence of T3 speech tokens with S3Gen and watermark the
+        result, in the voice of `ref_dict` (default: the current voice).
+        With a `context`, its voice is used and S3Gen's noise is seeded from
+        the context's seed, so seeded requests reproduce their audio.
+        """
+        if context is not None:
+            ref_dict = context.conds.gen
+        with torch.inference_mode():
+            # TODO: output becomes 1D
+            speech_tokens = drop_invalid_tokens(speech_tokens)
+            
+            speech_tokens = speech_tokens[speech_tokens < 6561]
+
+            seed = context.noise_seed(speech_tokens) if context is not None else None
+            speech_tokens = speech_tokens.to(self.device)
+
+            with vocoder_rng(seed):
+                wav, _ = self.s3gen.inference(
+                    speech_tokens=speech_tokens,
+                    ref_dict=self.conds.gen if ref_dict is None else ref_dict,
+                )
+            wav = wav.squeeze(0).detach().cpu().numpy()
+            watermarked_wav = self.watermarker.apply_watermark(wav, sample_rate=self.sr)
+        return torch.from_numpy(watermarked_wav).unsqueeze(0)
+
+    def generate_tokens(
         self,
         text,
         repetition_penalty=1.2,
@@ -215,58 +329,222 @@ class ChatterboxTTS:
         exaggeration=0.5,
         cfg_weight=0.5,
         temperature=0.8,
+        context=None,
     ):
-        if audio_prompt_path:
-            self.prepare_conditionals(audio_prompt_path, exaggeration=exaggeration)
+        """
+        Run only the T3 stage and return the 1D speech token sequence for `text`.
+        With a `context` (see `new_context`), its voice and generator are used
+        and the model's current voice is neither read nor changed.
+        """
+        if context is not None:
+            conds, generator = context.conds, context.generator
         else:
-            assert self.conds is not None, "Please `prepare_conditionals` first or specify `audio_prompt_path`"
+            if audio_prompt_path:
+                self.prepare_conditionals(audio_prompt_path, exaggeration=exaggeration)
+            else:
+                assert self.conds is not None, "Please `prepare_conditionals` first or specify `audio_prompt_path`"
 
-        # Update exaggeration if needed
-        if exaggeration != self.conds.t3.emotion_adv[0, 0, 0]:
-            _cond: T3Cond = self.conds.t3
-            self.conds.t3 = T3Cond(
-                speaker_emb=_cond.speaker_emb,
-                cond_prompt_speech_tokens=_cond.cond_prompt_speech_tokens,
-                emotion_adv=exaggeration * torch.ones(1, 1, 1),
-            ).to(device=self.device)
+            # Update exaggeration if needed. A new Conditionals is built rather than
+            # mutating in place, since the current one may be shared via CONDS_CACHE.
+            self.conds = self.conds.with_exaggeration(exaggeration, self.device)
+            conds, generator = self.conds, None
 
         # Norm and tokenize text
-        text = punc_norm(text)
-        text_tokens = self.tokenizer.text_to_tokens(text).to(self.device)
+        text_tokens = self.tokenize_text(text)
+
+        # Decode with a budget sized to the text, stopping early on runaway loops
+        speech_tokens, = batched_t3_inference(
+            self.t3,
+            t3_conds=[conds.t3],
+            text_tokens=[text_tokens],
+            generator=generator,
+            max_new_tokens=speech_token_budget(text, "en"),
+            temperature=temperature,
+            cfg_weight=cfg_weight,
+            repetition_penalty=repetition_penalty,
+            min_p=min_p,
+            top_p=top_p,
+        )
 
-        if cfg_weight > 0.0:
-            text_tokens = torch.cat([text_tokens, text_tokens], dim=0)  # Need two seqs for CFG
+        return speech_tokens
 
-        sot = self.t3.hp.start_text_token
-        eot = self.t3.hp.stop_text_token
-        text_tokens = F.pad(text_tokens, (1, 0), value=sot)
-        text_tokens = F.pad(text_tokens, (0, 1), value=eot)
+    def generate(
+        self,
+        text,
+        repetition_penalty=1.2,
+        min_p=0.05,
+        top_p=1.0,
+        audio_prompt_path=None,
+        exaggeration=0.5,
+        cfg_weight=0.5,
+        temperature=0.8,
+    ):
+        speech_tokens = self.generate_tokens(
+            text,
+            repetition_penalty=repetition_penalty,
+            min_p=min_p,
+            top_p=top_p,
+            audio_prompt_path=audio_prompt_path,
+            exaggeration=exaggeration,
+            cfg_weight=cfg_weight,
+            temperature=temperature,
+        )
+        return self.tokens_to_wav(speech_tokens)
 
-        with torch.inference_mode():
-            speech_tokens = self.t3.inference(
-                t3_cond=self.conds.t3,
-                text_tokens=text_tokens,
-                max_new_tokens=1000,  # TODO: use the value in config
-                temperature=temperature,
-                cfg_weight=cfg_weight,
-                repetition_penalty=repetition_penalty,
-                min_p=min_p,
-                top_p=top_p,
-            )
-            # Extract only the conditional batch.
-            speech_tokens = speech_tokens[0]
+    def generate_batch(
+        self,
+        texts,
+        repetition_penalty=1.2,
+        min_p=0.05,
+        top_p=1.0,
+        audio_prompt_path=None,
+        exaggeration=0.5,
+        cfg_weight=0.5,
+        temperature=0.8,
+        max_batch_size=8,
+    ):
+        """
+        Generate one waveform per entry of `texts`, decoding up to
+        `max_batch_size` texts together in each T3 forward pass.
+        Returns a list of (1, num_samples) tensors in the order of `texts`.
+        """
+        if audio_prompt_path:
+            self.prepare_conditionals(audio_prompt_path, exaggeration=exaggeration)
+        else:
+            assert self.conds is not None, "Please `prepare_conditionals` first or specify `audio_prompt_path`"
+        self.conds = self.conds.with_exaggeration(exaggeration, self.device)
+
+        return self.generate_pairs(
+            [(text, self.conds) for text in texts],
+            repetition_penalty=repetition_penalty,
+            min_p=min_p,
+            top_p=top_p,
+            cfg_weight=cfg_weight,
+            temperature=temperature,
+            max_batch_size=max_batch_size,
+        )
 
-            # TODO: output becomes 1D
-            speech_tokens = drop_invalid_tokens(speech_tokens)
-            
-            speech_tokens = speech_tokens[speech_tokens < 6561]
+    def generate_pairs(
+        self,
+        pairs,
+        repetition_penalty=1.2,
+        min_p=0.05,
+        top_p=1.0,
+        exaggeration=0.5,
+        cfg_weight=0.5,
+        temperature=0.8,
+        max_batch_size=8,
+    ):
+        """
+        Generate one waveform per (text, voice) pair, decoding up to
+        `max_batch_size` pairs together in each T3 forward pass whatever their
+        voices: each row carries its own speaker embedding and prompt tokens.
+        A voice is anything `resolve_conditionals` accepts. Each distinct text
+        is tokenized once. The current voice is left unchanged.
+        Returns a list of (1, num_samples) tensors in the order of `pairs`.
+        """
+        conds = [self.resolve_conditionals(voice, exaggeration) for _, voice in pairs]
+        speech_tokens = self.generate_pair_tokens(
+            [(text, c) for (text, _), c in zip(pairs, conds)],
+            repetition_penalty=repetition_penalty,
+            min_p=min_p,
+            top_p=top_p,
+            cfg_weight=cfg_weight,
+            temperature=temperature,
+            max_batch_size=max_batch_size,
+        )
+        # S3Gen flow inference only supports batch size 1, so vocode per sample
+        return [self.tokens_to_wav(tokens, c.gen) for tokens, c in zip(speech_tokens, conds)]
 
-            speech_tokens = speech_tokens.to(self.device)
+    def generate_pair_tokens(
+        self,
+        pairs,
+        repetition_penalty=1.2,
+        min_p=0.05,
+        top_p=1.0,
+        exaggeration=0.5,
+        cfg_weight=0.5,
+        temperature=0.8,
+        max_batch_size=8,
+        generator=None,
+    ):
+        """
+        Run only the T3 stage of `generate_pairs`, returning one 1D token
+        sequence per pair. `generator` may be one torch.Generator or one per pair.
+        """
+        texts = [text for text, _ in pairs]
+        text_tokens = self.frontend.tokenize_batch(texts)
+        return batched_t3_inference(
+            self.t3,
+            t3_conds=[self.resolve_conditionals(voice, exaggeration).t3 for _, voice in pairs],
+            text_tokens=text_tokens,
+            max_batch_size=max_batch_size,
+            generator=generator,
+            max_new_tokens=[speech_token_budget(text, "en") for text in texts],
+            temperature=temperature,
+            cfg_weight=cfg_weight,
+            repetition_penalty=repetition_penalty,
+            min_p=min_p,
+            top_p=top_p,
+        )
 
-            wav, _ = self.s3gen.inference(
-                speech_tokens=speech_tokens,
-                ref_dict=self.conds.gen,
-            )
-            wav = wav.squeeze(0).detach().cpu().numpy()
-            watermarked_wav = self.watermarker.apply_watermark(wav, sample_rate=self.sr)
-        return torch.from_numpy(watermarked_wav).unsqueeze(0)
\ No newline at end of file
+    def generate_fanout(self, text, voices, **kwargs):
+        """Render one text in each of `voices`; see `generate_pairs` for the options."""
+        return self.generate_pairs([(text, voice) for voice in voices], **kwargs)
+
+    def generate_stream(
+        self,
+        text,
+        repetition_penalty=1.2,
+        min_p=0.05,
+        top_p=1.0,
+        audio_prompt_path=None,
+        exaggeration=0.5,
+        cfg_weight=0.5,
+        temperature=0.8,
+        chunk_size=25,
+        context_window=50,
+        fade_duration=0.02,
+    ):
+        """
+        Generate speech incrementally, yielding watermarked (1, num_samples)
+        blocks while T3 is still decoding. Speech tokens are vocoded every
+        `chunk_size` tokens with `context_window` tokens of left context, and
+        consecutive blocks are crossfaded over `fade_duration` seconds.
+        """
+        if audio_prompt_path:
+            self.prepare_conditionals(audio_prompt_path, exaggeration=exaggeration)
+        else:
+            assert self.conds is not None, "Please `prepare_conditionals` first or specify `audio_prompt_path`"
+        self.conds = self.conds.with_exaggeration(exaggeration, self.device)
+        ref_dict = self.conds.gen
+
+        def vocode(speech_tokens):
+            with torch.inference_mode(), vocoder_rng():
+                wav, _ = self.s3gen.inference(
+                    speech_tokens=speech_tokens.to(self.device),
+                    ref_dict=ref_dict,
+                )
+            return wav.squeeze(0).detach().cpu().numpy()
+
+        token_steps = iter_batched_tokens(
+            self.t3,
+            t3_conds=[self.conds.t3],
+            text_tokens=[self.tokenize_text(text)],
+            max_new_tokens=speech_token_budget(text, "en"),
+            temperature=temperature,
+            cfg_weight=cfg_weight,
+            repetition_penalty=repetition_penalty,
+            min_p=min_p,
+            top_p=top_p,
+        )
+        for block in stream_wav_blocks(
+            token_steps,
+            vocode,
+            eos=self.t3.hp.stop_speech_token,
+            chunk_size=chunk_size,
+            context_tokens=context_window,
+            fade_samples=int(fade_duration * self.sr),
+        ):
+            watermarked_block = self.watermarker.apply_watermark(block, sample_rate=self.sr)
+            yield torch.from_numpy(watermarked_block).unsqueeze(0)
@@ -3,17 +3,22 @@ from pathlib import Path
 import librosa
 import torch
 import perth
-from huggingface_hub import hf_hub_download
-from safetensors.torch import load_file
 
 from .models.s3tokenizer import S3_SR
 from .models.s3gen import S3GEN_SR, S3Gen
+from .registry import COMPONENTS
+from .ref_audio import load_reference
+from .local_models import resolve_model_dir
+from .weights import load_weights
+from .quantization import check_precision, load_int8_component
+from .generation_context import vocoder_rng
 
 
 REPO_ID = "ResembleAI/chatterbox"
 
 
 class ChatterboxVC:
+    CHECKPOINT_FILES = ["s3gen.safetensors", "conds.pt"]
     ENC_COND_LEN = 6 * S3_SR
     DEC_COND_LEN = 10 * S3GEN_SR
 
@@ -36,8 +41,9 @@ class ChatterboxVC:
             }
 
     @classmethod
-    def from_local(cls, ckpt_dir, device) -> 'ChatterboxVC':
+    def from_local(cls, ckpt_dir, device, precision="fp32") -> 'ChatterboxVC':
         ckpt_dir = Path(ckpt_dir)
+        check_precision(precision, device)
         
         # Always load to CPU first for non-CUDA devices to handle CUDA-saved models
         if device in ["cpu", "mps"]:
@@ -50,16 +56,29 @@ class ChatterboxVC:
             states = torch.load(builtin_voice, map_location=map_location)
             ref_dict = states['gen']
 
-        s3gen = S3Gen()
-        s3gen.load_state_dict(
-            load_file(ckpt_dir / "s3gen.safetensors"), strict=False
-        )
-        s3gen.to(device).eval()
+        # Shares the S3Gen instance with a loaded ChatterboxTTS using the same weights
+        def build_s3gen(state_dict):
+            s3gen = S3Gen()
+            s3gen.load_state_dict(state_dict, strict=False, assign=True)
+            return s3gen.to(device).eval()
+
+        if precision == "int8":
+            s3gen = load_int8_component(
+                "s3gen", ckpt_dir / "s3gen.safetensors",
+                make=S3Gen, load_state_dict=lambda: load_weights(ckpt_dir / "s3gen.safetensors"),
+                submodule="flow.decoder", strict=False,
+            )
+        else:
+            s3gen = COMPONENTS.get(
+                "s3gen", ckpt_dir / "s3gen.safetensors", device,
+                load_state_dict=lambda: load_weights(ckpt_dir / "s3gen.safetensors"),
+                build=build_s3gen,
+            )
 
         return cls(s3gen, device, ref_dict=ref_dict)
 
     @classmethod
-    def from_pretrained(cls, device) -> 'ChatterboxVC':
+    def from_pretrained(cls, device, precision="fp32") -> 'ChatterboxVC':
         # Check if MPS is available on macOS
         if device == "mps" and not torch.backends.mps.is_available():
             if not torch.backends.mps.is_built():
@@ -68,37 +87,47 @@ class ChatterboxVC:
                 print("MPS not available because the current MacOS version is not 12.3+ and/or you do not have an MPS-enabled device on this machine.")
             device = "cpu"
             
-        for fpath in ["s3gen.safetensors", "conds.pt"]:
-            local_path = hf_hub_download(repo_id=REPO_ID, filename=fpath)
+        return cls.from_local(cls.resolve_checkpoint_dir(), device, precision=precision)
 
-        return cls.from_local(Path(local_path).parent, device)
+    @classmethod
+    def resolve_checkpoint_dir(cls) -> Path:
+        """Local directory with this model's checkpoint files, downloaded only if missing."""
+        return resolve_model_dir(REPO_ID, cls.CHECKPOINT_FILES)
 
     def set_target_voice(self, wav_fpath):
+        self.ref_dict = self.load_ref_dict(wav_fpath)
+
+    def load_ref_dict(self, wav_fpath):
+        """Return the S3Gen reference features of a target voice without changing the current one."""
         ## Load reference wav
-        s3gen_ref_wav, _sr = librosa.load(wav_fpath, sr=S3GEN_SR)
+        s3gen_ref_wav, _ = load_reference(wav_fpath)
 
         s3gen_ref_wav = s3gen_ref_wav[:self.DEC_COND_LEN]
-        self.ref_dict = self.s3gen.embed_ref(s3gen_ref_wav, S3GEN_SR, device=self.device)
+        return self.s3gen.embed_ref(s3gen_ref_wav, S3GEN_SR, device=self.device)
 
     def generate(
         self,
         audio,
         target_voice_path=None,
     ):
+        # A per-call target voice stays local to the call, so concurrent
+        # conversions on one model do not overwrite each other's target
         if target_voice_path:
-            self.set_target_voice(target_voice_path)
+            ref_dict = self.load_ref_dict(target_voice_path)
         else:
             assert self.ref_dict is not None, "Please `prepare_conditionals` first or specify `target_voice_path`"
+            ref_dict = self.ref_dict
 
         with torch.inference_mode():
             audio_16, _ = librosa.load(audio, sr=S3_SR)
             audio_16 = torch.from_numpy(audio_16).float().to(self.device)[None, ]
 
             s3_tokens, _ = self.s3gen.tokenizer(audio_16)
-            wav, _ = self.s3gen.inference(
-                speech_tokens=s3_tokens,
-                ref_dict=self.ref_dict,
-            )
+            with vocoder_rng():
+                wav, _ = self.s3gen.inference(
+                    speech_tokens=s3_tokens,
+                    ref_dict=ref_dict,
+                )
             wav = wav.squeeze(0).detach().cpu().numpy()
             watermarked_wav = self.watermarker.apply_watermark(wav, sample_rate=self.sr)
         return torch.from_numpy(watermarked_wav).unsqueeze(0)
\ No newline at end of file
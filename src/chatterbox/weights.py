@@ -0,0 +1,71 @@
+"""
+Zero-copy checkpoint loading.
+
+safetensors files are memory-mapped: the tensors returned by `load_weights`
+point into the OS page cache instead of a private copy, so load time drops
+and several worker processes on one host share a single physical copy of the
+weights. Pickled `.pt` checkpoints cannot be mapped that way, so they are
+converted once into a safetensors cache under CHATTERBOX_MODEL_DIR. Modules
+must adopt the mapped tensors with `load_state_dict(..., assign=True)`
+rather than copying them into freshly allocated parameters.
+"""
+import hashlib
+import os
+from pathlib import Path
+
+import torch
+from safetensors.torch import load_file, save_file
+
+from .local_models import MODEL_DIR
+
+
+CONVERTED_DIR = MODEL_DIR / "safetensors_cache"
+
+
+def source_key(ckpt_path: Path) -> str:
+    """Short key identifying a checkpoint file by path, size and mtime, for derived caches."""
+    st = ckpt_path.stat()
+    return hashlib.sha1(f"{ckpt_path.resolve()}:{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()[:16]
+
+
+def converted_path(ckpt_path: Path) -> Path:
+    """Cache location for a converted checkpoint, unique per source path, size and mtime."""
+    return CONVERTED_DIR / f"{ckpt_path.stem}-{source_key(ckpt_path)}.safetensors"
+
+
+def convert_to_safetensors(ckpt_path) -> Path:
+    """Convert a `.pt` state dict to safetensors once and return the cached file."""
+    ckpt_path = Path(ckpt_path)
+    out_path = converted_path(ckpt_path)
+    if out_path.exists():
+        return out_path
+
+    print(f"Converting {ckpt_path.name} to safetensors for memory-mapped loading (one-time)")
+    state_dict = torch.load(ckpt_path, weights_only=True, map_location="cpu")
+    # safetensors rejects tensors that share or only partially cover a storage
+    state_dict = {k: v.detach().clone().contiguous() for k, v in state_dict.items()}
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_name(f"{out_path.name}.{os.getpid()}.tmp")
+    try:
+        save_file(state_dict, str(tmp_path))
+        os.replace(tmp_path, out_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return out_path
+
+
+def load_weights(ckpt_path) -> dict:
+    """
+    Load a checkpoint's state dict as CPU tensors backed by a memory mapping
+    of the file, converting `.pt` checkpoints to safetensors on first use.
+    """
+    ckpt_path = Path(ckpt_path)
+    if ckpt_path.suffix != ".safetensors":
+        try:
+            ckpt_path = convert_to_safetensors(ckpt_path)
+        except OSError as e:
+            print(f"Could not cache {ckpt_path.name} as safetensors ({e}); mapping the pickle instead")
+            return torch.load(ckpt_path, weights_only=True, map_location="cpu", mmap=True)
+    return load_file(ckpt_path)
@@ -0,0 +1,59 @@
+"""
+Tests for streamed text segmentation (modules.text_chunking)
+"""
+from modules.text_chunking import TextSegmenter, smart_chunk_text
+
+
+def feed_all(fragments, max_words=40):
+    segmenter = TextSegmenter(max_words=max_words)
+    released = [segmenter.feed(fragment) for fragment in fragments]
+    return released, segmenter.flush()
+
+
+def test_latin_sentence_waits_for_whitespace():
+    released, rest = feed_all(["Hel", "lo the", "re.", " How", " are you?"])
+    assert released == [[], [], [], ["Hello there."], []]
+    assert rest == ["How are you?"]
+
+
+def test_latin_decimal_is_not_a_sentence_end():
+    released, rest = feed_all(["The price is 3.", "5 dollars. ", "Thanks"])
+    assert released == [[], ["The price is 3.5 dollars."], []]
+    assert rest == ["Thanks"]
+
+
+def test_line_break_ends_a_sentence():
+    released, rest = feed_all(["First line\n", "second"])
+    assert released == [["First line"], []]
+    assert rest == ["second"]
+
+
+def test_cjk_sentences_release_without_whitespace():
+    for sentence in ["こんにちは。", "元気ですか？", "今日はいい天気ですね。"]:
+        released, rest = feed_all([sentence])
+        assert released == [[sentence]]
+        assert rest == []
+
+
+def test_cjk_sentence_split_across_fragments():
+    released, rest = feed_all(["你好", "世界！我", "很好"])
+    assert released == [[], ["你好世界！"], []]
+    assert rest == ["我很好"]
+
+
+def test_hindi_and_arabic_enders_release_at_once():
+    assert feed_all(["नमस्ते।"])[0] == [["नमस्ते।"]]
+    assert feed_all(["كيف حالك؟"])[0] == [["كيف حالك؟"]]
+
+
+def test_run_on_sentence_released_at_last_comma():
+    released, rest = feed_all(["one two three, four five six seven, eight"], max_words=5)
+    assert released == [["one two three", "four five six seven"]]
+    assert rest == ["eight"]
+
+
+def test_smart_chunk_text_groups_sentences():
+    assert smart_chunk_text("Hello there. How are you? Fine, thanks.") == [
+        "Hello there. How are you? Fine, thanks."
+    ]
+    assert smart_chunk_text("こんにちは。元気ですか？", max_words=6) == ["こんにちは。", "元気ですか？"]